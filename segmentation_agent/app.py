@@ -6,82 +6,692 @@ predictions using a pre-trained K-Means clustering model with RFM features.
 
 Endpoints:
     GET /health: Health check endpoint
+    GET /health/db: Database availability and connection pool statistics
+    GET /ready: Readiness check reporting the loaded model and customer data
+    GET /metrics: Prometheus metrics (per-route requests, errors and latency,
+                  per-stage latency, data source split, coalescer histograms)
     POST /segment/manual: Predict segment for manual RFM input
     POST /segment/customer: Predict segment for a customer by ID
+    POST /segment/customers: Predict segments for many customer IDs at once
+    POST /api/segment: Batch segmentation for the first N customers
+    POST /api/segment/page: Cursor-paginated segmentation over all customers
+    POST /rfm/transactions: Apply new transactions to customer_rfm (database only)
+    GET /admin/model: Served model and published registry versions (admin)
+    POST /admin/model/reload: Load, validate and swap in a model version (admin)
+
+Model hot reload:
+    The model lives in one immutable ModelState (model_registry.py). Each
+    request pins the state current when it starts, so a reload never mixes
+    two models within one response. Reloads load and validate the new state
+    off the request path and then swap the single reference. A watcher thread
+    in every worker polls the registry's CURRENT pointer (or the artifact
+    file) every MODEL_WATCH_SECONDS. Responses carry the version they were
+    scored with (X-Model-Version header and "model_version" fields).
+
+Customer data hot reload:
+    The fallback customer store is double-buffered the same way. A second
+    watcher polls the snapshot manifest (or the CSV, when no snapshot was
+    built) and the delta directory every STORE_WATCH_SECONDS. A new base is
+    mapped (or parsed) off the request path; new delta files of changed rows
+    go into a small overlay that shares the current base arrays, so their
+    cost follows the size of the change. The finished store is swapped in as one reference;
+    requests pin the store current when they start, and page cursors issued
+    against an older store version get 409.
 
 Environment Variables:
     DATABASE_URL: PostgreSQL connection string
+    MODEL_REGISTRY_DIR: Versioned model registry; its CURRENT version is served first
+    SERVING_ARTIFACT_PATH: Path to the compact .npz serving artifact (preferred)
     MODEL_PATH: Path to trained K-Means model
     SCALER_PATH: Path to feature scaler
     PROFILES_PATH: Path to segment profiles JSON
     RFM_PATH: Path to RFM analysis table CSV (fallback)
+    RFM_SNAPSHOT_PATH: Columnar snapshot of the RFM table (preferred over the CSV)
+    RFM_DELTA_DIR: Delta files of changed customer rows applied on top of the snapshot/CSV
     USE_CSV_FALLBACK: Enable CSV fallback if database unavailable
+    MAX_BULK_CUSTOMERS: Maximum number of IDs accepted by /segment/customers
+    MATERIALIZE_SEGMENTS: Persist segment assignments in customer_rfm at startup
+    STREAM_CHUNK_SIZE: Customers scored per chunk in streaming mode
+    DEFAULT_PAGE_SIZE / MAX_PAGE_SIZE: Page size limits for /api/segment/page
+    COALESCE_MANUAL: Micro-batch concurrent /segment/manual requests
+    COALESCE_MAX_BATCH / COALESCE_MAX_WAIT_MS: Coalescer batch size and window
+    MAX_TRANSACTION_LINES: Maximum transaction lines accepted by /rfm/transactions
+    MODEL_WATCH_SECONDS: Poll interval for new model artifacts (0 disables the watcher)
+    STORE_WATCH_SECONDS: Poll interval for customer data changes (0 disables the watcher)
+    ADMIN_TOKEN: Token for the /admin endpoints (X-Admin-Token header); unset disables them
+    PORT / FLASK_DEBUG: Bind port and debug mode for the development server
+
+Production serving:
+    gunicorn -c gunicorn.conf.py app:app
+    (preloads this module in the master process; see gunicorn.conf.py)
 """
 
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+from flask import Flask, Response, g, has_app_context, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import base64
+import hmac
 import numpy as np
-from sklearn.metrics.pairwise import euclidean_distances
 import json
+import math
 import os
-from typing import Dict, Any, Tuple, Optional
+import re
+import threading
+import time
+from typing import Dict, Any, List, Tuple, Optional
 from dotenv import load_dotenv
 
+from coalescer import BatchCoalescer
+from customer_store import MANIFEST_NAME, CustomerStore, load_delta, pending_deltas
+from metrics import LATENCY_BUCKETS, Counter, Gauge, Histogram, render_prometheus
+from model_registry import (
+    MODEL_REGISTRY_DIR, ModelState, activate, artifact_path, current_version, list_versions,
+    load_model_state, validate_model
+)
+from scoring import SegmentScorer, confidence_from_distance, group_ids_by_segment
+
 # Load environment variables
 load_dotenv()
 
 # Import database (with graceful fallback)
 try:
-    from database import get_db, CustomerRFM, db_available, init_db
-    print(f"🔌 Database module loaded. Available: {db_available}")
+    from sqlalchemy import func
+    from database import (
+        get_db, CustomerRFM, init_db, is_db_available, iter_rfm_chunks, pool_stats,
+        refresh_segment_assignments
+    )
+    DATABASE_MODULE_LOADED = True
+    print("🔌 Database module loaded (connects on first use)")
 except ImportError as e:
     print(f"⚠️ Database module not available: {e}")
-    db_available = False
+    DATABASE_MODULE_LOADED = False
 
 # ============================================================================
 # ENVIRONMENT VARIABLES & CONFIGURATION
 # ============================================================================
+SERVING_ARTIFACT_PATH: str = os.getenv("SERVING_ARTIFACT_PATH", "models/segment_model.npz")
 MODEL_PATH: str = os.getenv("MODEL_PATH", "models/kmeans_model.pkl")
 SCALER_PATH: str = os.getenv("SCALER_PATH", "models/scaler.pkl")
 PROFILES_PATH: str = os.getenv("PROFILES_PATH", "models/segment_profiles.json")
 RFM_PATH: str = os.getenv("RFM_CSV_PATH", "models/rfm_table.csv")
+RFM_SNAPSHOT_PATH: str = os.getenv("RFM_SNAPSHOT_PATH", "models/rfm_snapshot")
+RFM_DELTA_DIR: str = os.getenv("RFM_DELTA_DIR", "models/rfm_deltas")
 USE_CSV_FALLBACK: bool = os.getenv("USE_CSV_FALLBACK", "true").lower() == "true"
+MAX_BULK_CUSTOMERS: int = int(os.getenv("MAX_BULK_CUSTOMERS", "10000"))
+MATERIALIZE_SEGMENTS: bool = os.getenv("MATERIALIZE_SEGMENTS", "true").lower() == "true"
+STREAM_CHUNK_SIZE: int = int(os.getenv("STREAM_CHUNK_SIZE", "5000"))
+DEFAULT_PAGE_SIZE: int = int(os.getenv("DEFAULT_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", "10000"))
+COALESCE_MANUAL: bool = os.getenv("COALESCE_MANUAL", "false").lower() == "true"
+COALESCE_MAX_BATCH: int = int(os.getenv("COALESCE_MAX_BATCH", "64"))
+COALESCE_MAX_WAIT_MS: float = float(os.getenv("COALESCE_MAX_WAIT_MS", "2"))
+MAX_TRANSACTION_LINES: int = int(os.getenv("MAX_TRANSACTION_LINES", "50000"))
+MODEL_WATCH_SECONDS: float = float(os.getenv("MODEL_WATCH_SECONDS", "5"))
+STORE_WATCH_SECONDS: float = float(os.getenv("STORE_WATCH_SECONDS", "5"))
+ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+# Registry versions are 12-character model fingerprints (scoring.model_version)
+MODEL_VERSION_PATTERN = re.compile(r"^[0-9a-f]{12}$")
 
 # ============================================================================
 # FLASK APP INITIALIZATION
 # ============================================================================
 app = Flask(__name__)
 
+# ============================================================================
+# METRICS (exported on /metrics, per worker process)
+# ============================================================================
+REQUESTS_TOTAL = Counter(
+    "segmentation_requests_total",
+    "HTTP requests by route, method and status code",
+    ("route", "method", "status")
+)
+REQUEST_ERRORS_TOTAL = Counter(
+    "segmentation_request_errors_total",
+    "HTTP responses with status >= 400 by route and status code",
+    ("route", "status")
+)
+REQUEST_SECONDS = Histogram(
+    "segmentation_request_duration_seconds",
+    "Time to build the response (streamed bodies: time to first byte)",
+    LATENCY_BUCKETS,
+    ("route", "method")
+)
+STAGE_SECONDS = Histogram(
+    "segmentation_stage_duration_seconds",
+    "Time spent per request stage: db_fetch, csv_lookup, scaling, prediction, serialization",
+    LATENCY_BUCKETS,
+    ("stage",)
+)
+DATA_SOURCE_REQUESTS_TOTAL = Counter(
+    "segmentation_data_source_requests_total",
+    "Requests answered from each data source (database or csv)",
+    ("route", "source")
+)
+DATA_SOURCE_CUSTOMERS_TOTAL = Counter(
+    "segmentation_data_source_customers_total",
+    "Customers served from each data source (database or csv)",
+    ("route", "source")
+)
+MODEL_RELOADS_TOTAL = Counter(
+    "segmentation_model_reloads_total",
+    "Model loads by trigger (startup, watcher, admin) and result (swapped, unchanged, failed)",
+    ("trigger", "result")
+)
+MODEL_RELOAD_SECONDS = Histogram(
+    "segmentation_model_reload_duration_seconds",
+    "Time to load and validate a model artifact",
+    LATENCY_BUCKETS
+)
+MODEL_INFO = Gauge(
+    "segmentation_model_info",
+    "Model version this worker serves (always 1)",
+    ("version",)
+)
+MODEL_LOADED_SECONDS = Gauge(
+    "segmentation_model_loaded_timestamp_seconds",
+    "Unix time the served model was loaded"
+)
+STORE_RELOADS_TOTAL = Counter(
+    "segmentation_customer_store_reloads_total",
+    "Customer store loads by kind (startup, full, delta) and result (swapped, unchanged, failed)",
+    ("kind", "result")
+)
+STORE_RELOAD_SECONDS = Histogram(
+    "segmentation_customer_store_reload_duration_seconds",
+    "Time to build a new customer store (full: map or parse the base; delta: merge changed rows)",
+    LATENCY_BUCKETS,
+    ("kind",)
+)
+STORE_INFO = Gauge(
+    "segmentation_customer_store_info",
+    "Customer store version this worker serves (always 1)",
+    ("version",)
+)
+STORE_CUSTOMERS = Gauge(
+    "segmentation_customer_store_customers",
+    "Customers in the served customer store"
+)
+
+
+def stage(name: str):
+    """Time a block of request work under one stage label"""
+    return STAGE_SECONDS.time(name)
+
+
+def timed_iter(iterable, stage_name: str):
+    """Yield from iterable, timing each fetch (not the consumer's work) as stage_name"""
+    it = iter(iterable)
+    while True:
+        with stage(stage_name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def request_route() -> str:
+    """Route template of the current request (bounded label cardinality)"""
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def record_data_source(source: str, customers: int) -> None:
+    """Count a response served from source for the current route"""
+    route = request_route()
+    DATA_SOURCE_REQUESTS_TOTAL.inc(route, source)
+    DATA_SOURCE_CUSTOMERS_TOTAL.inc(route, source, amount=customers)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that records response serialization time"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with stage("serialization"):
+            return super().dumps(obj, **kwargs)
+
+
+app.json = TimedJSONProvider(app)
+
+
+@app.before_request
+def start_request_timer() -> None:
+    g.request_start = time.perf_counter()
+    ensure_model_watcher()
+    ensure_store_watcher()
+    # Pin the model and customer data for the whole request (including streamed bodies)
+    g.model = model_state
+    g.store = customer_store
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """Count the request and observe its latency under its route template"""
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request_route()
+        status = str(response.status_code)
+        REQUESTS_TOTAL.inc(route, request.method, status)
+        if response.status_code >= 400:
+            REQUEST_ERRORS_TOTAL.inc(route, status)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method)
+    if "model" in g:
+        response.headers["X-Model-Version"] = g.model.version
+    return response
+
 # ============================================================================
 # MODEL & DATA LOADING
 # ============================================================================
-# Load pre-trained artifacts at startup for fast prediction
-try:
+def load_model() -> ModelState:
+    """
+    Load the serving model: registry CURRENT, then the .npz artifact, then pickles.
+    
+    The .npz paths need only NumPy. The pickle fallback imports joblib and
+    scikit-learn, which dominates cold-start time, so it is used only when
+    no serving artifact has been exported.
+    
+    Returns:
+        Validated ModelState
+        
+    Raises:
+        FileNotFoundError: If no artifact set is available
+        ValueError: If the artifact fails validation
+    """
+    version = current_version(MODEL_REGISTRY_DIR)
+    if version is not None:
+        return load_model_state(artifact_path(version, MODEL_REGISTRY_DIR))
+    if os.path.exists(SERVING_ARTIFACT_PATH):
+        return load_model_state(SERVING_ARTIFACT_PATH)
+    
+    import joblib
+    
     kmeans = joblib.load(MODEL_PATH)
     scaler = joblib.load(SCALER_PATH)
     with open(PROFILES_PATH) as f:
         profiles = json.load(f)
-    print("✅ ML models loaded successfully")
+    # Serving kernel with the scaler folded into the centroids (no sklearn per call)
+    scorer = SegmentScorer.from_sklearn(kmeans, scaler, profiles)
+    validate_model(scorer, profiles)
+    return ModelState(scorer, profiles, "pickle", scorer.version, MODEL_PATH, time.time())
+
+
+def artifact_signature() -> Optional[Tuple]:
+    """What the watcher compares: the registry pointer, else the artifact file's stat"""
+    version = current_version(MODEL_REGISTRY_DIR)
+    if version is not None:
+        return ("registry", version)
+    try:
+        stat = os.stat(SERVING_ARTIFACT_PATH)
+    except FileNotFoundError:
+        return None
+    return ("file", stat.st_mtime_ns, stat.st_size)
+
+
+def record_model(state: ModelState) -> None:
+    """Export the served model's version and load time"""
+    MODEL_INFO.replace(1, state.version)
+    MODEL_LOADED_SECONDS.set(state.loaded_at)
+
+
+# Load pre-trained artifacts at startup for fast prediction
+try:
+    # Taken before loading, so a change made while loading is still picked up
+    model_signature: Optional[Tuple] = artifact_signature()
+    model_state: ModelState = load_model()
+    record_model(model_state)
+    MODEL_RELOADS_TOTAL.inc("startup", "swapped")
+    print(f"✅ ML models loaded successfully ({model_state.artifact_format}, version {model_state.version})")
 except FileNotFoundError as e:
     print(f"ERROR: Model artifact not found. Please run train_segmentation.py first.")
     print(f"Missing file: {e}")
     raise
 
-# Load CSV as fallback
-rfm_table: Optional[pd.DataFrame] = None
-if USE_CSV_FALLBACK or not db_available:
+_reload_lock = threading.Lock()
+_watcher_lock = threading.Lock()
+_watcher_pid: Optional[int] = None
+
+
+def active_model() -> ModelState:
+    """Model pinned to the current request, or the latest one outside requests"""
+    if has_app_context() and "model" in g:
+        return g.model
+    return model_state
+
+
+def reload_model(version: Optional[str] = None, trigger: str = "admin") -> Dict[str, Any]:
+    """
+    Load a model in the calling thread, validate it and swap it in.
+    
+    Requests already running keep the ModelState they pinned at their start
+    and finish on the old model; requests starting after the swap use the
+    new one. If loading or validation fails, the current model keeps serving.
+    
+    Args:
+        version: Registry version to activate (rollback or roll forward);
+                 None reloads whatever is current on disk
+        trigger: Metrics label ("watcher" or "admin")
+        
+    Returns:
+        Dictionary with "reloaded", "previous_version" and "model_version"
+        
+    Raises:
+        FileNotFoundError: If the artifact (or registry version) does not exist
+        ValueError: If the artifact fails validation
+    """
+    global model_state, model_signature
+    with _reload_lock:
+        previous = model_state
+        signature = model_signature
+        start = time.perf_counter()
+        try:
+            if version is not None:
+                state = load_model_state(artifact_path(version, MODEL_REGISTRY_DIR))
+                # Point CURRENT at it only once it validated; other workers follow
+                activate(version, MODEL_REGISTRY_DIR)
+                signature = artifact_signature()
+            else:
+                signature = artifact_signature()
+                state = load_model()
+        except Exception:
+            MODEL_RELOADS_TOTAL.inc(trigger, "failed")
+            raise
+        finally:
+            MODEL_RELOAD_SECONDS.observe(time.perf_counter() - start)
+            # A broken artifact is retried only once it changes again
+            model_signature = signature
+        
+        if state.version == previous.version:
+            MODEL_RELOADS_TOTAL.inc(trigger, "unchanged")
+            return {"reloaded": False, "previous_version": previous.version, "model_version": state.version}
+        
+        # Single reference swap; readers see either the old or the new state
+        model_state = state
+        record_model(state)
+        MODEL_RELOADS_TOTAL.inc(trigger, "swapped")
+        print(f"🔄 Model {previous.version} -> {state.version} ({trigger}, pid {os.getpid()})")
+        return {"reloaded": True, "previous_version": previous.version, "model_version": state.version}
+
+
+def watch_model_artifacts() -> None:
+    """Poll the registry pointer (or artifact file) and reload when it changes"""
+    while True:
+        time.sleep(MODEL_WATCH_SECONDS)
+        try:
+            if artifact_signature() not in (None, model_signature):
+                reload_model(trigger="watcher")
+        except Exception as e:
+            print(f"⚠️ Model reload failed, still serving {model_state.version}: {e}")
+
+
+def ensure_model_watcher() -> None:
+    """
+    Start the model watcher in this process if it is not running yet.
+    
+    Started lazily from the first request: under gunicorn the app is loaded
+    in the master, and threads do not survive the fork into workers. A model
+    published since the master loaded is picked up before that first request.
+    """
+    global _watcher_pid
+    if MODEL_WATCH_SECONDS <= 0 or _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+        try:
+            if artifact_signature() not in (None, model_signature):
+                reload_model(trigger="watcher")
+        except Exception as e:
+            print(f"⚠️ Model reload failed, still serving {model_state.version}: {e}")
+        threading.Thread(target=watch_model_artifacts, name="model-watcher", daemon=True).start()
+
+def load_customer_store() -> CustomerStore:
+    """
+    Load the fallback customer table, preferring the memory-mapped snapshot.
+
+    The snapshot is opened with read-only memory maps, so every worker shares
+    the same pages and only the ID and RFM columns are touched. The CSV is
+    parsed only when no snapshot has been built. Delta files for the loaded
+    base go into an overlay on top (only the overlay is private to the worker).
+
+    Returns:
+        Loaded CustomerStore
+
+    Raises:
+        FileNotFoundError: If neither the snapshot nor the CSV exists
+        ValueError: If the snapshot or a delta file is malformed
+    """
+    manifest_path = os.path.join(RFM_SNAPSHOT_PATH, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        store = CustomerStore.open_snapshot(RFM_SNAPSHOT_PATH)
+        if os.path.exists(RFM_PATH) and os.path.getmtime(RFM_PATH) > os.path.getmtime(manifest_path):
+            print(f"⚠️ {RFM_PATH} is newer than the snapshot; run build_customer_snapshot.py")
+        print(f"✅ Customer snapshot mapped: {len(store)} customers (version {store.version})")
+    else:
+        store = CustomerStore.from_csv(RFM_PATH)
+        print(f"✅ CSV fallback loaded: {len(store)} customers")
+    return apply_pending_deltas(store)
+
+
+def apply_pending_deltas(store: CustomerStore) -> CustomerStore:
+    """Merge the delta files of the store's base that it has not applied yet"""
+    for name in pending_deltas(RFM_DELTA_DIR, store):
+        store = store.apply_delta(load_delta(os.path.join(RFM_DELTA_DIR, name)), name)
+        print(f"✅ Customer delta {name} applied: {len(store)} customers (version {store.version})")
+    return store
+
+
+def store_signature() -> Optional[Tuple]:
+    """
+    What the store watcher compares: the base on disk and its delta files.
+
+    Returns:
+        (source, base version, CSV version, delta file names), or None when
+        there is no customer data on disk
+    """
+    try:
+        stat = os.stat(RFM_PATH)
+        # Same version string CustomerStore.from_csv assigns
+        csv_version = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    except FileNotFoundError:
+        csv_version = None
     try:
-        rfm_table = pd.read_csv(RFM_PATH)
-        print(f"✅ CSV fallback loaded: {len(rfm_table)} customers")
+        with open(os.path.join(RFM_SNAPSHOT_PATH, MANIFEST_NAME)) as f:
+            source, base_version = "snapshot", json.load(f)["version"]
+    except FileNotFoundError:
+        if csv_version is None:
+            return None
+        source, base_version = "csv", csv_version
+    base = CustomerStore([], [], [], [], version=base_version)
+    return (source, base_version, csv_version, tuple(pending_deltas(RFM_DELTA_DIR, base)))
+
+
+def record_store(store: CustomerStore) -> None:
+    """Export the served customer store's version and size"""
+    STORE_INFO.replace(1, store.version)
+    STORE_CUSTOMERS.set(len(store))
+
+
+# Load the fallback customer table into an indexed store (no pandas on the request path)
+customer_store: Optional[CustomerStore] = None
+store_signature_loaded: Optional[Tuple] = None
+if USE_CSV_FALLBACK or not DATABASE_MODULE_LOADED:
+    try:
+        # Taken before loading, so a change made while loading is still picked up
+        store_signature_loaded = store_signature()
+        customer_store = load_customer_store()
+        record_store(customer_store)
+        STORE_RELOADS_TOTAL.inc("startup", "swapped")
     except FileNotFoundError:
         print(f"⚠️ CSV file not found: {RFM_PATH}")
-        if not db_available:
+        if not DATABASE_MODULE_LOADED:
             raise RuntimeError("Neither database nor CSV file available!")
 
-# Initialize database if available
-if db_available:
-    init_db()
+_store_reload_lock = threading.Lock()
+_store_watcher_lock = threading.Lock()
+_store_watcher_pid: Optional[int] = None
+
+
+def active_store() -> Optional[CustomerStore]:
+    """Customer store pinned to the current request, or the latest one outside requests"""
+    if has_app_context() and "store" in g:
+        return g.store
+    return customer_store
+
+
+def reload_customer_store() -> Dict[str, Any]:
+    """
+    Build the customer store for the data on disk and swap it in.
+
+    A changed base (new snapshot manifest, or a rewritten CSV when no
+    snapshot exists) is loaded in full; otherwise only the delta files not
+    applied yet are added to the overlay of a new store sharing the current
+    base arrays. The store being
+    served is never modified: requests that pinned it finish on it, and
+    requests starting after the swap use the new one. If building fails, the
+    current store keeps serving.
+
+    Returns:
+        Dictionary with "reloaded", "kind", "previous_version" and "version"
+
+    Raises:
+        FileNotFoundError: If the customer data disappeared while loading
+        ValueError: If the snapshot or a delta file is malformed, or the new
+                    store is empty
+    """
+    global customer_store, store_signature_loaded
+    with _store_reload_lock:
+        previous = customer_store
+        previous_signature = store_signature_loaded
+        signature = store_signature()
+        full = previous is None or signature is None or signature[1] != previous.base_version
+        kind = "full" if full else "delta"
+        start = time.perf_counter()
+        try:
+            store = load_customer_store() if full else apply_pending_deltas(previous)
+            if len(store) == 0:
+                raise ValueError("New customer store is empty")
+        except Exception:
+            STORE_RELOADS_TOTAL.inc(kind, "failed")
+            raise
+        finally:
+            STORE_RELOAD_SECONDS.observe(time.perf_counter() - start, kind)
+            # Broken data is retried only once it changes again
+            store_signature_loaded = signature
+
+        previous_version = previous.version if previous is not None else None
+        if store.version == previous_version:
+            if (signature is not None and previous_signature is not None
+                    and signature[0] == "snapshot" and signature[2] != previous_signature[2]):
+                print(f"⚠️ {RFM_PATH} changed but the snapshot did not; run build_customer_snapshot.py")
+            STORE_RELOADS_TOTAL.inc(kind, "unchanged")
+            return {"reloaded": False, "kind": kind, "previous_version": previous_version, "version": store.version}
+
+        # Single reference swap; readers see either the old or the new store
+        customer_store = store
+        record_store(store)
+        STORE_RELOADS_TOTAL.inc(kind, "swapped")
+        print(f"🔄 Customer store {previous_version} -> {store.version} ({kind}, pid {os.getpid()})")
+        return {"reloaded": True, "kind": kind, "previous_version": previous_version, "version": store.version}
+
+
+def watch_customer_store() -> None:
+    """
+    Poll the customer data on disk and reload when it changes.
+
+    Snapshot manifests and delta files are renamed into place, so they are
+    picked up on the first poll that sees them. A CSV may be rewritten in
+    place, so a changed CSV is reloaded only once it looks the same on two
+    consecutive polls.
+    """
+    last_seen = store_signature_loaded
+    while True:
+        time.sleep(STORE_WATCH_SECONDS)
+        try:
+            signature = store_signature()
+            settled = signature == last_seen or (signature is not None and signature[0] == "snapshot")
+            last_seen = signature
+            if signature is not None and settled and signature != store_signature_loaded:
+                reload_customer_store()
+        except Exception as e:
+            print(f"⚠️ Customer store reload failed, still serving {customer_store.version}: {e}")
+
+
+def ensure_store_watcher() -> None:
+    """
+    Start the customer store watcher in this process if it is not running yet.
+
+    Started lazily from the first request, like the model watcher. A snapshot
+    or delta published since the master loaded is applied before that first
+    request; a changed CSV is left to the watcher, which waits for it to settle.
+    """
+    global _store_watcher_pid
+    if STORE_WATCH_SECONDS <= 0 or customer_store is None or _store_watcher_pid == os.getpid():
+        return
+    with _store_watcher_lock:
+        if _store_watcher_pid == os.getpid():
+            return
+        _store_watcher_pid = os.getpid()
+        try:
+            signature = store_signature()
+            if signature is not None and signature[0] == "snapshot" and signature != store_signature_loaded:
+                reload_customer_store()
+        except Exception as e:
+            print(f"⚠️ Customer store reload failed, still serving {customer_store.version}: {e}")
+        threading.Thread(target=watch_customer_store, name="store-watcher", daemon=True).start()
+
+
+def database_available() -> bool:
+    """Whether the database module is loaded and the database is reachable"""
+    return DATABASE_MODULE_LOADED and is_db_available()
+
+
+def request_db():
+    """
+    Get the database session for the current app context.
+    
+    The session is opened on first use within a request and returned to the
+    pool by close_request_db when the app context tears down.
+    
+    Returns:
+        SQLAlchemy session, or None if the database is unavailable
+    """
+    if "db" not in g:
+        g.db = get_db() if database_available() else None
+    return g.db
+
+
+@app.teardown_appcontext
+def close_request_db(exc: Optional[BaseException]) -> None:
+    """Return the request's database session to the pool"""
+    db = g.pop("db", None)
+    if db is not None:
+        db.close()
+
+
+def prepare_database() -> None:
+    """Connect, create tables and materialize segments off the request path"""
+    if not database_available():
+        return
+    
+    try:
+        init_db()
+        if MATERIALIZE_SEGMENTS:
+            materialize_segments()
+    except Exception as e:
+        print(f"⚠️ Database preparation failed: {e}")
+
+
+def materialize_segments() -> None:
+    """Persist assignments for unscored or stale customer_rfm rows"""
+    state = model_state
+    try:
+        updated = refresh_segment_assignments(
+            lambda features: score_customers(features, state)[:2],
+            state.version
+        )
+        print(f"✅ Materialized segments for {updated} customers (version {state.version})")
+    except Exception as e:
+        print(f"⚠️ Segment materialization failed: {e}")
 
 
 def predict_segment(recency: float, frequency: float, monetary: float) -> Dict[str, Any]:
@@ -100,32 +710,306 @@ def predict_segment(recency: float, frequency: float, monetary: float) -> Dict[s
         - stats: Statistical profile of the segment
         - confidence: Confidence score (0-1) based on distance to cluster center
         - distance_to_center: Euclidean distance to assigned cluster center
+        - model_version: Version of the model that produced the assignment
     """
-    # Create feature vector and scale using the fitted scaler
-    X = np.array([[recency, frequency, monetary]])
-    X_scaled = scaler.transform(X)
-    
-    # Predict cluster assignment
-    cid = int(kmeans.predict(X_scaled)[0])
+    state = active_model()
+    # Assign to the nearest folded centroid and measure the scaled distance
+    # Scaling is folded into the single-point kernel, so it counts as prediction
+    with stage("prediction"):
+        cid, dist = state.scorer.score_one(recency, frequency, monetary)
+    return segment_result(cid, dist, state)
+
+
+def segment_result(cid: int, dist: float, state: Optional[ModelState] = None) -> Dict[str, Any]:
+    """
+    Build the single-customer prediction payload for an assigned segment.
     
+    Args:
+        cid: Assigned cluster ID
+        dist: Euclidean distance to the assigned cluster center
+        state: Model that made the assignment (default: active_model())
+        
+    Returns:
+        Prediction dictionary (see predict_segment)
+    """
+    state = state or active_model()
     # Calculate confidence as inverse of distance to cluster center
     # Points close to center have higher confidence
-    center = kmeans.cluster_centers_[cid].reshape(1, -1)
-    dist = float(euclidean_distances(X_scaled, center)[0][0])
     confidence = max(0, 1 - dist / 5)  # Normalize distance (assume max dist ~5)
 
     # Retrieve segment profile from pre-computed profiles
-    profile = profiles[str(cid)]
+    profile = state.profiles[str(cid)]
     
     return {
         "segment_id": cid,
         "segment_name": profile["segment_name"],
         "stats": {k: v for k, v in profile.items() if k != "segment_name"},
         "confidence": confidence,
-        "distance_to_center": dist
+        "distance_to_center": dist,
+        "model_version": state.version
     }
 
 
+def predict_segments(features: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Predict segments for a batch of raw RFM rows in one vectorized call.
+    
+    Args:
+        features: (N, 3) matrix of raw Recency, Frequency, Monetary values
+        
+    Returns:
+        List of N prediction dictionaries (see predict_segment)
+    """
+    # One state for the whole batch (the coalescer calls this outside any request)
+    state = active_model()
+    labels, distances, _ = score_customers(features, state)
+    return [segment_result(int(cid), float(dist), state) for cid, dist in zip(labels, distances)]
+
+
+# Opt-in micro-batching of concurrent /segment/manual requests
+manual_coalescer: Optional[BatchCoalescer] = None
+if COALESCE_MANUAL:
+    manual_coalescer = BatchCoalescer(
+        predict_segments,
+        max_batch=COALESCE_MAX_BATCH,
+        max_wait=COALESCE_MAX_WAIT_MS / 1000.0
+    )
+    print(f"✅ Coalescing /segment/manual (batch ≤ {COALESCE_MAX_BATCH}, wait ≤ {COALESCE_MAX_WAIT_MS}ms)")
+
+
+def score_customers(
+    features: np.ndarray,
+    state: Optional[ModelState] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score a whole batch of customers in a single vectorized pass.
+    
+    Args:
+        features: (N, 3) matrix of raw Recency, Frequency, Monetary values
+        state: Model to score with (default: active_model())
+        
+    Returns:
+        Tuple of (segment_ids, distances, confidences), each an (N,) array
+    """
+    scorer = (state or active_model()).scorer
+    with stage("scaling"):
+        X_folded = scorer.transform(features)
+    with stage("prediction"):
+        labels, distances = scorer.assign(X_folded)
+    return labels, distances, confidence_from_distance(distances)
+
+
+def group_segments(customer_ids: np.ndarray, labels: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Build the grouped segment payload returned by the batch endpoints.
+    
+    Args:
+        customer_ids: (N,) array of customer IDs
+        labels: (N,) array of assigned segment IDs
+        
+    Returns:
+        List of {"segment_id", "segment_name", "customers"} dictionaries
+    """
+    profiles = active_model().profiles
+    return [
+        {
+            "segment_id": sid,
+            "segment_name": profiles[str(sid)]["segment_name"],
+            "customers": ids.astype(np.int64).tolist()
+        }
+        for sid, ids in group_ids_by_segment(customer_ids, labels)
+    ]
+
+
+def score_db_rows(rows: List[Tuple]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score customer_rfm rows, reusing materialized assignments where current.
+    
+    Rows whose model_version matches the loaded model are served straight
+    from their segment_id/distance_to_center columns; only the remaining
+    rows go through inference.
+    
+    Args:
+        rows: Tuples of (customer_id, recency, frequency, monetary,
+              segment_id, distance_to_center, model_version)
+        
+    Returns:
+        Tuple of (customer_ids, segment_ids, distances), each an (N,) array
+    """
+    version = active_model().version
+    matrix = np.array([row[:4] for row in rows], dtype=np.float64).reshape(-1, 4)
+    fresh = np.array(
+        [row[6] == version and row[4] is not None for row in rows],
+        dtype=bool
+    )
+    
+    labels = np.zeros(len(rows), dtype=np.int64)
+    distances = np.zeros(len(rows), dtype=np.float64)
+    if fresh.any():
+        labels[fresh] = [row[4] for row, hit in zip(rows, fresh) if hit]
+        distances[fresh] = [row[5] for row, hit in zip(rows, fresh) if hit]
+    if not fresh.all():
+        stale = ~fresh
+        labels[stale], distances[stale], _ = score_customers(matrix[stale, 1:])
+    
+    return matrix[:, 0], labels, distances
+
+
+def scoring_columns() -> Tuple:
+    """customer_rfm columns needed by score_db_rows, in order"""
+    return (
+        CustomerRFM.customer_id,
+        CustomerRFM.recency,
+        CustomerRFM.frequency,
+        CustomerRFM.monetary,
+        CustomerRFM.segment_id,
+        CustomerRFM.distance_to_center,
+        CustomerRFM.model_version
+    )
+
+
+def query_scoring_rows(db):
+    """Query customer_rfm columns needed by score_db_rows"""
+    return db.query(*scoring_columns())
+
+
+def ndjson(record: Dict[str, Any]) -> str:
+    """Serialize one record as a newline-delimited JSON line"""
+    with stage("serialization"):
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def stream_segments(customer_count: int):
+    """
+    Score customers chunk by chunk and yield NDJSON records as they are ready.
+    
+    Yields one {"type": "segment", ...} record per segment per chunk (same
+    fields as the /api/segment segment entries), followed by a single
+    {"type": "summary", "data_source", "total_customers"} record. Failures
+    after the response has started are reported as a {"type": "error"} record.
+    
+    Args:
+        customer_count: Maximum number of customers to score
+        
+    Yields:
+        NDJSON lines
+    """
+    total = 0
+    data_source = "unknown"
+    
+    try:
+        # Try database first, walking customer_rfm in primary key order
+        db = request_db()
+        if db:
+            chunks = iter_rfm_chunks(
+                db, scoring_columns(), STREAM_CHUNK_SIZE, limit=customer_count
+            )
+            for chunk in timed_iter(chunks, "db_fetch"):
+                data_source = "database"
+                customer_ids, labels, _ = score_db_rows([row[1:] for row in chunk])
+                for seg in group_segments(customer_ids, labels):
+                    yield ndjson({"type": "segment", **seg})
+                total += len(chunk)
+        
+        # Fallback to CSV
+        store = active_store()
+        if total == 0 and store is not None:
+            data_source = "csv"
+            end = min(customer_count, len(store))
+            for start in range(0, end, STREAM_CHUNK_SIZE):
+                rows = slice(start, min(start + STREAM_CHUNK_SIZE, end))
+                with stage("csv_lookup"):
+                    features = store.features(rows)
+                labels, _, _ = score_customers(features)
+                for seg in group_segments(store.ids(rows), labels):
+                    yield ndjson({"type": "segment", **seg})
+                total += rows.stop - rows.start
+        
+        record_data_source(data_source, total)
+        yield ndjson({
+            "type": "summary",
+            "data_source": data_source,
+            "total_customers": total,
+            "model_version": active_model().version
+        })
+    
+    except Exception as e:
+        yield ndjson({"type": "error", "error": f"Server error: {str(e)}"})
+
+
+# Engine creation, table setup and materialization never block startup
+if DATABASE_MODULE_LOADED:
+    threading.Thread(target=prepare_database, daemon=True).start()
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Encode pagination state as an opaque URL-safe token"""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """
+    Decode a token produced by encode_cursor.
+    
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    
+    if not isinstance(state, dict) or state.get("src") not in ("database", "csv"):
+        raise ValueError("Malformed cursor")
+    return state
+
+
+def start_database_cursor(db, partition: Optional[Tuple[int, int]]) -> Optional[Dict[str, Any]]:
+    """
+    Pin a customer_rfm snapshot for a new cursor.
+    
+    The cursor walks primary keys in (after, until]; until is fixed to the
+    current maximum id so rows inserted later never shift the pages.
+    
+    Args:
+        db: Open database session
+        partition: Optional (index, count) to restrict the cursor to one of
+                   count equal primary key ranges
+        
+    Returns:
+        Initial cursor state, or None if customer_rfm is empty
+    """
+    lo, hi = db.query(func.min(CustomerRFM.id), func.max(CustomerRFM.id)).one()
+    if hi is None:
+        return None
+    
+    after, until = lo - 1, hi
+    if partition is not None:
+        index, count = partition
+        span = hi - lo + 1
+        after, until = lo - 1 + index * span // count, lo - 1 + (index + 1) * span // count
+    return {"src": "database", "after": after, "until": until}
+
+
+def start_csv_cursor(partition: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+    """
+    Pin the CSV customer store snapshot for a new cursor.
+    
+    Args:
+        partition: Optional (index, count) to restrict the cursor to one of
+                   count equally sized customer ID ranges
+        
+    Returns:
+        Initial cursor state
+    """
+    after, until = (None, None)
+    if partition is not None:
+        after, until = g.store.partition_bounds(*partition)
+    return {"src": "csv", "after": after, "until": until, "snap": g.store.version}
+
+
 @app.route("/health")
 def health() -> Dict[str, str]:
     """
@@ -137,6 +1021,93 @@ def health() -> Dict[str, str]:
     return {"status": "ok", "service": "segmentation-agent"}
 
 
+@app.route("/health/db")
+def health_db() -> Dict[str, Any]:
+    """
+    Database health and connection pool statistics.
+    
+    Returns:
+        JSON with database availability and pool usage (size, checked in,
+        checked out, overflow) for sizing workers against the pool
+    """
+    if not DATABASE_MODULE_LOADED:
+        return {"available": False, "pool": {"status": "module_not_loaded"}}
+    return {"available": database_available(), "pool": pool_stats()}
+
+
+@app.route("/ready")
+def ready() -> Tuple[Dict[str, Any], int]:
+    """
+    Readiness check reporting the artifacts this worker serves from.
+    
+    Everything listed here is loaded before workers fork. After a model or
+    customer data reload, workers report the new version within one watcher
+    interval (MODEL_WATCH_SECONDS / STORE_WATCH_SECONDS) of each other.
+    
+    Returns:
+        JSON with model, customer data and database status, and status code:
+        - 200: Ready to serve
+        - 503: No customer data source (neither customer store nor database)
+    """
+    store_info = None
+    if g.store is not None:
+        store_info = {
+            "source": "snapshot" if g.store.manifest is not None else "csv",
+            "customers": len(g.store),
+            "version": g.store.version,
+            "deltas": len(g.store.deltas)
+        }
+    
+    db_ready = database_available()
+    is_ready = store_info is not None or db_ready
+    return {
+        "ready": is_ready,
+        "pid": os.getpid(),
+        "model": {
+            "format": g.model.artifact_format,
+            "version": g.model.version,
+            "n_clusters": g.model.scorer.n_clusters,
+            "source": g.model.source,
+            "loaded_at": g.model.loaded_at
+        },
+        "customer_store": store_info,
+        "database": db_ready
+    }, 200 if is_ready else 503
+
+
+@app.route("/metrics")
+def metrics() -> Response:
+    """
+    Prometheus metrics for this worker process.
+    
+    Under gunicorn every worker keeps its own series; scrape each worker (or
+    aggregate by pid) rather than relying on one load-balanced scrape.
+    
+    Returns:
+        Text exposition format; coalescer histograms appear only when
+        COALESCE_MANUAL is enabled
+    """
+    exported = [
+        REQUESTS_TOTAL,
+        REQUEST_ERRORS_TOTAL,
+        REQUEST_SECONDS,
+        STAGE_SECONDS,
+        DATA_SOURCE_REQUESTS_TOTAL,
+        DATA_SOURCE_CUSTOMERS_TOTAL,
+        MODEL_RELOADS_TOTAL,
+        MODEL_RELOAD_SECONDS,
+        MODEL_INFO,
+        MODEL_LOADED_SECONDS,
+        STORE_RELOADS_TOTAL,
+        STORE_RELOAD_SECONDS,
+        STORE_INFO,
+        STORE_CUSTOMERS
+    ]
+    if manual_coalescer is not None:
+        exported.extend(manual_coalescer.metrics())
+    return Response(render_prometheus(exported), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/segment/manual", methods=["POST"])
 def manual() -> Tuple[Dict[str, Any], int]:
     """
@@ -167,11 +1138,17 @@ def manual() -> Tuple[Dict[str, Any], int]:
             }, 400
         
         # Predict segment
-        seg = predict_segment(
-            data["recency"], 
-            data["frequency"], 
-            data["monetary"]
-        )
+        if manual_coalescer is not None:
+            row = [float(data[k]) for k in ("recency", "frequency", "monetary")]
+            if not all(math.isfinite(v) for v in row):
+                raise ValueError("Input contains NaN or infinity")
+            seg = manual_coalescer.submit(row)
+        else:
+            seg = predict_segment(
+                data["recency"], 
+                data["frequency"], 
+                data["monetary"]
+            )
         return jsonify(seg), 200
         
     except (ValueError, TypeError) as e:
@@ -209,31 +1186,36 @@ def by_customer() -> Tuple[Dict[str, Any], int]:
         customer_id = float(data["customer_id"])
         
         # Try database first
-        if db_available:
-            db = get_db()
-            if db:
+        db = request_db()
+        if db:
+            with stage("db_fetch"):
                 customer = db.query(CustomerRFM).filter(
                     CustomerRFM.customer_id == customer_id
                 ).first()
-                db.close()
                 
-                if customer:
+            if customer:
+                if customer.model_version == g.model.version and customer.segment_id is not None:
+                    # Materialized assignment is current: skip inference
+                    seg = segment_result(customer.segment_id, customer.distance_to_center)
+                else:
                     seg = predict_segment(
                         customer.recency,
                         customer.frequency,
                         customer.monetary
                     )
-                    seg["data_source"] = "database"
-                    return jsonify(seg), 200
+                seg["data_source"] = "database"
+                record_data_source("database", 1)
+                return jsonify(seg), 200
         
         # Fallback to CSV
-        if rfm_table is not None:
-            row = rfm_table[rfm_table["CustomerID"] == customer_id]
+        if g.store is not None:
+            with stage("csv_lookup"):
+                rfm = g.store.get(customer_id)
             
-            if not row.empty:
-                row = row.iloc[0]
-                seg = predict_segment(row["Recency"], row["Frequency"], row["Monetary"])
+            if rfm is not None:
+                seg = predict_segment(*rfm)
                 seg["data_source"] = "csv"
+                record_data_source("csv", 1)
                 return jsonify(seg), 200
         
         # Customer not found in either source
@@ -245,19 +1227,131 @@ def by_customer() -> Tuple[Dict[str, Any], int]:
         return {"error": f"Server error: {str(e)}"}, 500
 
 
+@app.route("/segment/customers", methods=["POST"])
+def by_customers() -> Tuple[Dict[str, Any], int]:
+    """
+    Predict segments for many customers in one request.
+    Fetches all IDs with a single database query, looks up any IDs the
+    database did not return in the CSV table, and scores everything in one
+    vectorized pass.
+    
+    Request JSON:
+    {
+        "customer_ids": [<string or int: customer ID>, ...]
+    }
+    
+    Returns:
+        JSON response with per-customer predictions (in request order) and
+        the list of IDs that were not found in either source
+        HTTP 400 if invalid input
+    """
+    try:
+        data = request.get_json()
+        
+        # Validate input
+        if not data:
+            return {"error": "No JSON data provided"}, 400
+        
+        if not isinstance(data.get("customer_ids"), list):
+            return {"error": "Missing 'customer_ids' list in request"}, 400
+        
+        if len(data["customer_ids"]) > MAX_BULK_CUSTOMERS:
+            return {
+                "error": f"Too many customer_ids. Maximum: {MAX_BULK_CUSTOMERS}"
+            }, 400
+        
+        # De-duplicate while keeping the caller's order
+        requested = list(dict.fromkeys(float(cid) for cid in data["customer_ids"]))
+        
+        found_ids: List[np.ndarray] = []
+        found_labels: List[np.ndarray] = []
+        found_distances: List[np.ndarray] = []
+        found_sources: List[str] = []
+        remaining = requested
+        
+        # Try database first: one session, one IN (...) query
+        db = request_db() if remaining else None
+        if db:
+            with stage("db_fetch"):
+                rows = query_scoring_rows(db).filter(
+                    CustomerRFM.customer_id.in_(remaining)
+                ).all()
+                
+            if rows:
+                ids, labels, distances = score_db_rows(rows)
+                found_ids.append(ids)
+                found_labels.append(labels)
+                found_distances.append(distances)
+                found_sources.extend(["database"] * len(rows))
+                record_data_source("database", len(rows))
+                seen = set(ids.tolist())
+                remaining = [cid for cid in remaining if cid not in seen]
+        
+        # Fallback to CSV for anything the database did not return
+        if g.store is not None and remaining:
+            with stage("csv_lookup"):
+                rows, found = g.store.find_many(np.array(remaining))
+                features = g.store.features(rows)
+            
+            if len(rows):
+                labels, distances, _ = score_customers(features)
+                found_ids.append(g.store.ids(rows).astype(np.float64))
+                found_labels.append(labels)
+                found_distances.append(distances)
+                found_sources.extend(["csv"] * len(rows))
+                record_data_source("csv", len(rows))
+                remaining = [cid for cid, hit in zip(remaining, found) if not hit]
+        
+        customers: List[Dict[str, Any]] = []
+        if found_ids:
+            ids = np.concatenate(found_ids)
+            labels = np.concatenate(found_labels)
+            distances = np.concatenate(found_distances)
+            confidences = confidence_from_distance(distances)
+            
+            # Return predictions in the order the IDs were requested
+            position = {cid: i for i, cid in enumerate(requested)}
+            for i in sorted(range(len(ids)), key=lambda i: position[float(ids[i])]):
+                sid = int(labels[i])
+                customers.append({
+                    "customer_id": int(ids[i]),
+                    "segment_id": sid,
+                    "segment_name": g.model.profiles[str(sid)]["segment_name"],
+                    "confidence": float(confidences[i]),
+                    "distance_to_center": float(distances[i]),
+                    "data_source": found_sources[i]
+                })
+        
+        response = {
+            "customers": customers,
+            "missing": [int(cid) if cid.is_integer() else cid for cid in remaining],
+            "total_customers": len(customers),
+            "model_version": g.model.version
+        }
+        return jsonify(response), 200
+        
+    except (ValueError, TypeError) as e:
+        return {"error": f"Invalid customer_ids: {str(e)}"}, 400
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}, 500
+
+
 @app.route("/api/segment", methods=["POST"])
 def segment_batch():
     """
     Batch segmentation for N customers.
     First tries database, falls back to CSV if unavailable.
+    All customers are scored in one vectorized pass (see scoring.py).
 
     Request JSON:
     {
-        "customer_count": <int>
+        "customer_count": <int>,
+        "stream": <bool, optional: stream NDJSON chunks instead of one document>
     }
 
     Returns:
-        List of segments with customers grouped by segment.
+        List of segments with customers grouped by segment, or an
+        application/x-ndjson stream (see stream_segments) when "stream" is true.
     """
     try:
         data = request.get_json()
@@ -266,76 +1360,298 @@ def segment_batch():
             return {"error": "Missing 'customer_count' in request"}, 400
 
         customer_count = int(data["customer_count"])
-        results = {}
+        
+        if data.get("stream"):
+            return Response(
+                stream_with_context(stream_segments(customer_count)),
+                mimetype="application/x-ndjson"
+            )
+        
+        segments: List[Dict[str, Any]] = []
         data_source = "unknown"
 
         # Try database first
-        if db_available:
-            db = get_db()
-            if db:
-                customers = db.query(CustomerRFM).limit(customer_count).all()
-                db.close()
+        db = request_db()
+        if db:
+            with stage("db_fetch"):
+                rows = query_scoring_rows(db).limit(customer_count).all()
                 
-                if customers:
-                    data_source = "database"
-                    for customer in customers:
-                        customer_id = int(customer.customer_id)
-                        
-                        seg = predict_segment(
-                            customer.recency,
-                            customer.frequency,
-                            customer.monetary
-                        )
-                        
-                        sid = seg["segment_id"]
-                        sname = seg["segment_name"]
-                        
-                        if sid not in results:
-                            results[sid] = {
-                                "segment_id": sid,
-                                "segment_name": sname,
-                                "customers": []
-                            }
-                        
-                        results[sid]["customers"].append(customer_id)
+            if rows:
+                data_source = "database"
+                customer_ids, labels, _ = score_db_rows(rows)
+                segments = group_segments(customer_ids, labels)
 
         # Fallback to CSV
-        if not results and rfm_table is not None:
+        if not segments and g.store is not None:
             data_source = "csv"
-            rfm_df = rfm_table.head(customer_count)
+            with stage("csv_lookup"):
+                customer_ids, features = g.store.head(customer_count)
 
-            for _, row in rfm_df.iterrows():
-                customer_id = int(row["CustomerID"])
+            if len(customer_ids):
+                labels, _, _ = score_customers(features)
+                segments = group_segments(customer_ids, labels)
 
-                seg = predict_segment(
-                    row["Recency"],
-                    row["Frequency"],
-                    row["Monetary"]
-                )
+        response = {
+            "segments": segments,
+            "data_source": data_source,
+            "total_customers": sum(len(seg["customers"]) for seg in segments),
+            "model_version": g.model.version
+        }
+        record_data_source(data_source, response["total_customers"])
+        
+        return jsonify(response), 200
 
-                sid = seg["segment_id"]
-                sname = seg["segment_name"]
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}, 500
 
-                if sid not in results:
-                    results[sid] = {
-                        "segment_id": sid,
-                        "segment_name": sname,
-                        "customers": []
-                    }
 
-                results[sid]["customers"].append(customer_id)
+@app.route("/api/segment/page", methods=["POST"])
+def segment_page():
+    """
+    Cursor-paginated batch segmentation over the full customer base.
+    Pages are keyed on customer_rfm.id (database) or customer ID (CSV), so
+    every page costs the same no matter how deep into the table it is.
+    Each cursor is pinned to the snapshot it started from.
+
+    Request JSON:
+    {
+        "page_size": <int, optional: customers per page>,
+        "cursor": <string, optional: "next_cursor" from the previous page>,
+        "partition": <optional, first page only: {"index": <int>, "count": <int>}>
+    }
+
+    Returns:
+        Segments with customers grouped by segment (same format as
+        /api/segment) plus "next_cursor" (null on the last page)
+        HTTP 400 if invalid input or malformed cursor
+        HTTP 409 if the CSV snapshot behind the cursor has been replaced
+        HTTP 503 if the cursor needs the database and it is unavailable
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+
+        page_size = int(data.get("page_size", DEFAULT_PAGE_SIZE))
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            return {"error": f"'page_size' must be between 1 and {MAX_PAGE_SIZE}"}, 400
+
+        partition: Optional[Tuple[int, int]] = None
+        state: Optional[Dict[str, Any]] = None
+        if data.get("cursor"):
+            state = decode_cursor(str(data["cursor"]))
+        elif data.get("partition") is not None:
+            partition = (int(data["partition"]["index"]), int(data["partition"]["count"]))
+            if not 0 <= partition[0] < partition[1]:
+                return {"error": "'partition' needs 0 <= index < count"}, 400
+
+        segments: List[Dict[str, Any]] = []
+        total = 0
+        next_state: Optional[Dict[str, Any]] = None
+
+        # Database pages
+        if state is None or state["src"] == "database":
+            db = request_db()
+            if db:
+                if state is None:
+                    state = start_database_cursor(db, partition)
+                if state is not None:
+                    with stage("db_fetch"):
+                        rows = db.query(CustomerRFM.id, *scoring_columns()).filter(
+                            CustomerRFM.id > state["after"],
+                            CustomerRFM.id <= state["until"]
+                        ).order_by(CustomerRFM.id).limit(page_size + 1).all()
+                    page = rows[:page_size]
+                    if page:
+                        customer_ids, labels, _ = score_db_rows([row[1:] for row in page])
+                        segments = group_segments(customer_ids, labels)
+                        total = len(page)
+                    if len(rows) > page_size:
+                        next_state = {**state, "after": page[-1][0]}
+            elif state is not None:
+                return {"error": "Database unavailable for this cursor"}, 503
+
+        # CSV pages
+        if state is None or state["src"] == "csv":
+            if g.store is None:
+                return {"error": "No customer data source available"}, 503
+
+            if state is None:
+                state = start_csv_cursor(partition)
+            elif state.get("snap") != g.store.version:
+                return {"error": "Cursor snapshot is no longer available; restart pagination"}, 409
+
+            with stage("csv_lookup"):
+                start, end = g.store.rows_between(state["after"], state["until"])
+                stop = min(start + page_size, end)
+                rows = slice(start, stop)
+                features = g.store.features(rows)
+            if stop > start:
+                labels, _, _ = score_customers(features)
+                segments = group_segments(g.store.ids(rows), labels)
+                total = stop - start
+            if stop < end:
+                next_state = {**state, "after": int(g.store.ids(slice(stop - 1, stop))[0])}
 
         response = {
-            "segments": list(results.values()),
-            "data_source": data_source,
-            "total_customers": sum(len(seg["customers"]) for seg in results.values())
+            "segments": segments,
+            "data_source": state["src"],
+            "total_customers": total,
+            "next_cursor": encode_cursor(next_state) if next_state else None,
+            "model_version": g.model.version
         }
-        
+        record_data_source(state["src"], total)
         return jsonify(response), 200
 
+    except (ValueError, TypeError, KeyError) as e:
+        return {"error": f"Invalid input: {str(e)}"}, 400
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}, 500
+
+
+@app.route("/rfm/transactions", methods=["POST"])
+def rfm_transactions() -> Tuple[Dict[str, Any], int]:
+    """
+    Apply a batch of new transactions to customer_rfm (see incremental_rfm.py).
+    
+    Affected customers get updated Recency/Frequency/Monetary values and are
+    re-scored with the current model. Invoices that were already applied are
+    ignored, so retrying a request is safe.
+    
+    Request JSON:
+    {
+        "transactions": [
+            {"InvoiceNo": "581588", "CustomerID": 12347, "InvoiceDate": "2011-12-09 12:50",
+             "Quantity": 12, "UnitPrice": 2.95},
+            ...
+        ],
+        "as_of": <string, optional: ISO date Recency is measured from>
+    }
+    
+    Returns:
+        JSON with invoice and customer counts
+        HTTP 400 if invalid input
+        HTTP 503 if the database is unavailable
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or "transactions" not in data:
+            return {"error": "Missing 'transactions' in request"}, 400
+        
+        lines = data["transactions"]
+        if not isinstance(lines, list) or not lines:
+            return {"error": "'transactions' must be a non-empty list"}, 400
+        if len(lines) > MAX_TRANSACTION_LINES:
+            return {"error": f"Too many transaction lines (max {MAX_TRANSACTION_LINES})"}, 400
+        
+        if not database_available():
+            return {"error": "Database not available"}, 503
+        
+        # pandas is only needed here, keep it off the serving import path
+        import pandas as pd
+        from datetime import date
+        from incremental_rfm import apply_transactions
+        
+        as_of = date.fromisoformat(data["as_of"]) if data.get("as_of") else None
+        with stage("rfm_update"):
+            stats = apply_transactions(
+                pd.DataFrame(lines),
+                lambda features: score_customers(features, g.model)[:2],
+                g.model.version,
+                as_of
+            )
+        return jsonify({**stats, "model_version": g.model.version}), 200
+        
+    except (ValueError, TypeError, KeyError) as e:
+        return {"error": f"Invalid input: {str(e)}"}, 400
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}, 500
+
+
+def admin_error() -> Optional[Tuple[Dict[str, Any], int]]:
+    """Error response if the request may not use the admin endpoints, else None"""
+    if not ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled; set ADMIN_TOKEN"}, 403
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return {"error": "Invalid or missing X-Admin-Token"}, 401
+    return None
+
+
+@app.route("/admin/model")
+def admin_model() -> Tuple[Dict[str, Any], int]:
+    """
+    Model served by this worker and the versions published in the registry.
+    
+    Returns:
+        JSON with the served model and registry contents
+        HTTP 401/403 if the admin token is wrong or not configured
+    """
+    error = admin_error()
+    if error:
+        return error
+    
+    return {
+        "pid": os.getpid(),
+        "model": {
+            "version": g.model.version,
+            "format": g.model.artifact_format,
+            "source": g.model.source,
+            "loaded_at": g.model.loaded_at
+        },
+        "registry": {
+            "directory": MODEL_REGISTRY_DIR,
+            "current": current_version(MODEL_REGISTRY_DIR),
+            "versions": list_versions(MODEL_REGISTRY_DIR)
+        }
+    }, 200
+
+
+@app.route("/admin/model/reload", methods=["POST"])
+def admin_reload_model() -> Tuple[Dict[str, Any], int]:
+    """
+    Load, validate and swap in a model without restarting.
+    
+    Without a version, reloads whatever is current on disk (registry CURRENT,
+    else the .npz artifact). With a version, activates that registry version
+    first (roll forward or back); the other workers follow through their
+    watchers. Requests in flight finish on the model they started with.
+    
+    Request JSON (optional):
+    {
+        "version": <string: registry version, e.g. "3f9a0c2b71de">
+    }
+    
+    Returns:
+        JSON with "reloaded", "previous_version", "model_version" and "pid"
+        HTTP 400 if the version is malformed or the model fails validation
+        HTTP 401/403 if the admin token is wrong or not configured
+        HTTP 404 if the version or artifact does not exist
+    """
+    error = admin_error()
+    if error:
+        return error
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        version = data.get("version")
+        if version is not None and not MODEL_VERSION_PATTERN.match(str(version)):
+            return {"error": "'version' must be a 12-character model version"}, 400
+        
+        result = reload_model(version, trigger="admin")
+        return {**result, "pid": os.getpid()}, 200
+        
+    except FileNotFoundError as e:
+        return {"error": f"Model artifact not found: {str(e)}"}, 404
+    except (ValueError, KeyError) as e:
+        return {"error": f"Model failed validation: {str(e)}"}, 400
     except Exception as e:
         return {"error": f"Server error: {str(e)}"}, 500
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Development server only; production runs under gunicorn (gunicorn.conf.py)
+    app.run(
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "5001")),
+        debug=os.getenv("FLASK_DEBUG", "false").lower() == "true"
+    )
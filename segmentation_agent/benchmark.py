@@ -0,0 +1,834 @@
+"""
+Segmentation Agent Benchmarks
+
+Usage:
+    python benchmark.py startup [--runs 5] [--output startup.json]
+    python benchmark.py serve [--workers 1,2,4] [--threads 4] [--clients 8] [--seconds 10] [--coalesce]
+    python benchmark.py scale [--sizes 10k,100k,1m,10m] [--modes csv,snapshot,database] [--output scale.json]
+    python benchmark.py rfm [--lines 541909] [--repeats 3] [--output rfm.json]
+    python benchmark.py compare baseline.json current.json [--threshold 0.10]
+
+Suites:
+    startup: Cold-start time of importing app.py in a fresh interpreter, with
+             the legacy pickle artifacts vs the compact .npz serving artifact,
+             and with the customer table parsed from CSV vs memory-mapped from
+             the columnar snapshot. Also lists which heavy modules each
+             configuration imported.
+    serve:   Throughput of /segment/manual under gunicorn (gunicorn.conf.py) for
+             several worker counts, with the total proportional memory (PSS)
+             of the master and its workers. PSS counts shared pages once,
+             so copy-on-write sharing of the preloaded app shows up directly.
+             --coalesce turns on micro-batching of /segment/manual.
+    scale:   Synthetic RFM tables (resampled from models/rfm_table.csv) at each
+             size, served from CSV, the memory-mapped snapshot and a local
+             SQLite database standing in for PostgreSQL. Per size and mode it
+             measures startup time, predict_segment latency, /segment/customer
+             latency percentiles and /api/segment throughput. Generated data is
+             cached in --data-dir; everything runs offline on models/.
+    rfm:     Training-side feature build: utils.clean_data + build_rfm_table
+             against the original groupby/lambda implementation, on
+             data/Online Retail.xlsx when present, otherwise on synthetic
+             transactions of the same shape. Checks that both produce
+             identical RFM tables.
+    compare: Diff two --output files and exit 1 if any metric regressed by
+             more than --threshold.
+
+Every suite accepts --output to write machine-readable JSON results.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HEAVY_MODULES = ("sklearn", "pandas", "joblib", "scipy")
+SERVING_ARTIFACT = "models/segment_model.npz"
+MISSING_PATH = os.devnull + ".missing"
+# Registry CURRENT wins over SERVING_ARTIFACT_PATH; hide it so each scenario
+# loads the artifact it names
+NO_REGISTRY = {"MODEL_REGISTRY_DIR": MISSING_PATH}
+RFM_TABLE = "models/rfm_table.csv"
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "segmentation_bench")
+
+# Child process: time the import and report which heavy modules it pulled in
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print("@@" + json.dumps({
+    "import_seconds": elapsed,
+    "artifact_format": app.model_state.artifact_format,
+    "model_source": app.model_state.source,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_startup_probe(env: Dict[str, str]) -> Dict[str, Any]:
+    """Import app.py in a fresh interpreter and return its timing report"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{proc.stderr}")
+
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("@@"))
+    report = json.loads(line[2:])
+    report["wall_seconds"] = wall
+    return report
+
+
+def bench_startup(runs: int) -> List[Dict[str, Any]]:
+    """Compare cold start across model artifact and customer table formats"""
+    base_env = {**os.environ, **NO_REGISTRY, "SERVING_ARTIFACT_PATH": SERVING_ARTIFACT}
+    scenarios = {
+        # Point the artifact path at nothing to force the legacy pickle path
+        "pickle": {**base_env, "SERVING_ARTIFACT_PATH": MISSING_PATH},
+        # Point the snapshot path at nothing to force CSV parsing
+        "npz+csv": {**base_env, "RFM_SNAPSHOT_PATH": MISSING_PATH},
+        "npz": base_env,
+    }
+
+    results = []
+    for name, env in scenarios.items():
+        reports = [run_startup_probe(env) for _ in range(runs)]
+        expected = "pickle" if name == "pickle" else "npz"
+        if reports[0]["artifact_format"] != expected:
+            raise RuntimeError(
+                f"Startup scenario {name} loaded {reports[0]['model_source']} "
+                f"({reports[0]['artifact_format']}), expected the {expected} artifact"
+            )
+        import_times = sorted(r["import_seconds"] for r in reports)
+        wall_times = sorted(r["wall_seconds"] for r in reports)
+        results.append({
+            "suite": "startup",
+            "scenario": name,
+            "runs": runs,
+            "artifact_format": reports[0]["artifact_format"],
+            "heavy_modules": reports[0]["heavy_modules"],
+            "import_median_s": import_times[len(import_times) // 2],
+            "import_min_s": import_times[0],
+            "wall_median_s": wall_times[len(wall_times) // 2],
+        })
+    return results
+
+
+def print_startup(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<10} {'format':<8} {'import (median)':>16} {'process (median)':>17}  heavy modules")
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['artifact_format']:<8} "
+            f"{r['import_median_s'] * 1000:>13.0f} ms {r['wall_median_s'] * 1000:>14.0f} ms  "
+            f"{', '.join(r['heavy_modules']) or '-'}"
+        )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(server: subprocess.Popen, port: int, timeout: float = 60.0) -> Dict[str, Any]:
+    """Poll /ready until the server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/ready")
+            resp = conn.getresponse()
+            body = json.loads(resp.read())
+            conn.close()
+            if resp.status == 200:
+                return body
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not become ready")
+
+
+def _process_tree(pid: int) -> List[int]:
+    """A process and its direct children (gunicorn master + workers)"""
+    pids = [pid]
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(os.path.join(task_dir, tid, "children")) as f:
+            pids.extend(int(p) for p in f.read().split())
+    return pids
+
+
+def _pss_mb(pids: List[int]) -> float:
+    """Total proportional set size in MB (Linux only)"""
+    total_kb = 0
+    for pid in pids:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    total_kb += int(line.split()[1])
+                    break
+    return total_kb / 1024
+
+
+def _load_client(args) -> int:
+    """Send /segment/manual requests over one keep-alive connection until the deadline"""
+    port, deadline, seed = args
+    body = json.dumps({"recency": 10 + seed % 300, "frequency": 1 + seed % 40, "monetary": 50.0 * (seed + 1)})
+    headers = {"Content-Type": "application/json"}
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    done = 0
+    while time.monotonic() < deadline:
+        conn.request("POST", "/segment/manual", body=body, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"Unexpected status {resp.status}")
+        done += 1
+    conn.close()
+    return done
+
+
+def bench_serve(
+    worker_counts: List[int],
+    threads: int,
+    clients: int,
+    seconds: float,
+    coalesce: bool = False
+) -> List[Dict[str, Any]]:
+    """Measure requests/second and total PSS for each gunicorn worker count"""
+    results = []
+    for workers in worker_counts:
+        port = _free_port()
+        env = {
+            **os.environ,
+            "PORT": str(port),
+            "WEB_WORKERS": str(workers),
+            "WEB_THREADS": str(threads),
+            "LOG_LEVEL": "warning",
+            "COALESCE_MANUAL": "true" if coalesce else "false",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", os.devnull, "app:app"],
+            env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_ready(server, port)
+            # Let every worker finish booting before measuring
+            time.sleep(1.0)
+
+            deadline = time.monotonic() + seconds
+            with multiprocessing.Pool(clients) as pool:
+                counts = pool.map(_load_client, [(port, deadline, i) for i in range(clients)])
+
+            results.append({
+                "suite": "serve",
+                "workers": workers,
+                "threads": threads,
+                "clients": clients,
+                "coalesce": coalesce,
+                "requests": sum(counts),
+                "requests_per_s": sum(counts) / seconds,
+                "pss_mb": _pss_mb(_process_tree(server.pid)),
+            })
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return results
+
+
+def print_serve(results: List[Dict[str, Any]]) -> None:
+    base = results[0]["requests_per_s"] if results else 0.0
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'threads':>7} {'req/s':>10} {'speedup':>8} {'PSS total':>11}")
+    for r in results:
+        print(
+            f"{r['workers']:>7} {r['threads']:>7} {r['requests_per_s']:>10.0f} "
+            f"{r['requests_per_s'] / base:>7.2f}x {r['pss_mb']:>8.0f} MB"
+        )
+
+
+# ============================================================================
+# SCALE SUITE: synthetic RFM tables at increasing sizes
+# ============================================================================
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+SYNTHETIC_ID_BASE = 1_000_000
+SYNTHETIC_CHUNK_ROWS = 1_000_000
+SCALE_MODES = ("csv", "snapshot", "database")
+
+
+def parse_size(text: str) -> int:
+    """Parse "10k" / "1m" / "2500" into a row count"""
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def synthetic_rfm_chunks(rows: int, seed: int, source_csv: str):
+    """
+    Yield synthetic RFM chunks resampled from the trained RFM table.
+
+    Each row copies a random real customer and jitters it (recency by a few
+    days, frequency and monetary by ~10%), so segment proportions match the
+    real data. Customer IDs are SYNTHETIC_ID_BASE + row number.
+
+    Yields:
+        Tuple of (customer_ids, features) per chunk of SYNTHETIC_CHUNK_ROWS
+    """
+    from customer_store import CustomerStore
+
+    real = CustomerStore.from_csv(source_csv).features(slice(None))
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, SYNTHETIC_CHUNK_ROWS):
+        n = min(SYNTHETIC_CHUNK_ROWS, rows - start)
+        picked = real[rng.integers(0, len(real), n)]
+        recency = np.maximum(0, picked[:, 0] + rng.integers(-3, 4, n))
+        frequency = np.maximum(1, np.round(picked[:, 1] * rng.lognormal(0.0, 0.1, n)))
+        monetary = np.round(picked[:, 2] * rng.lognormal(0.0, 0.1, n), 2)
+        ids = np.arange(SYNTHETIC_ID_BASE + start, SYNTHETIC_ID_BASE + start + n, dtype=np.int64)
+        yield ids, np.column_stack((recency, frequency, monetary))
+
+
+def build_scale_dataset(rows: int, data_dir: str, seed: int, source_csv: str) -> Dict[str, str]:
+    """
+    Build (or reuse) the CSV, snapshot and SQLite database for one size.
+
+    Args:
+        rows: Number of synthetic customers
+        data_dir: Cache directory for generated data
+        seed: Random seed (part of the cache key)
+        source_csv: Real RFM table to resample from
+
+    Returns:
+        Dictionary with "csv", "snapshot" and "sqlite" paths
+    """
+    import sqlite3
+    from sqlalchemy import create_engine
+    from customer_store import MANIFEST_NAME, write_snapshot
+    from database import Base
+    from scoring import load_serving_artifact
+
+    os.makedirs(data_dir, exist_ok=True)
+    stem = os.path.join(data_dir, f"rfm_{rows}_s{seed}")
+    paths = {"csv": stem + ".csv", "snapshot": stem + "_snapshot", "sqlite": stem + ".db"}
+
+    if not os.path.exists(paths["csv"]):
+        print(f"  generating {rows:,} customers -> {paths['csv']}")
+        tmp_path = paths["csv"] + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("CustomerID,Recency,Frequency,Monetary\n")
+            for ids, features in synthetic_rfm_chunks(rows, seed, source_csv):
+                np.savetxt(
+                    f,
+                    np.column_stack((ids, features)),
+                    fmt=("%d", "%d", "%d", "%.2f"),
+                    delimiter=","
+                )
+        os.replace(tmp_path, paths["csv"])
+
+    if not os.path.exists(os.path.join(paths["snapshot"], MANIFEST_NAME)):
+        print(f"  building snapshot -> {paths['snapshot']}")
+        write_snapshot(paths["csv"], paths["snapshot"])
+
+    if not os.path.exists(paths["sqlite"]):
+        print(f"  loading SQLite database -> {paths['sqlite']}")
+        tmp_path = paths["sqlite"] + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        Base.metadata.create_all(create_engine(f"sqlite:///{tmp_path}"))
+
+        # Pre-materialize assignments, as a production database would have them
+        scorer, _ = load_serving_artifact(SERVING_ARTIFACT)
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for ids, features in synthetic_rfm_chunks(rows, seed, source_csv):
+            labels, distances = scorer.score(features)
+            conn.executemany(
+                "INSERT INTO customer_rfm (customer_id, recency, frequency, monetary, "
+                "segment_id, distance_to_center, model_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(
+                    ids.astype(float).tolist(), features[:, 0].tolist(),
+                    features[:, 1].tolist(), features[:, 2].tolist(),
+                    labels.tolist(), distances.tolist(), [scorer.version] * len(ids)
+                )
+            )
+            conn.commit()
+        conn.close()
+        os.replace(tmp_path, paths["sqlite"])
+
+    return paths
+
+
+def scale_env(mode: str, paths: Dict[str, str]) -> Dict[str, str]:
+    """Environment that makes app.py serve from one data source"""
+    env = {
+        **os.environ,
+        **NO_REGISTRY,
+        "SERVING_ARTIFACT_PATH": SERVING_ARTIFACT,
+        "MATERIALIZE_SEGMENTS": "false",
+        "COALESCE_MANUAL": "false",
+    }
+    if mode == "database":
+        env.update({
+            "DATABASE_URL": f"sqlite:///{paths['sqlite']}",
+            "USE_CSV_FALLBACK": "false",
+        })
+    else:
+        # An unreachable database keeps the app on the CSV fallback
+        env.update({
+            "DATABASE_URL": f"sqlite:///{MISSING_PATH}/none.db",
+            "USE_CSV_FALLBACK": "true",
+            "RFM_CSV_PATH": paths["csv"],
+            "RFM_SNAPSHOT_PATH": paths["snapshot"] if mode == "snapshot" else MISSING_PATH,
+        })
+    return env
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    arr = np.sort(np.asarray(samples))
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+
+def run_scale_probe(args: argparse.Namespace) -> None:
+    """
+    Child process: import app.py under the given env and time its endpoints.
+
+    Requests go through Flask's test client, so latencies include routing and
+    JSON handling but no network. Prints one "@@"-prefixed JSON report.
+    """
+    start = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - start
+
+    client = app.app.test_client()
+    rng = np.random.default_rng(args.seed)
+    report: Dict[str, Any] = {"startup_s": import_s}
+    if app.model_state.source != SERVING_ARTIFACT:
+        raise RuntimeError(f"Scale probe loaded {app.model_state.source}, expected {SERVING_ARTIFACT}")
+
+    # Single-call scoring (no I/O; independent of table size)
+    rows = rng.uniform([0, 1, 10], [370, 200, 50000], size=(args.lookups, 3))
+    timings = []
+    for r, f, m in rows:
+        t0 = time.perf_counter()
+        app.predict_segment(r, f, m)
+        timings.append(time.perf_counter() - t0)
+    report["predict_single_us"] = {k: v * 1e6 for k, v in _percentiles(timings).items()}
+
+    # Single-customer lookup by ID
+    ids = SYNTHETIC_ID_BASE + rng.integers(0, args.rows, args.lookups)
+    timings = []
+    for cid in ids:
+        t0 = time.perf_counter()
+        resp = client.post("/segment/customer", json={"customer_id": int(cid)})
+        timings.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            raise RuntimeError(f"/segment/customer returned {resp.status_code}: {resp.get_json()}")
+    report["lookup_ms"] = {k: v * 1e3 for k, v in _percentiles(timings).items()}
+    report["data_source"] = resp.get_json()["data_source"]
+
+    # Batch throughput
+    customer_count = min(args.batch, args.rows)
+    timings = []
+    for _ in range(args.batch_repeats):
+        t0 = time.perf_counter()
+        resp = client.post("/api/segment", json={"customer_count": customer_count})
+        timings.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            raise RuntimeError(f"/api/segment returned {resp.status_code}: {resp.get_json()}")
+    best = min(timings)
+    report["batch"] = {
+        "customers": customer_count,
+        "best_s": best,
+        "customers_per_s": customer_count / best,
+    }
+    print("@@" + json.dumps(report))
+
+
+def bench_scale(
+    sizes: List[int],
+    modes: List[str],
+    data_dir: str,
+    seed: int,
+    lookups: int,
+    batch: int,
+    batch_repeats: int
+) -> List[Dict[str, Any]]:
+    """Run the scale probe for every (size, mode) pair"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for rows in sizes:
+        print(f"Preparing {rows:,} rows...")
+        paths = build_scale_dataset(rows, data_dir, seed, os.path.join(here, RFM_TABLE))
+        for mode in modes:
+            print(f"  measuring {mode}...")
+            proc = subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__), "_scale_probe",
+                    "--rows", str(rows), "--seed", str(seed), "--lookups", str(lookups),
+                    "--batch", str(batch), "--batch-repeats", str(batch_repeats),
+                ],
+                env=scale_env(mode, paths),
+                capture_output=True,
+                text=True,
+                cwd=here
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(f"Scale probe failed ({rows} rows, {mode}):\n{proc.stderr}")
+            line = next(l for l in proc.stdout.splitlines() if l.startswith("@@"))
+            results.append({"suite": "scale", "rows": rows, "mode": mode, **json.loads(line[2:])})
+    return results
+
+
+def print_scale(results: List[Dict[str, Any]]) -> None:
+    print(
+        f"{'rows':>11} {'mode':<9} {'startup':>9} {'predict p50':>12} "
+        f"{'lookup p50':>11} {'lookup p99':>11} {'batch cust/s':>13}"
+    )
+    for r in results:
+        print(
+            f"{r['rows']:>11,} {r['mode']:<9} {r['startup_s'] * 1000:>6.0f} ms "
+            f"{r['predict_single_us']['p50']:>9.1f} us "
+            f"{r['lookup_ms']['p50']:>8.3f} ms {r['lookup_ms']['p99']:>8.3f} ms "
+            f"{r['batch']['customers_per_s']:>13,.0f}"
+        )
+
+
+# ============================================================================
+# RFM BUILD SUITE
+# ============================================================================
+RAW_DATA = "data/Online Retail.xlsx"
+# Shape of the Online Retail dataset
+RETAIL_LINES = 541_909
+RETAIL_INVOICES = 25_900
+RETAIL_CUSTOMERS = 4_372
+
+
+def reference_clean_data(df):
+    """clean_data before vectorization (three chained filtered copies)"""
+    df = df.dropna(subset=["CustomerID"])
+    df = df[df["Quantity"] > 0]
+    df = df[df["UnitPrice"] > 0]
+    return df
+
+
+def reference_build_rfm_table(df, reference_date=None):
+    """build_rfm_table before vectorization (per-group Python lambdas)"""
+    import pandas as pd
+
+    df = df.copy()
+    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+    if reference_date is None:
+        reference_date = df["InvoiceDate"].max() + pd.Timedelta(days=1)
+
+    def monetary_sum(group):
+        return (group * df.loc[group.index, "UnitPrice"]).sum()
+
+    rfm = df.groupby("CustomerID").agg({
+        "InvoiceDate": lambda x: (reference_date - x.max()).days,
+        "InvoiceNo": "nunique",
+        "Quantity": monetary_sum
+    })
+    rfm.rename(columns={"InvoiceDate": "Recency", "InvoiceNo": "Frequency", "Quantity": "Monetary"}, inplace=True)
+    return rfm.reset_index()
+
+
+def synthetic_transactions(lines: int, seed: int):
+    """
+    Transaction lines shaped like the Online Retail dataset.
+
+    Invoices belong to one customer (heavy-tailed activity) and one timestamp
+    within a year; about a quarter of lines are anonymous and 2% are
+    cancellations with negative quantities, so clean_data has work to do.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    invoices = max(1, lines * RETAIL_INVOICES // RETAIL_LINES)
+    customers = max(1, lines * RETAIL_CUSTOMERS // RETAIL_LINES)
+
+    activity = rng.lognormal(0.0, 1.2, customers)
+    invoice_customer = 12346.0 + rng.choice(customers, invoices, p=activity / activity.sum())
+    invoice_customer[rng.random(invoices) < 0.25] = np.nan
+    invoice_time = pd.Timestamp("2010-12-01 08:00") + pd.to_timedelta(
+        rng.integers(0, 373 * 86400, invoices), unit="s"
+    )
+    invoice_no = (536365 + np.arange(invoices)).astype(str)
+    cancelled = rng.random(invoices) < 0.02
+    invoice_no = np.where(cancelled, np.char.add("C", invoice_no), invoice_no)
+
+    line_invoice = np.sort(rng.integers(0, invoices, lines))
+    quantity = rng.integers(1, 25, lines)
+    quantity[cancelled[line_invoice]] *= -1
+    unit_price = np.round(rng.lognormal(0.8, 0.9, lines), 2)
+    unit_price[rng.random(lines) < 0.002] = 0.0
+
+    return pd.DataFrame({
+        "InvoiceNo": invoice_no[line_invoice],
+        "StockCode": rng.integers(10000, 90000, lines).astype(str),
+        "Quantity": quantity,
+        "InvoiceDate": invoice_time[line_invoice],
+        "UnitPrice": unit_price,
+        "CustomerID": invoice_customer[line_invoice],
+        "Country": "United Kingdom",
+    })
+
+
+def bench_rfm(lines: Optional[int], repeats: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Time clean_data + build_rfm_table, original vs vectorized.
+
+    Args:
+        lines: Synthetic transaction lines; None uses RAW_DATA when it exists
+        repeats: Runs per implementation (best is kept)
+        seed: Synthetic data seed
+
+    Raises:
+        AssertionError: If the two implementations disagree
+    """
+    import pandas as pd
+    from utils import build_rfm_table, clean_data, load_raw_data
+
+    if lines is None and os.path.exists(RAW_DATA):
+        source = RAW_DATA
+        raw = load_raw_data(RAW_DATA)
+    else:
+        source = "synthetic"
+        raw = synthetic_transactions(lines or RETAIL_LINES, seed)
+    print(f"Transactions: {len(raw):,} lines ({source})")
+
+    implementations = {
+        "reference": (reference_clean_data, reference_build_rfm_table),
+        "vectorized": (clean_data, build_rfm_table),
+    }
+    results, tables = [], {}
+    for scenario, (clean, build) in implementations.items():
+        best_clean = best_build = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cleaned = clean(raw)
+            middle = time.perf_counter()
+            tables[scenario] = build(cleaned)
+            end = time.perf_counter()
+            best_clean = min(best_clean, middle - start)
+            best_build = min(best_build, end - middle)
+        results.append({
+            "suite": "rfm",
+            "scenario": scenario,
+            "rows": len(raw),
+            "source": source,
+            "customers": len(tables[scenario]),
+            "clean_s": best_clean,
+            "build_s": best_build,
+            "total_s": best_clean + best_build,
+            "lines_per_s": len(raw) / (best_clean + best_build),
+        })
+
+    pd.testing.assert_frame_equal(tables["reference"], tables["vectorized"], check_exact=True)
+    return results
+
+
+def print_rfm(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<11} {'customers':>9} {'clean':>10} {'build':>10} {'total':>10} {'lines/s':>12}")
+    for r in results:
+        print(
+            f"{r['scenario']:<11} {r['customers']:>9,} {r['clean_s'] * 1000:>7.1f} ms "
+            f"{r['build_s'] * 1000:>7.1f} ms {r['total_s'] * 1000:>7.1f} ms {r['lines_per_s']:>12,.0f}"
+        )
+    speedup = results[0]["total_s"] / results[-1]["total_s"]
+    print(f"\nVectorized is {speedup:.1f}x faster; RFM tables are identical")
+
+
+# ============================================================================
+# RESULT FILES
+# ============================================================================
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, suite: str, results: List[Dict[str, Any]]) -> None:
+    """Write results with enough context to compare runs across commits"""
+    document = {
+        "suite": suite,
+        "git_revision": _git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"\nResults written to {path}")
+
+
+def _flatten(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+# Fields that identify a result row rather than measure it
+RESULT_KEY_FIELDS = ("suite", "scenario", "rows", "mode", "workers", "threads", "clients", "coalesce")
+
+
+def compare_results(baseline_path: str, current_path: str, threshold: float) -> int:
+    """
+    Compare two result files and flag metrics that got worse by > threshold.
+
+    Throughput metrics ("per_s") are higher-is-better; latency and time
+    metrics are lower-is-better. Counts and sizes are ignored.
+
+    Returns:
+        Number of regressions found
+    """
+    def load(path: str) -> Dict[Tuple, Dict[str, Any]]:
+        with open(path) as f:
+            document = json.load(f)
+        rows = {}
+        for record in document["results"]:
+            flat = _flatten(record)
+            key = tuple((k, flat[k]) for k in RESULT_KEY_FIELDS if k in flat)
+            rows[key] = flat
+        return rows
+
+    baseline, current = load(baseline_path), load(current_path)
+    regressions = 0
+    for key, now in current.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        label = " ".join(f"{k}={v}" for k, v in key)
+        for metric, value in now.items():
+            old = before.get(metric)
+            if metric in dict(key) or not isinstance(value, float) or not isinstance(old, float) or old <= 0:
+                continue
+            higher_is_better = metric.endswith("per_s")
+            if not (higher_is_better or metric.endswith(("_s", "_ms", "_us", ".p50", ".p95", ".p99"))):
+                continue
+            change = (value - old) / old
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            regressions += bool(flag)
+            print(f"{label:<40} {metric:<28} {old:>12.4g} -> {value:>12.4g} ({change:+.1%}) {flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Segmentation agent benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    startup = sub.add_parser("startup", help="Cold-start time across artifact formats")
+    startup.add_argument("--runs", type=int, default=5, help="Interpreter launches per scenario")
+    startup.add_argument("--output", help="Write JSON results to this path")
+
+    serve = sub.add_parser("serve", help="gunicorn throughput and memory by worker count")
+    serve.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    serve.add_argument("--threads", type=int, default=4, help="Threads per worker")
+    serve.add_argument("--clients", type=int, default=8, help="Concurrent client processes")
+    serve.add_argument("--seconds", type=float, default=10.0, help="Load duration per worker count")
+    serve.add_argument("--coalesce", action="store_true", help="Enable COALESCE_MANUAL on the server")
+    serve.add_argument("--output", help="Write JSON results to this path")
+
+    scale = sub.add_parser("scale", help="Lookup and batch performance across table sizes")
+    scale.add_argument("--sizes", default="10k,100k,1m,10m", help="Comma-separated row counts (k/m suffixes)")
+    scale.add_argument("--modes", default=",".join(SCALE_MODES), help="Data sources to measure")
+    scale.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Cache for generated datasets")
+    scale.add_argument("--seed", type=int, default=42, help="Synthetic data and lookup seed")
+    scale.add_argument("--lookups", type=int, default=2000, help="Single-customer lookups per mode")
+    scale.add_argument("--batch", type=int, default=100000, help="customer_count for /api/segment")
+    scale.add_argument("--batch-repeats", type=int, default=5, help="/api/segment calls (best is kept)")
+    scale.add_argument("--output", help="Write JSON results to this path")
+
+    rfm = sub.add_parser("rfm", help="RFM feature build: original vs vectorized")
+    rfm.add_argument("--lines", type=parse_size, help=f"Synthetic transaction lines (default: {RAW_DATA} if present, else {RETAIL_LINES:,})")
+    rfm.add_argument("--repeats", type=int, default=3, help="Runs per implementation (best is kept)")
+    rfm.add_argument("--seed", type=int, default=42, help="Synthetic data seed")
+    rfm.add_argument("--output", help="Write JSON results to this path")
+
+    compare = sub.add_parser("compare", help="Compare two result files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown")
+
+    # Internal: runs inside the child interpreter spawned by the scale suite
+    probe = sub.add_parser("_scale_probe")
+    probe.add_argument("--rows", type=int, required=True)
+    probe.add_argument("--seed", type=int, required=True)
+    probe.add_argument("--lookups", type=int, required=True)
+    probe.add_argument("--batch", type=int, required=True)
+    probe.add_argument("--batch-repeats", type=int, required=True)
+
+    args = parser.parse_args()
+
+    if args.suite == "startup":
+        results = bench_startup(args.runs)
+        print_startup(results)
+    elif args.suite == "serve":
+        worker_counts = [int(w) for w in args.workers.split(",")]
+        results = bench_serve(worker_counts, args.threads, args.clients, args.seconds, args.coalesce)
+        print_serve(results)
+    elif args.suite == "scale":
+        sizes = [parse_size(s) for s in args.sizes.split(",")]
+        modes = [m.strip() for m in args.modes.split(",")]
+        unknown = set(modes) - set(SCALE_MODES)
+        if unknown:
+            parser.error(f"Unknown modes: {', '.join(sorted(unknown))}")
+        results = bench_scale(
+            sizes, modes, args.data_dir, args.seed, args.lookups, args.batch, args.batch_repeats
+        )
+        print_scale(results)
+    elif args.suite == "rfm":
+        results = bench_rfm(args.lines, args.repeats, args.seed)
+        print_rfm(results)
+    elif args.suite == "compare":
+        regressions = compare_results(args.baseline, args.current, args.threshold)
+        print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+    elif args.suite == "_scale_probe":
+        run_scale_probe(args)
+        return
+
+    if args.output:
+        write_results(args.output, args.suite, results)
+
+
+if __name__ == "__main__":
+    main()
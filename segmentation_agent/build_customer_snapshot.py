@@ -0,0 +1,107 @@
+"""
+Build the columnar customer snapshot served by the API
+
+Usage:
+    python build_customer_snapshot.py
+    python build_customer_snapshot.py --delta changed_rows.csv
+
+This script:
+1. Reads rfm_table.csv (all columns)
+2. Sorts customers by CustomerID and drops duplicate IDs
+3. Writes one .npy file per column plus manifest.json to RFM_SNAPSHOT_PATH
+4. Removes delta files of other snapshot versions from RFM_DELTA_DIR
+
+The API memory-maps the snapshot instead of parsing the CSV at startup, and
+picks up a rebuilt snapshot without a restart. Re-run this script whenever
+rfm_table.csv changes (train_segmentation.py and enhance_customer_data.py do
+it automatically).
+
+With --delta, only the changed rows are published instead: a CSV with
+CustomerID, Recency, Frequency, Monetary (and an optional boolean "deleted"
+column) becomes the next delta file for the snapshot being served (or for
+rfm_table.csv if no snapshot exists). The API merges it in without
+re-reading the full table. A snapshot with different content supersedes
+(and removes) the deltas of the old one, so rebuild only from an
+rfm_table.csv that already has the changes.
+"""
+import argparse
+import json
+import os
+import sys
+from customer_store import MANIFEST_NAME, RFM_COLUMNS, prune_deltas, write_delta, write_snapshot
+
+# Paths
+CSV_PATH = os.getenv("RFM_CSV_PATH", "models/rfm_table.csv")
+SNAPSHOT_PATH = os.getenv("RFM_SNAPSHOT_PATH", "models/rfm_snapshot")
+DELTA_DIR = os.getenv("RFM_DELTA_DIR", "models/rfm_deltas")
+
+
+def served_base_version() -> str:
+    """Version of the base the API serves: the snapshot, else the CSV"""
+    manifest_path = os.path.join(SNAPSHOT_PATH, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)["version"]
+    # Same version string CustomerStore.from_csv assigns
+    stat = os.stat(CSV_PATH)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def publish_delta(changes_path: str) -> int:
+    """Write the rows of changes_path as the next delta file; returns the exit code"""
+    import pandas as pd
+
+    changes = pd.read_csv(changes_path)
+    missing = [name for name in ("CustomerID", *RFM_COLUMNS) if name not in changes.columns]
+    if missing:
+        print(f"❌ {changes_path} is missing columns: {missing}")
+        return 1
+
+    changes = changes.dropna(subset=["CustomerID"])
+    deleted = changes["deleted"].fillna(False).astype(bool) if "deleted" in changes.columns else None
+    base_version = served_base_version()
+    path = write_delta(
+        DELTA_DIR,
+        base_version,
+        changes["CustomerID"].to_numpy(),
+        *(changes[name].fillna(0).to_numpy() for name in RFM_COLUMNS),
+        deleted=None if deleted is None else deleted.to_numpy()
+    )
+
+    deletes = int(deleted.sum()) if deleted is not None else 0
+    print(f"✅ Delta written to {path}")
+    print(f"   Base version: {base_version}")
+    print(f"   Upserts: {len(changes) - deletes}, deletes: {deletes}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the customer snapshot or publish a delta")
+    parser.add_argument("--delta", metavar="CSV", help="Publish the changed rows in CSV as a delta file")
+    args = parser.parse_args()
+
+    if args.delta:
+        if not os.path.exists(args.delta):
+            print(f"❌ CSV file not found: {args.delta}")
+            return 1
+        return publish_delta(args.delta)
+
+    if not os.path.exists(CSV_PATH):
+        print(f"❌ CSV file not found: {CSV_PATH}")
+        return 1
+
+    print(f"📂 Reading CSV file: {CSV_PATH}")
+    manifest = write_snapshot(CSV_PATH, SNAPSHOT_PATH)
+    pruned = prune_deltas(DELTA_DIR, manifest["version"])
+
+    print(f"✅ Snapshot written to {SNAPSHOT_PATH}")
+    print(f"   Version: {manifest['version']}")
+    print(f"   Customers: {manifest['rows']}")
+    print(f"   Columns: {len(manifest['columns'])}")
+    if pruned:
+        print(f"   Removed {pruned} delta files of other snapshot versions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Micro-Batching Request Coalescer
+
+Concurrent single-row scoring requests are collected for a short window and
+scored together as one matrix, then each waiting request gets its own row of
+the result back. Under concurrency this trades up to max_wait of extra latency
+for one vectorized call instead of many small ones.
+
+There is no background thread: the first request of a batch acts as its
+leader, waits for the window to close (or the batch to fill), scores the
+whole batch and wakes the others. Requests beyond max_batch that arrived
+while the window was closing are left queued, and the first of them leads
+the next batch. This keeps the coalescer safe to create before gunicorn
+forks its workers.
+
+Classes:
+    BatchCoalescer: Leader-based micro-batcher for row-wise scoring functions
+"""
+
+import threading
+import time
+import numpy as np
+from typing import Any, Callable, List, Optional, Sequence
+
+from metrics import Histogram
+
+# Batch-size buckets (requests per scored batch)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# Queue-wait buckets in seconds (time from submit to the start of scoring)
+WAIT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class _Pending:
+    """One request waiting for its row of a batch result"""
+
+    __slots__ = ("row", "submitted", "done", "leader", "result", "error")
+
+    def __init__(self, row: Sequence[float]) -> None:
+        self.row = row
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.leader = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class BatchCoalescer:
+    """
+    Collect concurrent single-row requests and score them as one batch.
+
+    Attributes:
+        max_batch: Close the window as soon as this many requests are waiting
+        max_wait: Longest time (seconds) the leader holds the window open
+        batch_size: Histogram of requests per scored batch
+        queue_wait: Histogram of per-request wait before scoring starts
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[np.ndarray], List[Any]],
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        metric_prefix: str = "segmentation_coalescer"
+    ) -> None:
+        """
+        Args:
+            score_batch: Function mapping an (N, 3) matrix to a list of N results
+            max_batch: Maximum requests per batch before scoring immediately
+            max_wait: Maximum seconds to wait for more requests
+            metric_prefix: Prefix for the exported histogram names
+        """
+        self._score_batch = score_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self._pending: List[_Pending] = []
+        self._lock = threading.Lock()
+        self._filled = threading.Condition(self._lock)
+
+        self.batch_size = Histogram(
+            f"{metric_prefix}_batch_size",
+            "Requests scored together in one coalesced batch",
+            BATCH_SIZE_BUCKETS
+        )
+        self.queue_wait = Histogram(
+            f"{metric_prefix}_wait_seconds",
+            "Time a request waited for its batch to start scoring",
+            WAIT_BUCKETS
+        )
+
+    def submit(self, row: Sequence[float]) -> Any:
+        """
+        Score one row, sharing the call with concurrent requests.
+
+        Args:
+            row: Raw (recency, frequency, monetary) values
+
+        Returns:
+            This row's element of score_batch's result
+
+        Raises:
+            Exception: Whatever score_batch raised for the batch
+        """
+        pending = _Pending(row)
+        with self._lock:
+            self._pending.append(pending)
+            pending.leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch:
+                self._filled.notify()
+
+        if not pending.leader:
+            # Woken with a result, or promoted to lead the next batch
+            pending.done.wait()
+        if pending.leader:
+            self._lead(pending)
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _lead(self, leader: _Pending) -> None:
+        """Hold the window open for leader's batch, then score at most max_batch requests"""
+        with self._lock:
+            deadline = leader.submitted + self.max_wait
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._filled.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if self._pending:
+                # Overflow stays queued; its oldest request leads the next batch
+                self._pending[0].leader = True
+                self._pending[0].done.set()
+
+        self._run(batch)
+
+    def _run(self, batch: List[_Pending]) -> None:
+        """Score a batch and hand each waiting request its result"""
+        started = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        for p in batch:
+            self.queue_wait.observe(started - p.submitted)
+
+        try:
+            results = self._score_batch(np.array([p.row for p in batch], dtype=np.float64))
+            for p, result in zip(batch, results):
+                p.result = result
+        except Exception as e:
+            for p in batch:
+                p.error = e
+        finally:
+            for p in batch:
+                p.done.set()
+
+    def metrics(self) -> List[Histogram]:
+        """Histograms to export on /metrics"""
+        return [self.batch_size, self.queue_wait]
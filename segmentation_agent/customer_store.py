@@ -0,0 +1,697 @@
+"""
+Indexed In-Memory Customer Store
+
+This module holds the CSV-fallback customer table in a compact, query-friendly
+layout: a sorted int64 array of customer IDs plus contiguous float32 arrays for
+Recency, Frequency and Monetary. Lookups are binary searches over the sorted ID
+array (O(log N)), so the request path never touches pandas.
+
+The store can also be opened from a columnar snapshot: one .npy file per
+column plus a manifest.json naming them, memory-mapped read-only. Worker processes then
+share the pages through the OS cache, and columns other than the ID and RFM
+arrays are only mapped when first asked for.
+
+Small changes do not need a new snapshot: a delta file holds just the
+changed rows (upserts and deletes) for one base version, and apply_delta
+adds them to a small overlay on top of the base without reading or copying
+it. Deltas live in a directory next to the base, named
+<base version>.<sequence>.npz:
+
+    models/rfm_deltas/
+    ├── 3f9a0c2b71de4410.000001.npz
+    └── 3f9a0c2b71de4410.000002.npz
+
+A new base (write_snapshot, or a rewritten CSV) supersedes every delta of the
+old one; those files are simply ignored and can be pruned.
+
+Classes:
+    CustomerStore: Sorted-array index over customer RFM values
+
+Functions:
+    write_snapshot: Convert an RFM table CSV into a columnar snapshot directory
+    write_delta / load_delta: Write and read a delta file of changed rows
+    pending_deltas: Delta files of a store's base not yet applied to it
+    prune_deltas: Remove delta files that belong to other base versions
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+RFM_COLUMNS = ("Recency", "Frequency", "Monetary")
+ID_COLUMN = "CustomerID"
+MANIFEST_NAME = "manifest.json"
+DELTA_SUFFIX = ".npz"
+
+
+class CustomerStore:
+    """
+    Read-only customer RFM store indexed by integer customer ID.
+
+    Rows are kept sorted by customer ID; when an ID appears more than once the
+    first occurrence in the source wins.
+
+    Deltas do not touch the base arrays. Their rows go into a small sorted
+    overlay instead: upserted IDs with their values, plus tombstones for
+    deleted base customers. Lookups check the overlay first, and row offsets
+    (find, find_many, features, ids, rows_between) count rows of the merged
+    view in customer ID order.
+
+    Attributes:
+        customer_ids: (N,) sorted int64 array of base customer IDs
+        recency: (N,) float32 array of base days since last purchase
+        frequency: (N,) float32 array of base transaction counts
+        monetary: (N,) float32 array of base total spending
+        overlay_ids: (K,) sorted int64 IDs upserted by deltas
+        overlay_values: (K, 3) float32 Recency, Frequency, Monetary of overlay_ids
+        tombstones: Sorted int64 IDs of base customers deleted by deltas
+        version: Identifier of the data served: the base version, plus
+                 "+<sequence>" of the last delta applied
+        base_version: Identifier of the snapshot or CSV the store was built from
+        deltas: Names of the delta files applied on top of the base, in order
+        manifest: Snapshot manifest of the base when opened with open_snapshot, else None
+    """
+
+    def __init__(
+        self,
+        customer_ids: np.ndarray,
+        recency: np.ndarray,
+        frequency: np.ndarray,
+        monetary: np.ndarray,
+        version: str = ""
+    ) -> None:
+        ids = np.asarray(customer_ids, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+
+        # Drop duplicate IDs, keeping the first occurrence
+        keep = np.ones(len(sorted_ids), dtype=bool)
+        keep[1:] = sorted_ids[1:] != sorted_ids[:-1]
+        order = order[keep]
+
+        self.customer_ids = np.ascontiguousarray(sorted_ids[keep])
+        self.recency = np.ascontiguousarray(np.asarray(recency, dtype=np.float32)[order])
+        self.frequency = np.ascontiguousarray(np.asarray(frequency, dtype=np.float32)[order])
+        self.monetary = np.ascontiguousarray(np.asarray(monetary, dtype=np.float32)[order])
+        self.version = version
+        self.base_version = version
+        self.deltas: Tuple[str, ...] = ()
+        self.manifest: Optional[Dict[str, Any]] = None
+        self._snapshot_dir: Optional[str] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._set_overlay(*_empty_overlay())
+
+    @classmethod
+    def open_snapshot(cls, snapshot_dir: str) -> "CustomerStore":
+        """
+        Open a columnar snapshot written by write_snapshot, memory-mapped.
+
+        Only the ID and RFM columns are mapped up front; nothing is copied
+        into process memory and pandas is not imported.
+
+        Args:
+            snapshot_dir: Directory containing manifest.json and column .npy files
+
+        Returns:
+            CustomerStore backed by read-only memory maps
+
+        Raises:
+            FileNotFoundError: If the manifest or a column file is missing
+            ValueError: If the column files do not match the manifest
+        """
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+
+        store = cls.__new__(cls)
+        store._snapshot_dir = snapshot_dir
+        store._columns = {}
+        store.version = store.base_version = manifest["version"]
+        store.deltas = ()
+        store.manifest = manifest
+
+        # Snapshot columns are already sorted by ID and de-duplicated
+        store.customer_ids = store.column(ID_COLUMN)
+        store.recency, store.frequency, store.monetary = (
+            store.column(name) for name in RFM_COLUMNS
+        )
+        for name in (ID_COLUMN, *RFM_COLUMNS):
+            if len(store.column(name)) != manifest["rows"]:
+                raise ValueError(f"Snapshot column {name} does not match manifest row count")
+        store._set_overlay(*_empty_overlay())
+        return store
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Get a snapshot column aligned with the store rows, mapping it on first use.
+
+        String columns are stored as UTF-8 byte strings; decode values with
+        .decode("utf-8").
+
+        Args:
+            name: Column name as in the source CSV (e.g. "email")
+
+        Returns:
+            Read-only memory-mapped column array
+
+        Raises:
+            KeyError: If the column does not exist, or the store was not
+                      opened from a snapshot (or has deltas applied)
+        """
+        if name not in self._columns:
+            if self._snapshot_dir is None or self.manifest is None or name not in self.manifest["columns"]:
+                raise KeyError(f"Unknown snapshot column: {name}")
+            path = os.path.join(self._snapshot_dir, self.manifest["columns"][name]["file"])
+            self._columns[name] = np.load(path, mmap_mode="r", allow_pickle=False)
+        return self._columns[name]
+
+    @classmethod
+    def from_csv(cls, path: str) -> "CustomerStore":
+        """
+        Build a store from an RFM table CSV, reading only the ID and RFM columns.
+
+        Args:
+            path: Path to a CSV with CustomerID, Recency, Frequency, Monetary columns
+
+        Returns:
+            Populated CustomerStore
+
+        Raises:
+            FileNotFoundError: If the CSV file is not found
+        """
+        import pandas as pd
+
+        stat = os.stat(path)
+        df = pd.read_csv(path, usecols=["CustomerID", *RFM_COLUMNS])
+        df = df.dropna(subset=["CustomerID"])
+        return cls(
+            df["CustomerID"].to_numpy(),
+            df["Recency"].to_numpy(),
+            df["Frequency"].to_numpy(),
+            df["Monetary"].to_numpy(),
+            version=f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        )
+
+    def apply_delta(self, delta: Dict[str, np.ndarray], name: str) -> "CustomerStore":
+        """
+        Build a new store with a delta's changed rows merged into the overlay.
+
+        The store itself is left untouched, so requests still reading it are
+        not affected. The new store shares the base arrays (memory maps stay
+        mapped, nothing is copied); only the overlay is rebuilt, so the cost
+        is O(K log N) for K overlay rows, independent of the table size. The
+        overlay grows with every delta until a new base replaces it.
+
+        Args:
+            delta: Arrays as returned by load_delta. Rows flagged in "deleted"
+                   are removed, all others are inserted or overwritten; when
+                   an ID appears more than once the last occurrence wins.
+            name: Delta file name (<base version>.<sequence>.npz)
+
+        Returns:
+            New CustomerStore (snapshot columns other than the ID and RFM
+            arrays are not carried over)
+        """
+        ids = np.asarray(delta["customer_ids"], dtype=np.int64)
+
+        # Sorted unique IDs, each taking its last row in the delta
+        unique_ids, last = np.unique(ids[::-1], return_index=True)
+        rows = len(ids) - 1 - last
+        values = np.column_stack([
+            np.asarray(delta[key], dtype=np.float32)[rows] for key in ("recency", "frequency", "monetary")
+        ])
+        deleted = np.asarray(delta.get("deleted", np.zeros(len(ids), dtype=bool)), dtype=bool)[rows]
+
+        # The delta replaces any earlier overlay row of the IDs it names
+        keep = ~np.isin(self.overlay_ids, unique_ids)
+        overlay_ids = np.concatenate((self.overlay_ids[keep], unique_ids[~deleted]))
+        overlay_values = np.concatenate((self.overlay_values[keep], values[~deleted]))
+        order = np.argsort(overlay_ids, kind="stable")
+
+        # Only deleted IDs the base has need a tombstone
+        removed = unique_ids[deleted]
+        tombstones = np.union1d(
+            np.setdiff1d(self.tombstones, unique_ids[~deleted]),
+            removed[self._base_rows(removed) >= 0]
+        )
+
+        store = CustomerStore.__new__(CustomerStore)
+        store.customer_ids = self.customer_ids
+        store.recency, store.frequency, store.monetary = self.recency, self.frequency, self.monetary
+        store.base_version = self.base_version
+        store.version = f"{self.base_version}+{delta_sequence(name)}"
+        store.deltas = self.deltas + (name,)
+        store.manifest = self.manifest
+        store._snapshot_dir = None
+        store._columns = {}
+        store._set_overlay(overlay_ids[order], overlay_values[order], tombstones)
+        return store
+
+    def _set_overlay(self, overlay_ids: np.ndarray, overlay_values: np.ndarray, tombstones: np.ndarray) -> None:
+        """Install the overlay and index the base rows it hides"""
+        self.overlay_ids = overlay_ids
+        self.overlay_values = overlay_values
+        self.tombstones = tombstones
+
+        # Base rows that are deleted or overwritten by the overlay
+        shadowed = self._base_rows(np.concatenate((tombstones, overlay_ids)))
+        self._hidden = np.unique(shadowed[shadowed >= 0])
+        # Visible base rows before each hidden row
+        self._hidden_shift = self._hidden - np.arange(len(self._hidden))
+        # Row offset of each overlay row in the merged view
+        before = self.customer_ids.searchsorted(overlay_ids)
+        self._overlay_rows = before - self._hidden.searchsorted(before) + np.arange(len(overlay_ids))
+        self._plain = len(overlay_ids) == 0 and len(self._hidden) == 0
+
+    def _base_rows(self, ids: np.ndarray) -> np.ndarray:
+        """Base row of each ID, -1 where the base does not have it"""
+        n = len(self.customer_ids)
+        if n == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        rows = np.minimum(self.customer_ids.searchsorted(ids), n - 1)
+        return np.where(self.customer_ids[rows] == ids, rows, -1)
+
+    def _visible_base_row(self, key: int) -> Optional[int]:
+        """Base row of a customer unless the overlay hides it"""
+        row = int(self.customer_ids.searchsorted(key))
+        if row == len(self.customer_ids) or self.customer_ids[row] != key:
+            return None
+        hidden = int(self._hidden.searchsorted(row))
+        if hidden < len(self._hidden) and self._hidden[hidden] == row:
+            return None
+        return row
+
+    def _rank(self, key: int, side: str) -> int:
+        """Number of customers with ID < key (side="left") or <= key (side="right")"""
+        base = int(self.customer_ids.searchsorted(key, side=side))
+        return base - int(self._hidden.searchsorted(base)) + int(self.overlay_ids.searchsorted(key, side=side))
+
+    def _locate(self, rows) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Map row offsets of the merged view to base and overlay rows.
+
+        Args:
+            rows: Row offsets (array) or a slice
+
+        Returns:
+            Tuple of (base, overlay, in_overlay): the base row and the overlay
+            row of each offset, and a mask of the offsets served by the overlay
+        """
+        if isinstance(rows, slice):
+            rows = np.arange(*rows.indices(len(self)))
+        rows = np.asarray(rows, dtype=np.int64)
+
+        overlay = self._overlay_rows.searchsorted(rows)
+        in_overlay = overlay < len(self._overlay_rows)
+        in_overlay[in_overlay] = self._overlay_rows[overlay[in_overlay]] == rows[in_overlay]
+        # Overlay rows before an offset come first; skip the hidden base rows
+        visible = rows - overlay
+        base = visible + self._hidden_shift.searchsorted(visible, side="right")
+        return base, overlay, in_overlay
+
+    def _gather(self, base: np.ndarray, overlay: np.ndarray, located: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """Take a column's values for located rows from the base or the overlay"""
+        base_rows, overlay_rows, in_overlay = located
+        values = np.empty(len(in_overlay), dtype=base.dtype)
+        values[~in_overlay] = base[base_rows[~in_overlay]]
+        values[in_overlay] = overlay[overlay_rows[in_overlay]]
+        return values
+
+    def __len__(self) -> int:
+        return len(self.customer_ids) - len(self._hidden) + len(self.overlay_ids)
+
+    def find(self, customer_id: float) -> Optional[int]:
+        """
+        Find the row offset of a single customer.
+
+        Args:
+            customer_id: Customer ID (int, float or numeric string)
+
+        Returns:
+            Row offset into the merged view, or None if not present
+        """
+        key = float(customer_id)
+        if not key.is_integer():
+            return None
+
+        key = int(key)
+        j = int(self.overlay_ids.searchsorted(key))
+        if j < len(self.overlay_ids) and self.overlay_ids[j] == key:
+            return int(self._overlay_rows[j])
+
+        row = self._visible_base_row(key)
+        if row is None:
+            return None
+        return row - int(self._hidden.searchsorted(row)) + j
+
+    def get(self, customer_id: float) -> Optional[Tuple[float, float, float]]:
+        """
+        Look up the RFM values of a single customer.
+
+        Args:
+            customer_id: Customer ID (int, float or numeric string)
+
+        Returns:
+            (recency, frequency, monetary) tuple, or None if not present
+        """
+        key = float(customer_id)
+        if not key.is_integer():
+            return None
+
+        key = int(key)
+        j = int(self.overlay_ids.searchsorted(key))
+        if j < len(self.overlay_ids) and self.overlay_ids[j] == key:
+            recency, frequency, monetary = self.overlay_values[j]
+            return float(recency), float(frequency), float(monetary)
+
+        row = self._visible_base_row(key)
+        if row is None:
+            return None
+        return (
+            float(self.recency[row]),
+            float(self.frequency[row]),
+            float(self.monetary[row])
+        )
+
+    def find_many(self, customer_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the row offsets of many customers with one vectorized binary search.
+
+        Args:
+            customer_ids: (M,) array of customer IDs
+
+        Returns:
+            Tuple of (rows, found):
+            - rows: row offsets for the IDs that were found, in input order
+            - found: (M,) boolean mask marking which input IDs were found
+        """
+        keys = np.asarray(customer_ids, dtype=np.float64)
+        if len(self) == 0 or keys.size == 0:
+            return np.empty(0, dtype=np.int64), np.zeros(keys.shape, dtype=bool)
+
+        int_keys = keys.astype(np.int64)
+        integral = int_keys == keys
+        if self._plain:
+            rows = np.minimum(self.customer_ids.searchsorted(int_keys), len(self.customer_ids) - 1)
+            found = integral & (self.customer_ids[rows] == int_keys)
+            return rows[found], found
+
+        rows = self._base_rows(int_keys)
+        found = integral & (rows >= 0)
+        hidden = self._hidden.searchsorted(rows)
+        if len(self._hidden):
+            found &= self._hidden[np.minimum(hidden, len(self._hidden) - 1)] != rows
+        overlay = self.overlay_ids.searchsorted(int_keys)
+        rows = rows - hidden + overlay
+        if len(self.overlay_ids):
+            overlay = np.minimum(overlay, len(self.overlay_ids) - 1)
+            in_overlay = integral & (self.overlay_ids[overlay] == int_keys)
+            rows = np.where(in_overlay, self._overlay_rows[overlay], rows)
+            found |= in_overlay
+        return rows[found], found
+
+    def ids(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Gather the customer IDs at the given row offsets or slice.
+
+        Args:
+            rows: Row offsets (array) or a slice
+
+        Returns:
+            int64 array of customer IDs
+        """
+        if self._plain:
+            return self.customer_ids[rows]
+        return self._gather(self.customer_ids, self.overlay_ids, self._locate(rows))
+
+    def features(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Gather an (N, 3) float64 RFM matrix for the given row offsets or slice.
+
+        Args:
+            rows: Row offsets (array) or a slice
+
+        Returns:
+            (N, 3) matrix of Recency, Frequency, Monetary values
+        """
+        if self._plain:
+            columns = (self.recency[rows], self.frequency[rows], self.monetary[rows])
+        else:
+            located = self._locate(rows)
+            columns = tuple(
+                self._gather(base, self.overlay_values[:, i], located)
+                for i, base in enumerate((self.recency, self.frequency, self.monetary))
+            )
+        return np.column_stack(columns).astype(np.float64)
+
+    def head(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the first n customers (in customer ID order).
+
+        Args:
+            n: Number of customers
+
+        Returns:
+            Tuple of (customer_ids, features) for the first n rows
+        """
+        rows = slice(0, max(0, n))
+        return self.ids(rows), self.features(rows)
+
+    def rows_between(self, after: Optional[int], until: Optional[int]) -> Tuple[int, int]:
+        """
+        Find the row range for customer IDs in (after, until].
+
+        Args:
+            after: Exclusive lower bound on customer ID (None for no bound)
+            until: Inclusive upper bound on customer ID (None for no bound)
+
+        Returns:
+            Tuple of (start, end) row offsets
+        """
+        start = 0 if after is None else self._rank(after, "right")
+        end = len(self) if until is None else self._rank(until, "right")
+        return start, max(start, end)
+
+    def partition_bounds(self, index: int, count: int) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Split the store into count contiguous, equally sized customer ID ranges.
+
+        Args:
+            index: Zero-based partition number
+            count: Total number of partitions
+
+        Returns:
+            Tuple of (after, until) customer ID bounds for rows_between
+        """
+        start = index * len(self) // count
+        end = (index + 1) * len(self) // count
+        if end <= start:
+            # Empty partition: a range that matches no rows
+            bound = int(self.ids(slice(start - 1, start))[0]) if start > 0 else -1
+            return bound, bound
+
+        after = int(self.ids(slice(start - 1, start))[0]) if start > 0 else None
+        return after, int(self.ids(slice(end - 1, end))[0])
+
+
+def _empty_overlay() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Overlay arrays of a store without deltas: (ids, values, tombstones)"""
+    return (
+        np.empty(0, dtype=np.int64),
+        np.empty((0, 3), dtype=np.float32),
+        np.empty(0, dtype=np.int64)
+    )
+
+
+def _column_array(column, name: str) -> np.ndarray:
+    """Convert a pandas column to a fixed-width array that np.load can memory-map"""
+    if name == ID_COLUMN:
+        return column.to_numpy(dtype=np.int64)
+    if name in RFM_COLUMNS:
+        return column.to_numpy(dtype=np.float32)
+    if column.dtype == object:
+        # Object arrays need pickle; store strings as fixed-width UTF-8 bytes
+        return np.char.encode(column.fillna("").astype(str).to_numpy(dtype=str), "utf-8")
+    return column.to_numpy()
+
+
+def write_snapshot(csv_path: str, snapshot_dir: str) -> Dict[str, Any]:
+    """
+    Convert an RFM table CSV into a columnar, memory-mappable snapshot.
+
+    Rows are sorted by customer ID and de-duplicated (first occurrence wins),
+    matching CustomerStore. Every column is written as its own .npy file
+    named after the build (<column>.<build>.npy), so files of the snapshot
+    being served are never overwritten. manifest.json, which lists the
+    files, is replaced last: readers see either the old build or the new
+    one, never a mix. Files of the previous build are kept for stores that
+    still map its columns lazily; older builds are removed.
+
+    Args:
+        csv_path: Source RFM table CSV
+        snapshot_dir: Output directory (created if missing)
+
+    Returns:
+        The written manifest
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    df = df.dropna(subset=[ID_COLUMN])
+    df = df.sort_values(ID_COLUMN, kind="stable").drop_duplicates(ID_COLUMN, keep="first")
+
+    arrays = {name: np.ascontiguousarray(_column_array(df[name], name)) for name in df.columns}
+    # version identifies the served data (ID and RFM columns); build covers every column
+    digest = hashlib.sha256()
+    build_digest = hashlib.sha256()
+    for name, arr in arrays.items():
+        build_digest.update(f"{name}:{arr.dtype.str}".encode())
+        build_digest.update(arr.tobytes())
+        if name == ID_COLUMN or name in RFM_COLUMNS:
+            digest.update(arr.tobytes())
+    build = build_digest.hexdigest()[:16]
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            previous_files = {column["file"] for column in json.load(f)["columns"].values()}
+    except (OSError, ValueError, KeyError):
+        previous_files = set()
+
+    columns: Dict[str, Dict[str, str]] = {}
+    for name, arr in arrays.items():
+        filename = f"{name}.{build}.npy"
+        path = os.path.join(snapshot_dir, filename)
+        if not os.path.exists(path):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, arr, allow_pickle=False)
+            os.replace(tmp_path, path)
+        columns[name] = {"file": filename, "dtype": arr.dtype.str}
+
+    manifest = {
+        "version": digest.hexdigest()[:16],
+        "build": build,
+        "rows": int(len(df)),
+        "columns": columns,
+        "source": os.path.basename(csv_path),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    keep = previous_files | {column["file"] for column in columns.values()}
+    for name in os.listdir(snapshot_dir):
+        if name.endswith(".npy") and name not in keep:
+            os.remove(os.path.join(snapshot_dir, name))
+    return manifest
+
+
+def delta_sequence(name: str) -> int:
+    """Sequence number of a delta file name (<base version>.<sequence>.npz)"""
+    return int(name[:-len(DELTA_SUFFIX)].rsplit(".", 1)[1])
+
+
+def _delta_names(delta_dir: str) -> List[str]:
+    try:
+        names = os.listdir(delta_dir)
+    except FileNotFoundError:
+        return []
+    return [name for name in names if name.endswith(DELTA_SUFFIX) and name.count(".") >= 2]
+
+
+def write_delta(
+    delta_dir: str,
+    base_version: str,
+    customer_ids: np.ndarray,
+    recency: np.ndarray,
+    frequency: np.ndarray,
+    monetary: np.ndarray,
+    deleted: Optional[np.ndarray] = None
+) -> str:
+    """
+    Write the next delta file for a base version.
+
+    The file is written under a temporary name and renamed into place, so a
+    watcher never loads a half-written delta.
+
+    Args:
+        delta_dir: Delta directory (created if missing)
+        base_version: Version of the snapshot or CSV the changes apply to
+        customer_ids: (K,) IDs of the changed customers
+        recency / frequency / monetary: (K,) new RFM values (ignored for deletes)
+        deleted: (K,) boolean mask of customers to remove (default none)
+
+    Returns:
+        Path of the written delta file
+    """
+    os.makedirs(delta_dir, exist_ok=True)
+    prefix = base_version + "."
+    sequence = 1 + max(
+        (delta_sequence(name) for name in _delta_names(delta_dir) if name.startswith(prefix)),
+        default=0
+    )
+    ids = np.asarray(customer_ids, dtype=np.int64)
+    path = os.path.join(delta_dir, f"{prefix}{sequence:06d}{DELTA_SUFFIX}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            customer_ids=ids,
+            recency=np.asarray(recency, dtype=np.float32),
+            frequency=np.asarray(frequency, dtype=np.float32),
+            monetary=np.asarray(monetary, dtype=np.float32),
+            deleted=np.zeros(len(ids), dtype=bool) if deleted is None else np.asarray(deleted, dtype=bool)
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_delta(path: str) -> Dict[str, np.ndarray]:
+    """
+    Read a delta file written by write_delta.
+
+    Returns:
+        Dictionary with customer_ids, recency, frequency, monetary and deleted arrays
+
+    Raises:
+        ValueError: If the arrays do not all have the same length
+    """
+    with np.load(path, allow_pickle=False) as data:
+        delta = {key: data[key] for key in ("customer_ids", "recency", "frequency", "monetary", "deleted")}
+    if len({len(values) for values in delta.values()}) != 1:
+        raise ValueError(f"Delta arrays in {path} differ in length")
+    return delta
+
+
+def pending_deltas(delta_dir: str, store: CustomerStore) -> List[str]:
+    """
+    Delta files for the store's base version that it has not applied yet.
+
+    Returns:
+        File names in sequence order
+    """
+    prefix = store.base_version + "."
+    applied = set(store.deltas)
+    names = [name for name in _delta_names(delta_dir) if name.startswith(prefix) and name not in applied]
+    return sorted(names, key=delta_sequence)
+
+
+def prune_deltas(delta_dir: str, base_version: str) -> int:
+    """
+    Remove delta files of base versions other than base_version.
+
+    Returns:
+        Number of files removed
+    """
+    removed = 0
+    for name in _delta_names(delta_dir):
+        if not name.startswith(base_version + "."):
+            os.remove(os.path.join(delta_dir, name))
+            removed += 1
+    return removed
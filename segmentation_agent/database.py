@@ -2,7 +2,12 @@
 Database models and connection management for Segmentation Agent
 """
 import os
-from sqlalchemy import create_engine, Column, Float, Integer, String
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy import create_engine, Boolean, Column, Date, DateTime, Float, Integer, String, case, event, inspect, or_, text, update
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -24,34 +29,205 @@ class CustomerRFM(Base):
     frequency = Column(Float, nullable=False)
     monetary = Column(Float, nullable=False)
     
+    # Materialized segment assignment; NULL model_version means "needs scoring"
+    segment_id = Column(Integer, nullable=True, index=True)
+    distance_to_center = Column(Float, nullable=True)
+    model_version = Column(String(64), nullable=True, index=True)
+    
+    # Customer profile fields from the enhanced rfm_table.csv (optional)
+    customer_name = Column(String(100), nullable=True)
+    email = Column(String(255), nullable=True)
+    phone = Column(String(32), nullable=True)
+    signup_date = Column(Date, nullable=True)
+    last_purchase_date = Column(Date, nullable=True)
+    favorite_category = Column(String(64), nullable=True)
+    preferred_channel = Column(String(32), nullable=True)
+    email_opens = Column(Float, nullable=True)
+    email_clicks = Column(Integer, nullable=True)
+    campaign_responses = Column(Integer, nullable=True)
+    average_order_value = Column(Float, nullable=True)
+    is_churned = Column(Boolean, nullable=True)
+    risk_score = Column(Integer, nullable=True)
+    lifetime_value = Column(Float, nullable=True)
+    
     def __repr__(self):
         return f"<CustomerRFM(customer_id={self.customer_id}, R={self.recency}, F={self.frequency}, M={self.monetary})>"
 
 
+class ProcessedInvoice(Base):
+    """
+    Invoices already applied to customer_rfm by the incremental updater.
+    
+    The primary key makes replaying a transaction batch a no-op.
+    """
+    __tablename__ = 'processed_invoices'
+    
+    invoice_no = Column(String(32), primary_key=True)
+    customer_id = Column(Float, nullable=False, index=True)
+    invoice_date = Column(DateTime, nullable=False)
+    amount = Column(Float, nullable=False)
+    processed_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<ProcessedInvoice(invoice_no={self.invoice_no}, customer_id={self.customer_id})>"
+
+
+# Columns added after the table was first created (ALTER TABLE on init_db)
+MATERIALIZED_COLUMNS = ("segment_id", "distance_to_center", "model_version")
+PROFILE_COLUMNS = (
+    "customer_name", "email", "phone", "signup_date", "last_purchase_date",
+    "favorite_category", "preferred_channel", "email_opens", "email_clicks",
+    "campaign_responses", "average_order_value", "is_churned", "risk_score",
+    "lifetime_value"
+)
+RFM_VALUE_COLUMNS = ("recency", "frequency", "monetary")
+
+
+@event.listens_for(CustomerRFM, "before_update")
+def invalidate_segment_on_rfm_change(mapper, connection, target):
+    """Clear the materialized segment when RFM values change through the ORM"""
+    state = inspect(target)
+    rfm_changed = any(
+        state.attrs[name].history.has_changes()
+        for name in ("recency", "frequency", "monetary")
+    )
+    if rfm_changed and not state.attrs.model_version.history.has_changes():
+        target.segment_id = None
+        target.distance_to_center = None
+        target.model_version = None
+
+
 # Database connection
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/chainreach_dev")
 
-try:
-    engine = create_engine(DATABASE_URL, echo=False)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection pool settings
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT: int = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_RETRY_INTERVAL: float = float(os.getenv("DB_RETRY_INTERVAL", "30"))
+
+# Engine is created lazily on first use so importing this module never blocks
+engine = None
+SessionLocal = None
+_engine_lock = threading.Lock()
+_last_failure: Optional[float] = None
+
+
+def _engine_options() -> Dict[str, Any]:
+    """Pool and connect options for the configured database backend"""
+    backend = make_url(DATABASE_URL).get_backend_name()
+    if backend == "sqlite":
+        # SQLite (local runs and benchmarks) uses SQLAlchemy's default pooling
+        return {}
+    
+    options: Dict[str, Any] = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+    if backend == "postgresql":
+        options["connect_args"] = {"connect_timeout": DB_CONNECT_TIMEOUT}
+    return options
+
+
+def get_engine():
+    """
+    Get the shared engine, creating and testing it on first use.
+    
+    A failed connection attempt is remembered for DB_RETRY_INTERVAL seconds,
+    after which the next caller tries again, so availability is not frozen
+    at startup.
+    
+    Returns:
+        SQLAlchemy engine, or None if the database is unavailable
+    """
+    global engine, SessionLocal, _last_failure
+    
+    if engine is not None:
+        return engine
+    if _last_failure is not None and time.monotonic() - _last_failure < DB_RETRY_INTERVAL:
+        return None
+    
+    with _engine_lock:
+        if engine is not None:
+            return engine
+        
+        try:
+            new_engine = create_engine(DATABASE_URL, echo=False, **_engine_options())
+            
+            # Test connection
+            with new_engine.connect():
+                print(f"✅ Database connected: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'localhost'}")
+            
+            SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=new_engine)
+            engine = new_engine
+            _last_failure = None
+        except Exception as e:
+            print(f"⚠️ Database connection failed: {e}")
+            print("📁 Falling back to CSV file")
+            _last_failure = time.monotonic()
+    
+    return engine
+
+
+def is_db_available() -> bool:
+    """Check whether the database can be used (connects lazily on first call)"""
+    return get_engine() is not None
+
+
+def dispose_engine() -> None:
+    """
+    Drop all pooled connections without closing them for other processes.
+    
+    Call in a worker after fork so it never reuses the parent's sockets.
+    """
+    if engine is not None:
+        engine.dispose(close=False)
+
+
+def _reset_after_fork() -> None:
+    """Give a forked child its own engine lock and an empty connection pool"""
+    global _engine_lock
+    # The parent's startup thread may have held the lock at fork time
+    _engine_lock = threading.Lock()
+    dispose_engine()
+
+
+# Pre-forking servers (gunicorn --preload) import the app once in the master
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Report connection pool usage without creating the engine.
     
-    # Test connection
-    with engine.connect() as conn:
-        print(f"✅ Database connected: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'localhost'}")
+    Returns:
+        Dictionary with pool configuration and current checkout counts
+    """
+    if engine is None:
+        return {"status": "not_connected"}
     
-    db_available = True
-except Exception as e:
-    print(f"⚠️ Database connection failed: {e}")
-    print("📁 Falling back to CSV file")
-    engine = None
-    SessionLocal = None
-    db_available = False
+    pool = engine.pool
+    stats: Dict[str, Any] = {"status": "connected", "pool_class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    if hasattr(pool, "_max_overflow"):
+        stats["max_overflow"] = pool._max_overflow
+    return stats
 
 
 def init_db():
     """Create all tables in the database"""
-    if db_available and engine:
+    if is_db_available():
         Base.metadata.create_all(bind=engine)
+        add_missing_columns()
         print("✅ Database tables created")
     else:
         print("⚠️ Database not available, skipping table creation")
@@ -59,12 +235,175 @@ def init_db():
 
 def get_db():
     """Get database session"""
-    if not db_available or not SessionLocal:
+    if not is_db_available():
         return None
     
-    db = SessionLocal()
+    return SessionLocal()
+
+
+def add_missing_columns():
+    """Add columns introduced after customer_rfm was first created"""
+    existing = {col["name"] for col in inspect(engine).get_columns(CustomerRFM.__tablename__)}
+    table = CustomerRFM.__table__
+    
+    with engine.begin() as conn:
+        for name in (*MATERIALIZED_COLUMNS, *PROFILE_COLUMNS):
+            if name not in existing:
+                col_type = table.c[name].type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {col_type}"))
+                print(f"✅ Added column {table.name}.{name}")
+
+
+def refresh_segment_assignments(
+    score_fn: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+    model_version: str,
+    batch_size: int = 5000
+) -> int:
+    """
+    Materialize segment assignments for rows that are unscored or stale.
+    
+    Only rows whose model_version differs from the given version (including
+    rows invalidated by an RFM change) are re-scored. Rows are walked in
+    primary key order and updated in bulk, one transaction per batch.
+    
+    Args:
+        score_fn: Maps an (N, 3) RFM matrix to (segment_ids, distances)
+        model_version: Version string of the model behind score_fn
+        batch_size: Number of rows scored and updated per transaction
+        
+    Returns:
+        Number of rows updated
+    """
+    db = get_db()
+    if db is None:
+        return 0
+    
+    updated = 0
+    last_id = 0
     try:
-        return db
-    except:
+        while True:
+            rows = db.query(
+                CustomerRFM.id,
+                CustomerRFM.recency,
+                CustomerRFM.frequency,
+                CustomerRFM.monetary
+            ).filter(
+                CustomerRFM.id > last_id,
+                or_(
+                    CustomerRFM.model_version.is_(None),
+                    CustomerRFM.model_version != model_version,
+                    CustomerRFM.segment_id.is_(None)
+                )
+            ).order_by(CustomerRFM.id).limit(batch_size).all()
+            
+            if not rows:
+                break
+            
+            matrix = np.array(rows, dtype=np.float64)
+            labels, distances = score_fn(matrix[:, 1:])
+            db.execute(update(CustomerRFM), [
+                {
+                    "id": int(row_id),
+                    "segment_id": int(label),
+                    "distance_to_center": float(dist),
+                    "model_version": model_version
+                }
+                for row_id, label, dist in zip(matrix[:, 0], labels, distances)
+            ])
+            db.commit()
+            
+            updated += len(rows)
+            last_id = int(matrix[-1, 0])
+    except Exception:
+        db.rollback()
+        raise
+    finally:
         db.close()
-        return None
+    
+    return updated
+
+
+def upsert_statement(
+    dialect_name: str,
+    columns: Tuple[str, ...],
+    on_conflict: str = "update",
+    source=None
+):
+    """
+    Build a multi-row INSERT into customer_rfm that resolves customer_id conflicts.
+    
+    With on_conflict="update", existing customers get the new values. Their
+    materialized segment is cleared only when recency, frequency or monetary
+    actually change, mirroring invalidate_segment_on_rfm_change (ORM events
+    do not fire for bulk statements).
+    
+    Args:
+        dialect_name: "postgresql" or "sqlite"
+        columns: customer_rfm columns being loaded (must include customer_id)
+        on_conflict: "update" to upsert, "skip" to keep existing rows
+        source: Optional SELECT to insert from (e.g. a staging table);
+                without it the statement takes executemany parameter lists
+        
+    Returns:
+        SQLAlchemy insert statement
+        
+    Raises:
+        ValueError: If the dialect does not support ON CONFLICT
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Upsert not supported for {dialect_name}")
+    
+    table = CustomerRFM.__table__
+    stmt = insert(table)
+    if source is not None:
+        stmt = stmt.from_select(list(columns), source)
+    if on_conflict == "skip":
+        return stmt.on_conflict_do_nothing(index_elements=["customer_id"])
+    
+    updates = {name: stmt.excluded[name] for name in columns if name != "customer_id"}
+    rfm_changed = or_(*(
+        table.c[name].is_distinct_from(stmt.excluded[name])
+        for name in RFM_VALUE_COLUMNS if name in columns
+    ))
+    for name in MATERIALIZED_COLUMNS:
+        updates[name] = case((rfm_changed, None), else_=table.c[name])
+    return stmt.on_conflict_do_update(index_elements=["customer_id"], set_=updates)
+
+
+def iter_rfm_chunks(db, columns, chunk_size: int = 5000, limit: int = None, after_id: int = 0):
+    """
+    Yield customer_rfm rows in primary key order, one chunk at a time.
+    
+    Uses keyset pagination (WHERE id > last_id ORDER BY id LIMIT n), so each
+    chunk costs the same regardless of how far into the table it is.
+    
+    Args:
+        db: Open database session
+        columns: Columns to select; each yielded row is (id, *columns)
+        chunk_size: Maximum number of rows per chunk
+        limit: Maximum total number of rows (None for all)
+        after_id: Only return rows with a primary key greater than this
+        
+    Yields:
+        Lists of row tuples
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = db.query(CustomerRFM.id, *columns).filter(
+            CustomerRFM.id > after_id
+        ).order_by(CustomerRFM.id).limit(size).all()
+        
+        if not rows:
+            return
+        yield rows
+        
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
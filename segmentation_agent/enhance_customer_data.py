@@ -6,12 +6,14 @@ This script:
 2. Adds realistic fields: name, email, phone, signup_date, category preferences, engagement metrics
 3. Saves enhanced data to rfm_table_enhanced.csv
 4. Backs up original to rfm_table_backup.csv
+5. Rebuilds the memory-mapped snapshot served by the API (models/rfm_snapshot)
 """
 import csv
 import random
 from datetime import datetime, timedelta
 import os
 import shutil
+from customer_store import write_snapshot
 
 # Seed for reproducibility
 random.seed(42)
@@ -165,6 +167,10 @@ with open('models/rfm_table_enhanced.csv', 'w', newline='') as f:
     writer.writeheader()
     writer.writerows(enhanced_data)
 
+# Rebuild the columnar snapshot so the API picks up the new columns
+print("💾 Rebuilding customer snapshot...")
+write_snapshot('models/rfm_table.csv', 'models/rfm_snapshot')
+
 print("\n" + "="*60)
 print("✅ DATA ENHANCEMENT COMPLETE!")
 print("="*60)
@@ -174,6 +180,7 @@ print("\n📁 Files:")
 print(f"   ✅ models/rfm_table.csv (ENHANCED - used by API)")
 print(f"   ✅ models/rfm_table_enhanced.csv (copy)")
 print(f"   ✅ models/rfm_table_backup.csv (original)")
+print(f"   ✅ models/rfm_snapshot/ (memory-mapped snapshot)")
 print("\n📊 New fields added:")
 print("   • customer_name, email, phone")
 print("   • signup_date, last_purchase_date")
@@ -0,0 +1,306 @@
+"""
+Generate large synthetic customer tables for load testing
+
+Usage:
+    python generate_customers.py --rows 10000000 --output data/customers_10m.csv
+    python generate_customers.py --rows 1000000 --output data/customers_1m.parquet
+
+This script:
+1. Fits the joint Recency/Frequency/Monetary distribution of rfm_table.csv
+   (a Gaussian copula over the empirical marginals, so both the per-column
+   distributions and their correlations match the real customers)
+2. Samples customers chunk by chunk with NumPy, deriving the same 18 columns
+   as enhance_customer_data.py (names, contact details, dates, preferences,
+   engagement metrics, churn flag, risk score, lifetime value)
+3. Appends each chunk to a CSV or Parquet file, so memory stays bounded by
+   --chunk-size no matter how many rows are written
+
+Output is deterministic for a given --seed, --chunk-size and --as-of date.
+Parquet output needs pyarrow.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+# Paths
+RFM_PATH = os.getenv("RFM_CSV_PATH", "models/rfm_table.csv")
+
+RFM_COLUMNS = ["Recency", "Frequency", "Monetary"]
+
+# Column order of the enhanced rfm_table.csv
+OUTPUT_COLUMNS = [
+    "CustomerID", "customer_name", "email", "phone", "signup_date", "last_purchase_date",
+    "Recency", "Frequency", "Monetary", "favorite_category", "preferred_channel",
+    "email_opens", "email_clicks", "campaign_responses", "average_order_value",
+    "is_churned", "risk_score", "lifetime_value"
+]
+
+# Same vocabularies as enhance_customer_data.py
+FIRST_NAMES = np.array(["Sarah", "Michael", "Jennifer", "David", "Emily", "James", "Jessica", "Robert",
+                        "Lisa", "John", "Amy", "Daniel", "Michelle", "Christopher", "Ashley", "Matthew",
+                        "Amanda", "Joshua", "Melissa", "Andrew", "Stephanie", "Kevin", "Nicole", "Brian",
+                        "Rachel", "William", "Laura", "Ryan", "Elizabeth", "Justin", "Rebecca", "Brandon",
+                        "Samantha", "Jason", "Maria", "Tyler", "Kimberly", "Eric", "Heather", "Jacob"])
+
+LAST_NAMES = np.array(["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+                       "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+                       "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Thompson", "White",
+                       "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker", "Young"])
+
+CATEGORIES = np.array(["Electronics", "Fashion", "Home & Garden", "Sports & Outdoors", "Books",
+                       "Beauty & Personal Care", "Toys & Games", "Automotive", "Health & Wellness",
+                       "Food & Beverage", "Office Supplies", "Pet Supplies"])
+
+CHANNELS = np.array(["Email", "SMS", "Push", "Email + SMS"])
+
+EMAIL_DOMAINS = np.array(["gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "example.com"])
+
+CHURN_RECENCY_DAYS = 180  # 6 months
+
+# "First Last" and "first.last" for every name pair, and "<id % 1000>@domain"
+FULL_NAMES = np.array([f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES], dtype=object)
+EMAIL_LOCAL_PARTS = np.array([f"{f.lower()}.{l.lower()}" for f in FIRST_NAMES for l in LAST_NAMES], dtype=object)
+EMAIL_SUFFIXES = np.array([f"{i}@{d}" for i in range(1000) for d in EMAIL_DOMAINS], dtype=object)
+
+
+class RFMDistribution:
+    """
+    Gaussian copula fitted to an RFM table.
+
+    Each column keeps its empirical marginal (sampled by interpolating the
+    sorted observed values); the dependence between columns comes from the
+    correlation of their normal scores.
+
+    Attributes:
+        sorted_values: (N, 3) observed values, each column sorted
+        correlation: (3, 3) correlation matrix of the normal scores
+    """
+
+    def __init__(self, rfm: np.ndarray) -> None:
+        from scipy.special import ndtri
+        from scipy.stats import rankdata
+
+        rfm = np.asarray(rfm, dtype=np.float64)
+        n = len(rfm)
+        self.sorted_values = np.sort(rfm, axis=0)
+
+        # Normal scores of the (tie-averaged) ranks
+        scores = ndtri(rankdata(rfm, axis=0) / (n + 1))
+        self.correlation = np.corrcoef(scores, rowvar=False)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "RFMDistribution":
+        """Fit to the Recency, Frequency and Monetary columns of a CSV"""
+        return cls(pd.read_csv(path, usecols=RFM_COLUMNS)[RFM_COLUMNS].to_numpy())
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draw n customers.
+
+        Returns:
+            (n, 3) matrix: integer-valued Recency (>= 0) and Frequency (>= 1),
+            Monetary rounded to cents
+        """
+        from scipy.special import ndtr
+
+        z = rng.multivariate_normal(np.zeros(3), self.correlation, size=n, method="cholesky")
+        u = ndtr(z)
+
+        # Inverse empirical CDF, linear between observed order statistics
+        positions = np.linspace(0.0, 1.0, len(self.sorted_values))
+        rfm = np.column_stack([
+            np.interp(u[:, j], positions, self.sorted_values[:, j]) for j in range(3)
+        ])
+        rfm[:, 0] = np.maximum(0, np.round(rfm[:, 0]))
+        rfm[:, 1] = np.maximum(1, np.round(rfm[:, 1]))
+        rfm[:, 2] = np.round(rfm[:, 2], 2)
+        return rfm
+
+
+def generate_chunk(
+    customer_ids: np.ndarray,
+    distribution: RFMDistribution,
+    rng: np.random.Generator,
+    as_of: np.datetime64
+) -> pd.DataFrame:
+    """
+    Generate one chunk of customers with all 18 enhanced columns.
+
+    Derived fields follow the formulas in enhance_customer_data.py, applied
+    to whole arrays instead of row by row.
+
+    Args:
+        customer_ids: (n,) int64 customer IDs for this chunk
+        distribution: Fitted RFM distribution
+        rng: Random generator for this chunk
+        as_of: Reference date for signup/last purchase dates
+
+    Returns:
+        DataFrame with OUTPUT_COLUMNS
+    """
+    n = len(customer_ids)
+    rfm = distribution.sample(n, rng)
+    recency, frequency, monetary = rfm[:, 0], rfm[:, 1], rfm[:, 2]
+
+    # Names and contact details, indexed into precomputed string tables
+    name_index = rng.integers(0, len(FIRST_NAMES), n) * len(LAST_NAMES) + rng.integers(0, len(LAST_NAMES), n)
+    suffix_index = (customer_ids % 1000) * len(EMAIL_DOMAINS) + rng.integers(0, len(EMAIL_DOMAINS), n)
+    names = FULL_NAMES[name_index]
+    emails = pd.Series(EMAIL_LOCAL_PARTS[name_index]) + pd.Series(EMAIL_SUFFIXES[suffix_index])
+    phones = (
+        "+1-" + pd.Series(rng.integers(200, 1000, n)).astype(str)
+        + "-" + pd.Series(rng.integers(200, 1000, n)).astype(str)
+        + "-" + pd.Series(rng.integers(1000, 10000, n)).astype(str)
+    )
+
+    # Dates: customers with higher frequency have been around longer
+    signup_days = recency + frequency * 30 + rng.integers(0, 91, n)
+    signup_dates = np.datetime_as_string(as_of - signup_days.astype("timedelta64[D]"), unit="D")
+    last_purchase_dates = np.datetime_as_string(as_of - recency.astype("timedelta64[D]"), unit="D")
+
+    # Engagement: more frequent buyers open and click more
+    email_opens = np.minimum(frequency * rng.integers(2, 6, n) + rng.integers(0, 11, n), 100)
+    email_clicks = np.trunc(email_opens * rng.uniform(0.2, 0.4, n)).astype(np.int64)
+    campaign_responses = np.trunc(frequency * rng.uniform(0.3, 0.7, n)).astype(np.int64)
+
+    # Derived value and risk metrics
+    average_order_value = np.round(monetary / frequency, 2)
+    risk_score = np.clip(np.trunc(recency / 3.74 - frequency * 2 - monetary / 500), 0, 100).astype(np.int64)
+    lifetime_value = np.round(monetary + frequency * 200, 2)
+
+    return pd.DataFrame({
+        "CustomerID": customer_ids,
+        "customer_name": names,
+        "email": emails,
+        "phone": phones,
+        "signup_date": signup_dates,
+        "last_purchase_date": last_purchase_dates,
+        "Recency": recency,
+        "Frequency": frequency,
+        "Monetary": monetary,
+        "favorite_category": CATEGORIES[rng.integers(0, len(CATEGORIES), n)],
+        "preferred_channel": CHANNELS[rng.integers(0, len(CHANNELS), n)],
+        "email_opens": email_opens,
+        "email_clicks": email_clicks,
+        "campaign_responses": campaign_responses,
+        "average_order_value": average_order_value,
+        "is_churned": recency > CHURN_RECENCY_DAYS,
+        "risk_score": risk_score,
+        "lifetime_value": lifetime_value
+    }, columns=OUTPUT_COLUMNS)
+
+
+def generate_customers(
+    rows: int,
+    distribution: RFMDistribution,
+    seed: int,
+    chunk_size: int,
+    id_start: int,
+    as_of: np.datetime64
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield customer chunks of at most chunk_size rows.
+
+    Every chunk has its own generator seeded from (seed, chunk index), so a
+    chunk's content does not depend on how many chunks came before it.
+    """
+    for index, start in enumerate(range(0, rows, chunk_size)):
+        n = min(chunk_size, rows - start)
+        rng = np.random.default_rng([seed, index])
+        ids = np.arange(id_start + start, id_start + start + n, dtype=np.int64)
+        yield generate_chunk(ids, distribution, rng, as_of)
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to a CSV or Parquet file, chosen by extension"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._tmp_path = path + ".tmp"
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self._tmp_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(
+                self._tmp_path,
+                mode="a" if self._wrote_header else "w",
+                header=not self._wrote_header,
+                index=False
+            )
+            self._wrote_header = True
+
+    def close(self) -> None:
+        """Finish the file and move it into place"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if os.path.exists(self._tmp_path):
+            os.replace(self._tmp_path, self.path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic customers for load testing")
+    parser.add_argument("--rows", type=int, required=True, help="Number of customers")
+    parser.add_argument("--output", required=True, help="Output .csv or .parquet path")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="Rows generated per chunk")
+    parser.add_argument("--id-start", type=int, default=100_000, help="First CustomerID")
+    parser.add_argument("--as-of", default=date.today().isoformat(), help="Reference date (YYYY-MM-DD)")
+    parser.add_argument("--source", default=RFM_PATH, help="RFM table to fit")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ RFM table not found: {args.source}")
+        return 1
+
+    if args.output.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("❌ Parquet output needs pyarrow: pip install pyarrow")
+            return 1
+
+    print(f"📂 Fitting RFM distribution to {args.source}...")
+    distribution = RFMDistribution.from_csv(args.source)
+
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    print(f"🔧 Generating {args.rows:,} customers (seed {args.seed}, as of {args.as_of})...")
+    start = time.perf_counter()
+    writer = ChunkWriter(args.output)
+    written = 0
+    for chunk in generate_customers(
+        args.rows, distribution, args.seed, args.chunk_size, args.id_start, np.datetime64(args.as_of, "D")
+    ):
+        writer.write(chunk)
+        written += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"   {written:,}/{args.rows:,} customers ({written / elapsed:,.0f} rows/s)")
+    writer.close()
+
+    print(f"✅ Wrote {written:,} customers to {args.output} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Incremental RFM Maintenance
+
+Applies new transaction batches to customer_rfm in place instead of rebuilding
+the whole table from the raw Online Retail file. For every customer in a batch:
+
+- Frequency grows by the number of new distinct invoices
+- Monetary grows by the new invoices' Quantity * UnitPrice
+- last_purchase_date moves forward and Recency is recomputed from it
+
+Invoices are recorded in processed_invoices in the same transaction, so a
+batch that is delivered twice (or a file that is dropped again) changes
+nothing the second time. Only the customers touched by a batch are re-scored.
+
+Transactions use the raw Online Retail columns: InvoiceNo, CustomerID,
+InvoiceDate, Quantity, UnitPrice. Lines are cleaned with utils.clean_data,
+just like the full rebuild, so returns and cancellations are ignored. An
+invoice must arrive complete in one batch; lines of an invoice that was
+already applied are skipped.
+
+Recency of customers without new purchases is not aged here; it stays as of
+their last update until the next full rebuild.
+
+Affected customers are re-scored with the model the API serves (the
+registry's CURRENT version, else SERVING_ARTIFACT_PATH), so the stored
+model_version matches it. --watch reloads the model when that changes
+(a new version is activated or rolled back).
+
+Usage:
+    python incremental_rfm.py transactions.csv more.jsonl
+    python incremental_rfm.py --inbox data/incoming
+    python incremental_rfm.py --inbox data/incoming --watch
+
+Environment Variables:
+    TRANSACTIONS_INBOX: Drop folder for transaction files (default data/incoming)
+    INBOX_POLL_SECONDS: Polling interval for --watch (default 30)
+    MODEL_REGISTRY_DIR: Model registry; its CURRENT version re-scores affected customers
+    SERVING_ARTIFACT_PATH: Model used when the registry has no CURRENT version
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, update
+
+from database import CustomerRFM, ProcessedInvoice, get_db, init_db, is_db_available
+from model_registry import MODEL_REGISTRY_DIR, artifact_path, current_version, load_model_state
+from utils import clean_data
+
+TRANSACTIONS_INBOX: str = os.getenv("TRANSACTIONS_INBOX", "data/incoming")
+INBOX_POLL_SECONDS: float = float(os.getenv("INBOX_POLL_SECONDS", "30"))
+SERVING_ARTIFACT_PATH: str = os.getenv("SERVING_ARTIFACT_PATH", "models/segment_model.npz")
+
+TRANSACTION_COLUMNS = ("InvoiceNo", "CustomerID", "InvoiceDate", "Quantity", "UnitPrice")
+TRANSACTION_SUFFIXES = (".csv", ".jsonl", ".ndjson")
+
+# Keys per IN (...) query (stays under SQLite's variable limit)
+LOOKUP_BATCH = 500
+
+ScoreFn = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def read_transactions(path: str) -> pd.DataFrame:
+    """
+    Read a transaction file from the drop folder.
+
+    Args:
+        path: .csv file, or .jsonl/.ndjson file with one transaction line per row
+
+    Returns:
+        DataFrame with the raw transaction columns
+
+    Raises:
+        ValueError: If the file type is not supported
+    """
+    if path.endswith(".csv"):
+        return pd.read_csv(path, dtype={"InvoiceNo": str})
+    if path.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True, dtype={"InvoiceNo": str})
+    raise ValueError(f"Unsupported transaction file: {path}")
+
+
+def summarize_invoices(transactions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean transaction lines and collapse them to one row per invoice.
+
+    Args:
+        transactions: Raw lines with TRANSACTION_COLUMNS
+
+    Returns:
+        DataFrame with columns invoice_no, customer_id, invoice_date, amount
+
+    Raises:
+        ValueError: If columns are missing or an invoice names several customers
+    """
+    missing = set(TRANSACTION_COLUMNS) - set(transactions.columns)
+    if missing:
+        raise ValueError(f"Missing transaction columns: {sorted(missing)}")
+
+    df = transactions[list(TRANSACTION_COLUMNS)].copy()
+    df["CustomerID"] = pd.to_numeric(df["CustomerID"], errors="coerce")
+    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce")
+    df["UnitPrice"] = pd.to_numeric(df["UnitPrice"], errors="coerce")
+    df = clean_data(df)
+    df = df.assign(
+        InvoiceNo=df["InvoiceNo"].astype(str).str.strip(),
+        InvoiceDate=pd.to_datetime(df["InvoiceDate"]),
+        amount=df["Quantity"] * df["UnitPrice"]
+    )
+
+    invoices = df.groupby("InvoiceNo", sort=False).agg(
+        customer_id=("CustomerID", "first"),
+        customers=("CustomerID", "nunique"),
+        invoice_date=("InvoiceDate", "max"),
+        amount=("amount", "sum")
+    )
+    shared = invoices.index[invoices["customers"] > 1]
+    if len(shared):
+        raise ValueError(f"Invoices with more than one CustomerID: {list(shared[:5])}")
+
+    return invoices.drop(columns="customers").rename_axis("invoice_no").reset_index()
+
+
+def _in_batches(values: Sequence[Any]):
+    for start in range(0, len(values), LOOKUP_BATCH):
+        yield values[start:start + LOOKUP_BATCH]
+
+
+def apply_transactions(
+    transactions: pd.DataFrame,
+    score_fn: Optional[ScoreFn] = None,
+    model_version: Optional[str] = None,
+    as_of: Optional[date] = None
+) -> Dict[str, int]:
+    """
+    Apply a batch of transaction lines to customer_rfm in one transaction.
+
+    Args:
+        transactions: Raw lines with TRANSACTION_COLUMNS
+        score_fn: Maps an (N, 3) RFM matrix to (segment_ids, distances); when
+                  omitted, affected rows are left unscored for the next
+                  refresh_segment_assignments run
+        model_version: Version string of the model behind score_fn
+        as_of: Date Recency is measured from. Defaults to the day after the
+               batch's newest invoice (the rule build_rfm_table uses); must
+               not be before any affected customer's last purchase
+
+    Returns:
+        Dictionary with invoices_received, invoices_duplicate, invoices_applied,
+        customers_updated, customers_inserted and customers_rescored
+
+    Raises:
+        RuntimeError: If the database is unavailable
+        ValueError: If the batch is malformed, or as_of is earlier than an
+                    affected customer's stored last purchase (nothing is applied)
+    """
+    invoices = summarize_invoices(transactions)
+    stats = {
+        "invoices_received": len(invoices),
+        "invoices_duplicate": 0,
+        "invoices_applied": 0,
+        "customers_updated": 0,
+        "customers_inserted": 0,
+        "customers_rescored": 0
+    }
+    if invoices.empty:
+        return stats
+
+    db = get_db()
+    if db is None:
+        raise RuntimeError("Database not available")
+
+    try:
+        # Idempotency: drop invoices that an earlier batch already applied
+        seen = set()
+        for batch in _in_batches(invoices["invoice_no"].tolist()):
+            seen.update(
+                row[0] for row in db.query(ProcessedInvoice.invoice_no).filter(
+                    ProcessedInvoice.invoice_no.in_(batch)
+                )
+            )
+        new = invoices[~invoices["invoice_no"].isin(seen)]
+        stats["invoices_duplicate"] = len(invoices) - len(new)
+        if new.empty:
+            return stats
+
+        now = datetime.utcnow()
+        db.execute(insert(ProcessedInvoice), [
+            {
+                "invoice_no": row.invoice_no,
+                "customer_id": float(row.customer_id),
+                "invoice_date": row.invoice_date.to_pydatetime(),
+                "amount": float(row.amount),
+                "processed_at": now
+            }
+            for row in new.itertuples(index=False)
+        ])
+
+        per_customer = new.groupby("customer_id").agg(
+            invoices=("invoice_no", "size"),
+            amount=("amount", "sum"),
+            last_purchase=("invoice_date", "max")
+        )
+        if as_of is None:
+            as_of = (new["invoice_date"].max() + pd.Timedelta(days=1)).date()
+
+        # Lock the affected rows so concurrent batches cannot lose updates
+        existing: Dict[float, Any] = {}
+        for batch in _in_batches(per_customer.index.tolist()):
+            for row in db.query(
+                CustomerRFM.id,
+                CustomerRFM.customer_id,
+                CustomerRFM.frequency,
+                CustomerRFM.monetary,
+                CustomerRFM.last_purchase_date
+            ).filter(CustomerRFM.customer_id.in_(batch)).with_for_update():
+                existing[row.customer_id] = row
+
+        customer_ids = per_customer.index.to_numpy(dtype=np.float64)
+        last_purchase = []
+        frequency = per_customer["invoices"].to_numpy(dtype=np.float64)
+        monetary = per_customer["amount"].to_numpy(dtype=np.float64)
+        for i, (cid, batch_last) in enumerate(zip(customer_ids, per_customer["last_purchase"])):
+            last = batch_last.date()
+            row = existing.get(cid)
+            if row is not None:
+                frequency[i] += row.frequency
+                monetary[i] += row.monetary
+                if row.last_purchase_date is not None:
+                    last = max(last, row.last_purchase_date)
+            last_purchase.append(last)
+        # A stored purchase after as_of means the batch is older than the data
+        # (or as_of is wrong); clamping would silently zero their Recency
+        ahead = [(cid, last) for cid, last in zip(customer_ids, last_purchase) if last > as_of]
+        if ahead:
+            sample = ", ".join(f"{cid:g} ({last})" for cid, last in ahead[:5])
+            raise ValueError(
+                f"as_of {as_of} is before the last purchase of {len(ahead)} customers: {sample}"
+            )
+        recency = np.array([(as_of - last).days for last in last_purchase], dtype=np.float64)
+
+        if score_fn is not None:
+            labels, distances = score_fn(np.column_stack([recency, frequency, monetary]))
+            stats["customers_rescored"] = len(labels)
+
+        updates: List[Dict[str, Any]] = []
+        inserts: List[Dict[str, Any]] = []
+        for i, cid in enumerate(customer_ids):
+            values = {
+                "recency": float(recency[i]),
+                "frequency": float(frequency[i]),
+                "monetary": float(monetary[i]),
+                "last_purchase_date": last_purchase[i],
+                "segment_id": int(labels[i]) if score_fn is not None else None,
+                "distance_to_center": float(distances[i]) if score_fn is not None else None,
+                "model_version": model_version if score_fn is not None else None
+            }
+            row = existing.get(cid)
+            if row is not None:
+                updates.append({"id": row.id, **values})
+            else:
+                inserts.append({"customer_id": float(cid), **values})
+
+        if updates:
+            db.execute(update(CustomerRFM), updates)
+        if inserts:
+            db.execute(insert(CustomerRFM), inserts)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    stats["invoices_applied"] = len(new)
+    stats["customers_updated"] = len(updates)
+    stats["customers_inserted"] = len(inserts)
+    return stats
+
+
+def served_artifact() -> Optional[str]:
+    """Artifact the API serves: the registry's CURRENT version, else SERVING_ARTIFACT_PATH"""
+    version = current_version(MODEL_REGISTRY_DIR)
+    if version is not None:
+        return artifact_path(version, MODEL_REGISTRY_DIR)
+    if os.path.exists(SERVING_ARTIFACT_PATH):
+        return SERVING_ARTIFACT_PATH
+    return None
+
+
+def model_signature() -> Optional[Tuple]:
+    """Changes when the served model does: the registry pointer, else the artifact file's stat"""
+    version = current_version(MODEL_REGISTRY_DIR)
+    if version is not None:
+        return ("registry", version)
+    try:
+        stat = os.stat(SERVING_ARTIFACT_PATH)
+    except FileNotFoundError:
+        return None
+    return ("file", stat.st_mtime_ns, stat.st_size)
+
+
+def load_score_fn() -> Tuple[Optional[ScoreFn], Optional[str]]:
+    """
+    Load the model the API serves, used to re-score affected customers.
+
+    Returns:
+        Tuple of (score_fn, model_version), or (None, None) if no artifact exists
+
+    Raises:
+        ValueError: If the artifact fails validation
+    """
+    path = served_artifact()
+    if path is None:
+        return None, None
+    state = load_model_state(path)
+    return state.scorer.score, state.version
+
+
+def process_inbox(inbox: str, score_fn: Optional[ScoreFn], model_version: Optional[str]) -> int:
+    """
+    Apply every transaction file in the drop folder, oldest name first.
+
+    Applied files move to <inbox>/processed, files that fail move to
+    <inbox>/failed. Re-dropping a processed file is harmless.
+
+    Args:
+        inbox: Drop folder
+        score_fn: See apply_transactions
+        model_version: See apply_transactions
+
+    Returns:
+        Number of files applied
+    """
+    applied = 0
+    for name in sorted(os.listdir(inbox)):
+        path = os.path.join(inbox, name)
+        if not os.path.isfile(path) or not name.endswith(TRANSACTION_SUFFIXES):
+            continue
+
+        try:
+            stats = apply_transactions(read_transactions(path), score_fn, model_version)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            destination = "failed"
+        else:
+            print(f"✅ {name}: {stats['invoices_applied']} invoices applied "
+                  f"({stats['invoices_duplicate']} already seen), "
+                  f"{stats['customers_updated']} customers updated, "
+                  f"{stats['customers_inserted']} new")
+            destination = "processed"
+            applied += 1
+
+        os.makedirs(os.path.join(inbox, destination), exist_ok=True)
+        shutil.move(path, os.path.join(inbox, destination, name))
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply new transactions to customer_rfm")
+    parser.add_argument("files", nargs="*", help="Transaction files (.csv, .jsonl)")
+    parser.add_argument("--inbox", help=f"Drop folder to process (e.g. {TRANSACTIONS_INBOX})")
+    parser.add_argument("--watch", action="store_true", help="Keep polling the drop folder")
+    parser.add_argument("--interval", type=float, default=INBOX_POLL_SECONDS,
+                        help="Seconds between drop folder polls")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="Date Recency is measured from (files only; default: day after newest invoice)")
+    args = parser.parse_args()
+
+    if not args.files and not args.inbox:
+        parser.error("give transaction files or --inbox")
+
+    if not is_db_available():
+        print("❌ Database not available. Check your DATABASE_URL in .env")
+        sys.exit(1)
+    init_db()
+
+    signature = model_signature()
+    score_fn, model_version = load_score_fn()
+    if score_fn is None:
+        print(f"⚠️ No model in {MODEL_REGISTRY_DIR} or {SERVING_ARTIFACT_PATH}; "
+              f"affected customers are left for the next materialization")
+
+    for path in args.files:
+        start = time.perf_counter()
+        stats = apply_transactions(read_transactions(path), score_fn, model_version, args.as_of)
+        print(f"✅ {path}: {stats} ({time.perf_counter() - start:.2f}s)")
+
+    if args.inbox:
+        os.makedirs(args.inbox, exist_ok=True)
+        while True:
+            if model_signature() != signature:
+                # Activated or rolled back since the last poll: score like the API does
+                try:
+                    signature = model_signature()
+                    score_fn, model_version = load_score_fn()
+                    print(f"🔄 Re-scoring with model version {model_version}")
+                except (OSError, ValueError) as e:
+                    # Leave rows unscored rather than stamp a version the API does not serve
+                    signature, score_fn, model_version = None, None, None
+                    print(f"⚠️ Model reload failed, retrying next poll: {e}")
+            process_inbox(args.inbox, score_fn, model_version)
+            if not args.watch:
+                break
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Fingerprinted Parquet Cache for Training Data
+
+Parsing data/Online Retail.xlsx with openpyxl takes far longer than training
+the model. The first load writes the cleaned transactions and the RFM table
+to Parquet; later loads read those files instead, until the source changes.
+
+Each source gets its own cache directory, named after the file and a hash
+of its absolute path (so same-named files in different directories do not
+share one), with a manifest recording the source's path, size, mtime and
+SHA-256 hash:
+
+- Size and mtime unchanged: the cache is used without reading the source
+- Size or mtime changed: the source is hashed; an identical hash (file only
+  touched or copied over) keeps the cache, anything else rebuilds it
+
+Files are written to temporary names and renamed into place, manifest last,
+so an interrupted build never leaves a cache that looks valid.
+
+Usage:
+    python ingest_cache.py                      # build or verify the cache
+    python ingest_cache.py --refresh            # force a rebuild
+
+Environment Variables:
+    INGEST_CACHE_DIR: Cache root directory (default data/cache)
+
+Needs pyarrow for Parquet I/O.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from utils import build_rfm_table, clean_data, load_raw_data
+
+INGEST_CACHE_DIR: str = os.getenv("INGEST_CACHE_DIR", "data/cache")
+DATA_PATH: str = "data/Online Retail.xlsx"
+
+MANIFEST_NAME = "manifest.json"
+TRANSACTIONS_NAME = "transactions.parquet"
+RFM_NAME = "rfm_table.parquet"
+
+# Bump when clean_data/build_rfm_table output changes, to invalidate caches
+CACHE_FORMAT = 1
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(source: str, cache_dir: str = INGEST_CACHE_DIR) -> str:
+    """Cache directory for one source file: <file stem>-<hash of its absolute path>"""
+    absolute = os.path.abspath(source)
+    stem = os.path.splitext(os.path.basename(absolute))[0]
+    return os.path.join(cache_dir, f"{stem}-{hashlib.sha256(absolute.encode()).hexdigest()[:12]}")
+
+
+def _read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    tmp = os.path.join(directory, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST_NAME))
+
+
+def _write_parquet(df: pd.DataFrame, path: str) -> None:
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def build_cache(source: str, directory: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse the source and write cleaned transactions and the RFM table.
+
+    Args:
+        source: Raw transaction file (Excel)
+        directory: Cache directory for this source
+        sha256: Source hash if already computed
+
+    Returns:
+        The new manifest
+    """
+    stat = os.stat(source)
+    sha256 = sha256 or file_sha256(source)
+
+    start = time.perf_counter()
+    df_clean = clean_data(load_raw_data(source))
+    rfm = build_rfm_table(df_clean)
+    parse_seconds = time.perf_counter() - start
+
+    # Excel mixes int and str codes in these columns; Parquet needs one type
+    df_clean = df_clean.astype({"InvoiceNo": str, "StockCode": str}, errors="ignore")
+
+    os.makedirs(directory, exist_ok=True)
+    # Invalidate first, so a crash mid-write leaves no valid-looking manifest
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    _write_parquet(df_clean, os.path.join(directory, TRANSACTIONS_NAME))
+    _write_parquet(rfm, os.path.join(directory, RFM_NAME))
+
+    manifest = {
+        "format": CACHE_FORMAT,
+        "source": os.path.abspath(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256,
+        "transactions": len(df_clean),
+        "customers": len(rfm),
+        "parse_seconds": round(parse_seconds, 3),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    _write_manifest(directory, manifest)
+    return manifest
+
+
+def ensure_cache(source: str = DATA_PATH, cache_dir: str = INGEST_CACHE_DIR, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Make sure the cache for source is current, building it if needed.
+
+    Args:
+        source: Raw transaction file (Excel)
+        cache_dir: Cache root directory
+        refresh: Rebuild even if the cache is current
+
+    Returns:
+        Manifest of the current cache, plus "directory" and "hit" (whether
+        the existing cache was reused)
+
+    Raises:
+        FileNotFoundError: If the source does not exist
+    """
+    directory = cache_path(source, cache_dir)
+    stat = os.stat(source)
+    manifest = None if refresh else _read_manifest(directory)
+
+    if (
+        manifest is not None
+        and manifest.get("format") == CACHE_FORMAT
+        and manifest.get("source") == os.path.abspath(source)
+    ):
+        if manifest["size"] == stat.st_size and manifest["mtime_ns"] == stat.st_mtime_ns:
+            return {**manifest, "directory": directory, "hit": True}
+
+        # Touched or copied: only the content hash decides
+        sha256 = file_sha256(source)
+        if sha256 == manifest["sha256"]:
+            manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            _write_manifest(directory, manifest)
+            return {**manifest, "directory": directory, "hit": True}
+        manifest = build_cache(source, directory, sha256)
+    else:
+        manifest = build_cache(source, directory)
+
+    return {**manifest, "directory": directory, "hit": False}
+
+
+def load_rfm_table(source: str = DATA_PATH, cache_dir: str = INGEST_CACHE_DIR, refresh: bool = False) -> pd.DataFrame:
+    """
+    RFM table for source (as build_rfm_table returns it), from the cache.
+
+    Args:
+        source: Raw transaction file (Excel)
+        cache_dir: Cache root directory
+        refresh: Rebuild the cache first
+
+    Returns:
+        DataFrame with CustomerID, Recency, Frequency, Monetary
+    """
+    manifest = ensure_cache(source, cache_dir, refresh)
+    return pd.read_parquet(os.path.join(manifest["directory"], RFM_NAME))
+
+
+def load_clean_transactions(source: str = DATA_PATH, cache_dir: str = INGEST_CACHE_DIR, refresh: bool = False) -> pd.DataFrame:
+    """
+    Cleaned transactions for source (clean_data output), from the cache.
+
+    InvoiceNo and StockCode are stored as strings.
+
+    Args:
+        source: Raw transaction file (Excel)
+        cache_dir: Cache root directory
+        refresh: Rebuild the cache first
+
+    Returns:
+        Cleaned transaction DataFrame
+    """
+    manifest = ensure_cache(source, cache_dir, refresh)
+    return pd.read_parquet(os.path.join(manifest["directory"], TRANSACTIONS_NAME))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or verify the training data cache")
+    parser.add_argument("--source", default=DATA_PATH, help="Raw transaction file")
+    parser.add_argument("--cache-dir", default=INGEST_CACHE_DIR, help="Cache root directory")
+    parser.add_argument("--refresh", action="store_true", help="Rebuild even if current")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = ensure_cache(args.source, args.cache_dir, args.refresh)
+    status = "✅ Cache current" if manifest["hit"] else "✅ Cache built"
+    print(f"{status}: {manifest['directory']} ({manifest['transactions']:,} transactions, "
+          f"{manifest['customers']:,} customers, {time.perf_counter() - start:.2f}s; "
+          f"parsing the source took {manifest['parse_seconds']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
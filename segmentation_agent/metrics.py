@@ -0,0 +1,227 @@
+"""
+In-Process Metrics for the Segmentation Agent
+
+Minimal, dependency-free metric types that render in the Prometheus text
+exposition format. Every value lives in the current process; under gunicorn
+each worker keeps and reports its own series.
+
+Classes:
+    Counter: Thread-safe monotonically increasing counter with labels
+    Gauge: Thread-safe value that can go up and down, with labels
+    Histogram: Thread-safe cumulative histogram with fixed bucket bounds and labels
+
+Functions:
+    render_prometheus: Render metrics in the Prometheus text format
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Bucket bounds in seconds for request and stage latencies (0.1ms .. 10s)
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Format {name="value",...}; extra is appended as-is (used for le)"""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Counter with an optional fixed set of label names.
+
+    Attributes:
+        name: Metric name (should end in "_total")
+        help: One-line description rendered as # HELP
+        labelnames: Label names; inc() takes one value per name, in order
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        """Add amount to the series identified by label_values"""
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        """Current value of one series (0 if never incremented)"""
+        with self._lock:
+            return self._values.get(tuple(str(v) for v in label_values), 0.0)
+
+    def render(self) -> List[str]:
+        """Prometheus text lines for this counter"""
+        with self._lock:
+            series = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in series:
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value!r}")
+        return lines
+
+
+class Gauge:
+    """
+    Gauge with an optional fixed set of label names.
+
+    Attributes:
+        name: Metric name
+        help: One-line description rendered as # HELP
+        labelnames: Label names; set() takes one value per name, in order
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values: str) -> None:
+        """Set the series identified by label_values"""
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def replace(self, value: float, *label_values: str) -> None:
+        """Drop every series and set just this one (info-style gauges)"""
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values = {key: float(value)}
+
+    def value(self, *label_values: str) -> float:
+        """Current value of one series (0 if never set)"""
+        with self._lock:
+            return self._values.get(tuple(str(v) for v in label_values), 0.0)
+
+    def render(self) -> List[str]:
+        """Prometheus text lines for this gauge"""
+        with self._lock:
+            series = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in series:
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value!r}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed upper bucket bounds.
+
+    Attributes:
+        name: Metric name (e.g. "segmentation_coalescer_batch_size")
+        help: One-line description rendered as # HELP
+        buckets: Sorted upper bounds; +Inf is implied
+        labelnames: Label names; observe() takes one value per name, in order
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # Per series: [bucket counts..., +Inf count] and the running sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation in the series identified by label_values"""
+        slot = bisect.bisect_left(self.buckets, value)
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Observe the wall-clock seconds spent inside the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def snapshot(self, *label_values: str) -> Dict[str, Any]:
+        """
+        Consistent copy of one series.
+
+        Args:
+            label_values: Values identifying the series (none if unlabelled)
+
+        Returns:
+            Dictionary with cumulative "buckets" [(upper_bound, count), ...]
+            ending with +Inf, plus "count" and "sum"
+        """
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts, total = list(counts), total[0]
+
+        cumulative, running = [], 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+    def render(self) -> List[str]:
+        """Prometheus text lines for this histogram"""
+        with self._lock:
+            keys = sorted(self._series)
+        if not keys and not self.labelnames:
+            # An unlabelled histogram always exports its (empty) series
+            keys = [()]
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key in keys:
+            snap = self.snapshot(*key)
+            for bound, count in snap["buckets"]:
+                le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                labels = _label_text(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {snap['sum']!r}")
+            lines.append(f"{self.name}_count{labels} {snap['count']}")
+        return lines
+
+
+def render_prometheus(metrics: Iterable[Any]) -> str:
+    """
+    Render metrics in the Prometheus text exposition format (version 0.0.4).
+
+    Args:
+        metrics: Objects with a render() method returning text lines
+
+    Returns:
+        Exposition text ending with a newline
+    """
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -3,119 +3,303 @@ Migrate CSV data to PostgreSQL database
 
 Usage:
     python migrate_csv_to_db.py
+    python migrate_csv_to_db.py --chunk-size 100000 --on-conflict update --transaction single
 
 This script:
-1. Reads rfm_table.csv
-2. Creates database tables
-3. Loads all customer RFM data into PostgreSQL
-4. Handles duplicates gracefully
+1. Creates database tables (and adds any missing columns)
+2. Streams rfm_table.csv in chunks, validating and de-duplicating each chunk
+3. Bulk loads every chunk: PostgreSQL COPY into a staging table followed by
+   INSERT ... ON CONFLICT (customer_id) DO UPDATE, or batched executemany
+   upserts on other databases (SQLite)
+4. Loads the enhanced profile columns (name, email, engagement, ...) when the
+   CSV has them
+5. Reports progress and an inserted / updated / skipped / error summary
+
+Existing customers are updated in place; their materialized segment is
+cleared only when recency, frequency or monetary changed.
 """
+import argparse
+import io
 import os
 import sys
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Tuple
+
 import pandas as pd
-from sqlalchemy.exc import IntegrityError
-from database import init_db, get_db, CustomerRFM, db_available
+from sqlalchemy import column, select, table, text
+from database import (
+    init_db, get_db, get_engine, CustomerRFM, is_db_available, PROFILE_COLUMNS, upsert_statement
+)
 
 # Paths
 CSV_PATH = os.getenv("RFM_CSV_PATH", "models/rfm_table.csv")
+CHUNK_SIZE = int(os.getenv("MIGRATE_CHUNK_SIZE", "50000"))
+
+# CSV column -> customer_rfm column
+CSV_TO_DB: Dict[str, str] = {
+    "CustomerID": "customer_id",
+    "Recency": "recency",
+    "Frequency": "frequency",
+    "Monetary": "monetary",
+    **{name: name for name in PROFILE_COLUMNS},
+}
+REQUIRED_COLUMNS = ("customer_id", "recency", "frequency", "monetary")
+DATE_COLUMNS = ("signup_date", "last_purchase_date")
+INTEGER_COLUMNS = ("email_clicks", "campaign_responses", "risk_score")
+FLOAT_COLUMNS = ("email_opens", "average_order_value", "lifetime_value")
+
+STAGING_TABLE = "customer_rfm_stage"
+
+# Customer IDs per existence-check query (stays under SQLite's variable limit)
+EXISTS_BATCH = 500
+
+
+def prepare_chunk(chunk: pd.DataFrame, first_row: int, max_error_reports: int) -> Tuple[pd.DataFrame, int, int]:
+    """
+    Rename, type-convert, validate and de-duplicate one CSV chunk.
+
+    Args:
+        chunk: Raw CSV rows
+        first_row: Row number of the chunk's first row in the CSV (for messages)
+        max_error_reports: How many invalid rows to print
+
+    Returns:
+        Tuple of (frame, errors, duplicates):
+        - frame: Valid rows with customer_rfm column names
+        - errors: Rows dropped because customer ID or RFM values are not numeric
+        - duplicates: Rows dropped because their customer ID repeats within the chunk
+    """
+    frame = chunk[[c for c in chunk.columns if c in CSV_TO_DB]].rename(columns=CSV_TO_DB)
+
+    for name in REQUIRED_COLUMNS:
+        frame[name] = pd.to_numeric(frame[name], errors="coerce")
+    invalid = frame[list(REQUIRED_COLUMNS)].isna().any(axis=1)
+    for idx in list(frame.index[invalid])[:max_error_reports]:
+        print(f"⚠️ Error at row {first_row + idx - chunk.index[0]}: non-numeric CustomerID/RFM value")
+    frame = frame[~invalid]
+
+    before = len(frame)
+    frame = frame.drop_duplicates("customer_id", keep="first")
+    duplicates = before - len(frame)
+
+    for name in DATE_COLUMNS:
+        if name in frame:
+            frame[name] = pd.to_datetime(frame[name], errors="coerce").dt.date
+    for name in INTEGER_COLUMNS:
+        if name in frame:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce").round().astype("Int64")
+    for name in FLOAT_COLUMNS:
+        if name in frame:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce")
+    if "is_churned" in frame:
+        frame["is_churned"] = frame["is_churned"].map(
+            lambda v: v if isinstance(v, bool) else {"true": True, "false": False}.get(str(v).lower())
+        )
+
+    return frame, int(invalid.sum()), duplicates
+
+
+def count_existing(conn, customer_ids: List[float]) -> int:
+    """Count how many of the given customer IDs are already in customer_rfm"""
+    ids_column = CustomerRFM.__table__.c.customer_id
+    existing = 0
+    for start in range(0, len(customer_ids), EXISTS_BATCH):
+        batch = customer_ids[start:start + EXISTS_BATCH]
+        existing += len(conn.execute(select(ids_column).where(ids_column.in_(batch))).all())
+    return existing
+
+
+def load_chunk_executemany(conn, frame: pd.DataFrame, on_conflict: str) -> int:
+    """
+    Upsert a chunk with one executemany call.
+
+    Returns:
+        Number of rows in the chunk that already existed
+    """
+    columns = tuple(frame.columns)
+    existing = count_existing(conn, frame["customer_id"].tolist())
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    conn.execute(upsert_statement(conn.dialect.name, columns, on_conflict), records)
+    return existing
+
+
+def load_chunk_copy(conn, frame: pd.DataFrame, on_conflict: str) -> int:
+    """
+    Upsert a chunk through PostgreSQL COPY into a temporary staging table.
+
+    Returns:
+        Number of rows in the chunk that already existed
+    """
+    columns = tuple(frame.columns)
+    column_list = ", ".join(columns)
 
+    conn.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} AS "
+        f"SELECT {column_list} FROM {CustomerRFM.__tablename__} WITH NO DATA"
+    ))
+    conn.execute(text(f"TRUNCATE {STAGING_TABLE}"))
 
-def migrate_csv_to_database():
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep="")
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {STAGING_TABLE} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    existing = conn.execute(text(
+        f"SELECT count(*) FROM {STAGING_TABLE} s "
+        f"JOIN {CustomerRFM.__tablename__} c ON c.customer_id = s.customer_id"
+    )).scalar()
+
+    stage = table(STAGING_TABLE, *(column(name) for name in columns))
+    conn.execute(upsert_statement("postgresql", columns, on_conflict, source=select(stage)))
+    return int(existing)
+
+
+def migrate_csv_to_database(
+    csv_path: str = CSV_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    method: str = "auto",
+    on_conflict: str = "update",
+    transaction: str = "chunk"
+):
     """
     Load CSV data into PostgreSQL database
+
+    Args:
+        csv_path: RFM table CSV (basic or enhanced)
+        chunk_size: Rows read, validated and loaded per chunk
+        method: "copy" (PostgreSQL only), "executemany", or "auto"
+        on_conflict: "update" existing customers or "skip" them
+        transaction: "chunk" commits after every chunk; "single" loads
+                     everything in one transaction (all or nothing)
+
+    Returns:
+        Tuple of (inserted, skipped, errors); updated rows count as neither
     """
-    if not db_available:
+    if not is_db_available():
         print("❌ Database not available. Check your DATABASE_URL in .env")
         sys.exit(1)
-    
+
     print("🚀 Starting CSV to PostgreSQL migration...")
-    
+
     # Step 1: Create tables
     print("📋 Creating database tables...")
     init_db()
-    
-    # Step 2: Read CSV
-    print(f"📂 Reading CSV file: {CSV_PATH}")
-    if not os.path.exists(CSV_PATH):
-        print(f"❌ CSV file not found: {CSV_PATH}")
+
+    # Step 2: Check the CSV header
+    print(f"📂 Reading CSV file: {csv_path}")
+    if not os.path.exists(csv_path):
+        print(f"❌ CSV file not found: {csv_path}")
         sys.exit(1)
-    
-    df = pd.read_csv(CSV_PATH)
-    print(f"✅ Loaded {len(df)} customer records from CSV")
-    
-    # Step 3: Validate columns
+
+    header = pd.read_csv(csv_path, nrows=0).columns
     required_cols = {'CustomerID', 'Recency', 'Frequency', 'Monetary'}
-    if not required_cols.issubset(df.columns):
+    if not required_cols.issubset(header):
         print(f"❌ CSV missing required columns. Expected: {required_cols}")
-        print(f"   Found: {set(df.columns)}")
+        print(f"   Found: {set(header)}")
         sys.exit(1)
-    
-    # Step 4: Load data into database
-    print("💾 Inserting data into PostgreSQL...")
-    db = get_db()
-    
-    if not db:
-        print("❌ Failed to get database session")
+
+    profile_cols = [c for c in header if c in PROFILE_COLUMNS]
+    if profile_cols:
+        print(f"✅ Enhanced CSV: loading {len(profile_cols)} profile columns")
+
+    engine = get_engine()
+    if method == "auto":
+        method = "copy" if engine.dialect.name == "postgresql" else "executemany"
+    if method == "copy" and engine.dialect.name != "postgresql":
+        print(f"❌ COPY needs PostgreSQL (connected to {engine.dialect.name})")
         sys.exit(1)
-    
+    load_chunk = load_chunk_copy if method == "copy" else load_chunk_executemany
+
+    # Step 3: Load data into database, chunk by chunk
+    print(f"💾 Loading data ({method}, {chunk_size} rows per chunk, "
+          f"on conflict: {on_conflict}, transaction: {transaction})...")
+
+    total = 0
     inserted = 0
+    updated = 0
     skipped = 0
     errors = 0
-    
-    for idx, row in df.iterrows():
-        try:
-            customer = CustomerRFM(
-                customer_id=float(row['CustomerID']),
-                recency=float(row['Recency']),
-                frequency=float(row['Frequency']),
-                monetary=float(row['Monetary'])
-            )
-            db.add(customer)
-            db.commit()
-            inserted += 1
-            
-            if (idx + 1) % 500 == 0:
-                print(f"   Progress: {idx + 1}/{len(df)} records processed...")
-                
-        except IntegrityError:
-            # Duplicate customer_id
-            db.rollback()
-            skipped += 1
-        except Exception as e:
-            db.rollback()
-            errors += 1
-            if errors < 5:  # Only print first 5 errors
-                print(f"⚠️ Error at row {idx}: {e}")
-    
-    db.close()
-    
-    # Step 5: Summary
+    start = time.perf_counter()
+
+    # One outer transaction in "single" mode; otherwise each chunk commits on its own
+    with (engine.begin() if transaction == "single" else nullcontext()) as single_conn:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            first_row = total
+            total += len(chunk)
+            frame, bad_rows, duplicates = prepare_chunk(chunk, first_row, max(0, 5 - errors))
+            errors += bad_rows
+            skipped += duplicates
+            if frame.empty:
+                continue
+
+            if single_conn is not None:
+                existing = load_chunk(single_conn, frame, on_conflict)
+            else:
+                try:
+                    with engine.begin() as conn:
+                        existing = load_chunk(conn, frame, on_conflict)
+                except Exception as e:
+                    # The chunk was rolled back as a unit
+                    errors += len(frame)
+                    print(f"⚠️ Error loading rows {first_row}-{total - 1}: {e}")
+                    continue
+
+            inserted += len(frame) - existing
+            if on_conflict == "update":
+                updated += existing
+            else:
+                skipped += existing
+
+            rate = total / (time.perf_counter() - start)
+            print(f"   Progress: {total} records processed ({rate:,.0f} rows/s)...")
+
+    elapsed = time.perf_counter() - start
+
+    # Step 4: Summary
     print("\n" + "="*60)
     print("✅ MIGRATION COMPLETE")
     print("="*60)
-    print(f"📊 Total records in CSV: {len(df)}")
+    print(f"📊 Total records in CSV: {total}")
     print(f"✅ Successfully inserted: {inserted}")
+    print(f"🔄 Updated (existing customers): {updated}")
     print(f"⏭️ Skipped (duplicates): {skipped}")
     print(f"❌ Errors: {errors}")
+    print(f"⏱️ Time: {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
     print("="*60)
-    
-    # Step 6: Verify
+
+    # Step 5: Verify
     print("\n🔍 Verifying database...")
     db = get_db()
     count = db.query(CustomerRFM).count()
     db.close()
     print(f"✅ Database now contains {count} customer records")
-    
+
     return inserted, skipped, errors
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load rfm_table.csv into customer_rfm")
+    parser.add_argument("--csv", default=CSV_PATH, help="CSV file to load")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--method", choices=("auto", "copy", "executemany"), default="auto",
+                        help="COPY (PostgreSQL) or executemany upserts")
+    parser.add_argument("--on-conflict", choices=("update", "skip"), default="update",
+                        help="What to do with customers that already exist")
+    parser.add_argument("--transaction", choices=("chunk", "single"), default="chunk",
+                        help="Commit per chunk, or load everything in one transaction")
+    args = parser.parse_args()
+
     print("="*60)
     print("CSV to PostgreSQL Migration Tool")
     print("="*60)
-    
+
     try:
-        migrate_csv_to_database()
+        migrate_csv_to_database(args.csv, args.chunk_size, args.method, args.on_conflict, args.transaction)
         print("\n✅ Migration successful! You can now deploy the API with database support.")
     except KeyboardInterrupt:
         print("\n⚠️ Migration cancelled by user")
@@ -0,0 +1,224 @@
+"""
+Versioned Model Registry for the Segmentation API
+
+Every exported serving artifact is kept under its own version directory and
+a CURRENT file names the version the API should serve:
+
+    models/registry/
+    ├── CURRENT                      # e.g. "3f9a0c2b71de"
+    ├── 3f9a0c2b71de/segment_model.npz
+    └── 8b41e7d09a55/segment_model.npz
+
+Versions are the scorer's content fingerprint (scoring.model_version), so
+re-publishing an identical model is a no-op. Files and the pointer are
+written to temporary names and renamed into place, so a reader never sees a
+half-written artifact, and rolling back is just pointing CURRENT at an older
+directory.
+
+Classes:
+    ModelState: Immutable scorer + profiles + version, swapped as one reference
+
+Functions:
+    validate_model: Sanity checks a loaded artifact must pass before serving
+    load_model_state: Load and validate one .npz artifact
+    publish: Copy an artifact into the registry (and optionally activate it)
+    activate: Point CURRENT at a published version
+    current_version / artifact_path / list_versions: Registry lookups
+
+Usage:
+    python model_registry.py publish models/segment_model.npz
+    python model_registry.py activate 8b41e7d09a55      # roll back
+    python model_registry.py list
+
+Environment Variables:
+    MODEL_REGISTRY_DIR: Registry root (default models/registry)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from scoring import SegmentScorer, load_serving_artifact
+
+MODEL_REGISTRY_DIR: str = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+
+CURRENT_NAME = "CURRENT"
+ARTIFACT_NAME = "segment_model.npz"
+
+
+class ModelState(NamedTuple):
+    """
+    Everything a request needs from the model, replaced as a single object.
+
+    Attributes:
+        scorer: Serving kernel
+        profiles: Segment profiles keyed by cluster ID (as strings)
+        artifact_format: "npz" or "pickle"
+        version: Model fingerprint (scorer.version)
+        source: File the model was loaded from
+        loaded_at: Unix time the model was loaded
+    """
+    scorer: SegmentScorer
+    profiles: Dict[str, Any]
+    artifact_format: str
+    version: str
+    source: str
+    loaded_at: float
+
+
+def validate_model(scorer: SegmentScorer, profiles: Dict[str, Any]) -> None:
+    """
+    Check that a model is safe to serve.
+
+    Args:
+        scorer: Loaded scorer
+        profiles: Loaded segment profiles
+
+    Raises:
+        ValueError: If the parameters are malformed, a segment has no
+                    profile or name, or scoring a probe batch fails
+    """
+    if scorer.centers.ndim != 2 or scorer.centers.shape[1] != 3 or scorer.n_clusters < 1:
+        raise ValueError(f"Centroids have shape {scorer.centers.shape}, expected (K, 3)")
+    if not (np.isfinite(scorer.centers).all() and np.isfinite(scorer.mean).all()):
+        raise ValueError("Model parameters contain NaN or infinity")
+    if not (np.isfinite(scorer.scale).all() and (scorer.scale > 0).all()):
+        raise ValueError("Scaler has a zero or non-finite scale")
+
+    missing = [cid for cid in range(scorer.n_clusters) if "segment_name" not in profiles.get(str(cid), {})]
+    if missing:
+        raise ValueError(f"No profile or segment_name for segments {missing}")
+
+    # Score the centroids mapped back to raw RFM: each must land in its own segment
+    probe = scorer.centers * scorer.scale + scorer.mean
+    labels, distances = scorer.score(probe)
+    if not (np.isfinite(distances).all() and np.array_equal(labels, np.arange(scorer.n_clusters))):
+        raise ValueError("Probe scoring failed (duplicate or degenerate centroids)")
+
+
+def load_model_state(path: str) -> ModelState:
+    """
+    Load and validate a serving artifact.
+
+    Args:
+        path: .npz serving artifact
+
+    Returns:
+        Validated ModelState
+
+    Raises:
+        FileNotFoundError: If the artifact does not exist
+        ValueError: If the artifact fails validation
+    """
+    scorer, profiles = load_serving_artifact(path)
+    validate_model(scorer, profiles)
+    return ModelState(scorer, profiles, "npz", scorer.version, path, time.time())
+
+
+def artifact_path(version: str, registry_dir: str = MODEL_REGISTRY_DIR) -> str:
+    """Artifact file of one published version"""
+    return os.path.join(registry_dir, version, ARTIFACT_NAME)
+
+
+def current_version(registry_dir: str = MODEL_REGISTRY_DIR) -> Optional[str]:
+    """Version CURRENT points at, or None if nothing was activated"""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(version: str, registry_dir: str = MODEL_REGISTRY_DIR) -> None:
+    """
+    Point CURRENT at a published version.
+
+    Raises:
+        FileNotFoundError: If the version was never published
+    """
+    if not os.path.exists(artifact_path(version, registry_dir)):
+        raise FileNotFoundError(f"Model version {version} is not in {registry_dir}")
+    tmp = os.path.join(registry_dir, CURRENT_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(registry_dir, CURRENT_NAME))
+
+
+def publish(path: str, registry_dir: str = MODEL_REGISTRY_DIR, make_current: bool = True) -> str:
+    """
+    Copy a serving artifact into the registry under its version.
+
+    Args:
+        path: .npz serving artifact
+        registry_dir: Registry root
+        make_current: Also point CURRENT at it
+
+    Returns:
+        The artifact's version
+
+    Raises:
+        ValueError: If the artifact fails validation
+    """
+    version = load_model_state(path).version
+    target = artifact_path(version, registry_dir)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+    if make_current:
+        activate(version, registry_dir)
+    return version
+
+
+def list_versions(registry_dir: str = MODEL_REGISTRY_DIR) -> List[Dict[str, Any]]:
+    """
+    Published versions, newest first.
+
+    Returns:
+        List of {"version", "published_at", "current"} dictionaries
+    """
+    if not os.path.isdir(registry_dir):
+        return []
+    current = current_version(registry_dir)
+    versions = []
+    for name in os.listdir(registry_dir):
+        path = artifact_path(name, registry_dir)
+        if os.path.exists(path):
+            versions.append({
+                "version": name,
+                "published_at": os.path.getmtime(path),
+                "current": name == current
+            })
+    return sorted(versions, key=lambda v: v["published_at"], reverse=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry")
+    parser.add_argument("--registry-dir", default=MODEL_REGISTRY_DIR, help="Registry root")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_cmd = commands.add_parser("publish", help="Add an artifact and make it current")
+    publish_cmd.add_argument("artifact", help=".npz serving artifact")
+    publish_cmd.add_argument("--no-activate", action="store_true", help="Publish without switching CURRENT")
+    activate_cmd = commands.add_parser("activate", help="Serve a published version")
+    activate_cmd.add_argument("version")
+    commands.add_parser("list", help="Show published versions")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        version = publish(args.artifact, args.registry_dir, make_current=not args.no_activate)
+        print(f"✅ Published {version}" + ("" if args.no_activate else " (current)"))
+    elif args.command == "activate":
+        activate(args.version, args.registry_dir)
+        print(f"✅ {args.version} is now current")
+    else:
+        print(json.dumps(list_versions(args.registry_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Model Selection: Sweep the Number of Customer Segments
+
+Fits K-Means for every candidate K and seed across a process pool, scores
+each fit, and reports which K separates customers best:
+
+- Inertia: within-cluster sum of squares (always falls as K grows)
+- Davies-Bouldin: average similarity of each cluster to its closest
+  neighbour (lower is better), computed on the whole fit sample
+- Silhouette: computed on a fixed subsample of SILHOUETTE_SAMPLE customers,
+  since the full score is O(n²)
+
+Each (K, seed) fit runs with n_init=1 in its own worker; the best-inertia
+seed per K is that K's model, the same rule KMeans applies across n_init.
+Finished candidates are cached per dataset, so an interrupted or extended
+sweep (more K values, more seeds) only fits what is missing.
+
+Candidates are fit on a uniform sample of at most SWEEP_FIT_SAMPLE
+customers; the scaler and the segment profiles use every customer.
+
+By default the sweep only reports. With --ship (recommended K) or --choose K
+the candidate is profiled and published to the model registry without
+being activated; the API keeps serving CURRENT until someone runs
+"python model_registry.py activate <version>".
+
+Usage:
+    python model_selection.py                         # K = 2..10, 4 seeds each, report only
+    python model_selection.py --k 3 4 5 6 8 --seeds 8 --workers 8
+    python model_selection.py --rfm-source database --criterion davies_bouldin
+    python model_selection.py --ship                  # Publish the recommended K
+    python model_selection.py --choose 6              # Keep the sweep, publish K=6
+
+Environment Variables:
+    SWEEP_CACHE_DIR: Candidate cache root (default models/sweep)
+    SWEEP_WORKERS: Worker processes (default: CPU count)
+    SWEEP_FIT_SAMPLE: Most customers a candidate is fit on (default 500000)
+    SILHOUETTE_SAMPLE: Customers the silhouette is computed on (default 10000)
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import davies_bouldin_score, silhouette_score
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from model_registry import MODEL_REGISTRY_DIR, publish
+from rfm_streaming import iter_rfm_features
+from scoring import SegmentScorer, save_serving_artifact
+from train_segmentation import (
+    CHUNK_ROWS,
+    PROFILE_SAMPLE_SIZE,
+    RANDOM_STATE,
+    RFM_PATH,
+    SegmentProfileAccumulator,
+    UniformSample,
+)
+
+SWEEP_CACHE_DIR: str = os.getenv("SWEEP_CACHE_DIR", "models/sweep")
+SWEEP_WORKERS: int = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+SWEEP_FIT_SAMPLE: int = int(os.getenv("SWEEP_FIT_SAMPLE", "500000"))
+SILHOUETTE_SAMPLE: int = int(os.getenv("SILHOUETTE_SAMPLE", "10000"))
+
+DEFAULT_K = tuple(range(2, 11))
+DEFAULT_SEEDS = 4
+REPORT_NAME = "report.json"
+FEATURES_NAME = "features.npy"
+
+# Bump when candidate metrics change, to invalidate cached candidates
+CACHE_FORMAT = 1
+
+# Higher is better for silhouette, lower for Davies-Bouldin
+CRITERIA = {"silhouette": max, "davies_bouldin": min}
+
+# Per-worker state, set by _init_worker
+_features: Optional[np.ndarray] = None
+_silhouette_idx: Optional[np.ndarray] = None
+
+
+def load_features(source: str, fit_sample: int, chunk_rows: int = CHUNK_ROWS) -> Tuple[StandardScaler, np.ndarray, int]:
+    """
+    Fit the scaler on every customer and sample the rows candidates are fit on.
+
+    Args:
+        source: .csv or .parquet RFM table, or "database" for customer_rfm
+        fit_sample: Most customers to keep for fitting
+        chunk_rows: Customers read per chunk
+
+    Returns:
+        Tuple of (scaler, scaled sample, total customers)
+    """
+    scaler = StandardScaler()
+    sample = UniformSample(fit_sample, RANDOM_STATE)
+    for chunk in iter_rfm_features(source, chunk_rows):
+        scaler.partial_fit(chunk)
+        sample.add(chunk)
+    customers = int(getattr(scaler, "n_samples_seen_", 0))
+    if customers == 0:
+        raise ValueError(f"{source} has no customers")
+    return scaler, scaler.transform(sample.rows_of(0)), customers
+
+
+def dataset_directory(features: np.ndarray, cache_dir: str, silhouette_sample: int) -> str:
+    """Cache directory for one scaled sample (and silhouette sample size)"""
+    digest = hashlib.sha256(np.ascontiguousarray(features).tobytes())
+    digest.update(f"{features.shape}:{silhouette_sample}:{CACHE_FORMAT}".encode())
+    return os.path.join(cache_dir, digest.hexdigest()[:16])
+
+
+def _candidate_name(k: int, seed: int) -> str:
+    return f"k{k:02d}_seed{seed}"
+
+
+def _write_json(path: str, payload: Any) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _init_worker(directory: str, silhouette_sample: int) -> None:
+    global _features, _silhouette_idx
+    # One BLAS/OpenMP thread per process; the pool provides the parallelism
+    threadpool_limits(1)
+    # Memory-mapped, so workers share the page cache instead of copying
+    _features = np.load(os.path.join(directory, FEATURES_NAME), mmap_mode="r")
+    rng = np.random.default_rng(RANDOM_STATE)
+    n = len(_features)
+    _silhouette_idx = np.sort(rng.choice(n, min(silhouette_sample, n), replace=False))
+
+
+def fit_candidate(directory: str, k: int, seed: int) -> Dict[str, Any]:
+    """
+    Fit and score one (K, seed) candidate, caching the model and metrics.
+
+    Args:
+        directory: Dataset cache directory holding features.npy
+        k: Number of clusters
+        seed: K-Means random_state
+
+    Returns:
+        Candidate metrics
+    """
+    features = np.asarray(_features)
+    start = time.perf_counter()
+    kmeans = KMeans(n_clusters=k, random_state=seed, n_init=1).fit(features)
+    fit_seconds = time.perf_counter() - start
+
+    labels = kmeans.labels_
+    sizes = np.bincount(labels, minlength=k)
+    sampled_labels = labels[_silhouette_idx]
+    result = {
+        "k": k,
+        "seed": seed,
+        "inertia": float(kmeans.inertia_),
+        "davies_bouldin": float(davies_bouldin_score(features, labels)),
+        # Undefined when the subsample lands in a single cluster
+        "silhouette": (
+            float(silhouette_score(features[_silhouette_idx], sampled_labels))
+            if len(np.unique(sampled_labels)) > 1 else None
+        ),
+        "smallest_segment_share": float(sizes.min() / len(labels)),
+        "iterations": int(kmeans.n_iter_),
+        "fit_seconds": round(fit_seconds, 3),
+        "score_seconds": round(time.perf_counter() - start - fit_seconds, 3),
+    }
+
+    # Model first: a candidate counts as cached only once its metrics exist
+    name = _candidate_name(k, seed)
+    tmp = os.path.join(directory, name + ".joblib.tmp")
+    joblib.dump(kmeans, tmp)
+    os.replace(tmp, os.path.join(directory, name + ".joblib"))
+    _write_json(os.path.join(directory, name + ".json"), result)
+    return result
+
+
+def _read_candidate(directory: str, k: int, seed: int) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, _candidate_name(k, seed) + ".json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_sweep(
+    features: np.ndarray,
+    ks: List[int],
+    seeds: List[int],
+    directory: str,
+    workers: int = SWEEP_WORKERS,
+    silhouette_sample: int = SILHOUETTE_SAMPLE
+) -> List[Dict[str, Any]]:
+    """
+    Fit every (K, seed) candidate not already cached, in parallel.
+
+    Args:
+        features: Scaled fit sample
+        ks: Candidate cluster counts
+        seeds: K-Means seeds tried for every K
+        directory: Dataset cache directory
+        workers: Worker processes
+        silhouette_sample: Customers the silhouette is computed on
+
+    Returns:
+        Metrics of every candidate, cached or new
+    """
+    os.makedirs(directory, exist_ok=True)
+    features_path = os.path.join(directory, FEATURES_NAME)
+    if not os.path.exists(features_path):
+        tmp = features_path + ".tmp.npy"
+        np.save(tmp, features)
+        os.replace(tmp, features_path)
+
+    results = []
+    todo = []
+    for k in ks:
+        for seed in seeds:
+            cached = _read_candidate(directory, k, seed)
+            if cached is not None:
+                results.append(cached)
+            else:
+                todo.append((directory, k, seed))
+    print(f"🧮 {len(results)} candidates cached, {len(todo)} to fit on {workers} workers")
+    if not todo:
+        return results
+
+    # Largest K first: those fits take longest, so they should not start last
+    todo.sort(key=lambda task: -task[1])
+    start = time.perf_counter()
+    if workers > 1:
+        with multiprocessing.Pool(workers, _init_worker, (directory, silhouette_sample)) as pool:
+            for i, result in enumerate(pool.imap_unordered(_fit_task, todo), 1):
+                results.append(result)
+                _print_progress(i, len(todo), result, start)
+    else:
+        _init_worker(directory, silhouette_sample)
+        for i, task in enumerate(todo, 1):
+            result = fit_candidate(*task)
+            results.append(result)
+            _print_progress(i, len(todo), result, start)
+    return results
+
+
+def _fit_task(task: Tuple[str, int, int]) -> Dict[str, Any]:
+    return fit_candidate(*task)
+
+
+def _print_progress(done: int, total: int, result: Dict[str, Any], start: float) -> None:
+    print(f"   [{done}/{total}] K={result['k']} seed={result['seed']}: "
+          f"inertia {result['inertia']:,.0f} ({time.perf_counter() - start:.1f}s elapsed)")
+
+
+def summarize(results: List[Dict[str, Any]], ks: List[int], seeds: List[int], criterion: str) -> Dict[str, Any]:
+    """
+    Pick the best seed per K and the best K by criterion.
+
+    Args:
+        results: Candidate metrics from run_sweep
+        ks: Candidate cluster counts in the report
+        seeds: Seeds in the report
+        criterion: "silhouette" or "davies_bouldin"
+
+    Returns:
+        Report with one row per K and the recommended K
+    """
+    rows = []
+    for k in ks:
+        candidates = [r for r in results if r["k"] == k and r["seed"] in seeds]
+        best = min(candidates, key=lambda r: r["inertia"])
+        inertias = np.array([r["inertia"] for r in candidates])
+        rows.append({
+            **best,
+            # Spread of inertia across seeds: large values mean unstable solutions
+            "inertia_seed_spread": float((inertias.max() - inertias.min()) / inertias.min()) if inertias.min() else 0.0,
+            "seeds": len(candidates),
+        })
+
+    scored = [row for row in rows if row[criterion] is not None]
+    recommended = CRITERIA[criterion](scored, key=lambda row: row[criterion])["k"] if scored else None
+    return {"criterion": criterion, "recommended_k": recommended, "candidates": rows}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the per-K comparison table"""
+    print("\n" + "=" * 86)
+    print(f"{'K':>3} {'seed':>6} {'inertia':>14} {'seed spread':>12} {'Davies-Bouldin':>15} "
+          f"{'silhouette':>11} {'smallest':>9} {'fit s':>7}")
+    print("-" * 86)
+    for row in report["candidates"]:
+        silhouette = f"{row['silhouette']:.4f}" if row["silhouette"] is not None else "n/a"
+        marker = " ◀" if row["k"] == report["recommended_k"] else ""
+        print(f"{row['k']:>3} {row['seed']:>6} {row['inertia']:>14,.1f} {row['inertia_seed_spread']:>11.2%} "
+              f"{row['davies_bouldin']:>15.4f} {silhouette:>11} {row['smallest_segment_share']:>8.1%} "
+              f"{row['fit_seconds']:>7.2f}{marker}")
+    print("=" * 86)
+    print(f"Recommended K by {report['criterion']}: {report['recommended_k']}")
+
+
+def write_chosen_artifacts(
+    source: str,
+    directory: str,
+    scaler: StandardScaler,
+    k: int,
+    seed: int,
+    chunk_rows: int = CHUNK_ROWS
+) -> str:
+    """
+    Ship a sweep candidate: profile every customer and publish it to the
+    model registry without making it CURRENT.
+
+    The serving artifact, pickles and materialized assignments of the model
+    being served are left alone; promoting the candidate is a separate
+    "model_registry.py activate" step.
+
+    Args:
+        source: RFM table the sweep ran on
+        directory: Dataset cache directory
+        scaler: Scaler fit on every customer
+        k: Chosen number of clusters
+        seed: Best seed for that K
+        chunk_rows: Customers read per chunk
+
+    Returns:
+        The published (inactive) model version
+    """
+    kmeans = joblib.load(os.path.join(directory, _candidate_name(k, seed) + ".joblib"))
+    accumulator = SegmentProfileAccumulator(k, PROFILE_SAMPLE_SIZE, RANDOM_STATE)
+    for chunk in iter_rfm_features(source, chunk_rows):
+        accumulator.add(chunk, kmeans.predict(scaler.transform(chunk)))
+
+    profiles = {str(cid): stats for cid, stats in accumulator.profiles().items()}
+    path = os.path.join(directory, _candidate_name(k, seed) + ".npz")
+    save_serving_artifact(path, SegmentScorer.from_sklearn(kmeans, scaler, profiles), profiles)
+    return publish(path, MODEL_REGISTRY_DIR, make_current=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep the number of customer segments")
+    parser.add_argument("--rfm-source", default=RFM_PATH, help='RFM table: .csv, .parquet, or "database"')
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_K), help="Candidate cluster counts")
+    parser.add_argument("--seeds", type=int, default=DEFAULT_SEEDS, help="Seeds per K")
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS, help="Worker processes")
+    parser.add_argument("--fit-sample", type=int, default=SWEEP_FIT_SAMPLE, help="Most customers to fit on")
+    parser.add_argument("--silhouette-sample", type=int, default=SILHOUETTE_SAMPLE,
+                        help="Customers the silhouette is computed on")
+    parser.add_argument("--criterion", choices=tuple(CRITERIA), default="silhouette", help="How to pick K")
+    ship = parser.add_mutually_exclusive_group()
+    ship.add_argument("--ship", action="store_true", help="Publish the recommended K (not activated)")
+    ship.add_argument("--choose", type=int, help="Publish this K instead of the recommended one (not activated)")
+    parser.add_argument("--cache-dir", default=SWEEP_CACHE_DIR, help="Candidate cache root")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Customers read per chunk")
+    args = parser.parse_args()
+
+    ks = sorted(set(args.k))
+    if ks[0] < 2:
+        parser.error("--k values must be at least 2")
+    if args.choose is not None and args.choose not in ks:
+        parser.error(f"--choose {args.choose} is not among --k {ks}")
+    seeds = [RANDOM_STATE + i for i in range(args.seeds)]
+
+    start = time.perf_counter()
+    print(f"📂 Reading {args.rfm_source}...")
+    scaler, features, customers = load_features(args.rfm_source, args.fit_sample, args.chunk_rows)
+    if len(features) <= ks[-1]:
+        parser.error(f"{args.rfm_source} has {len(features)} customers; too few for K={ks[-1]}")
+    print(f"✅ {customers:,} customers, fitting on {len(features):,}")
+
+    directory = dataset_directory(features, args.cache_dir, args.silhouette_sample)
+    results = run_sweep(features, ks, seeds, directory, args.workers, args.silhouette_sample)
+
+    report = summarize(results, ks, seeds, args.criterion)
+    report.update(
+        source=args.rfm_source,
+        customers=customers,
+        fit_sample=len(features),
+        silhouette_sample=min(args.silhouette_sample, len(features)),
+        directory=directory,
+        chosen_k=args.choose or report["recommended_k"],
+    )
+    print_report(report)
+    _write_json(os.path.join(directory, REPORT_NAME), report)
+    print(f"📝 Report written to {os.path.join(directory, REPORT_NAME)}")
+
+    chosen = next((row for row in report["candidates"] if row["k"] == report["chosen_k"]), None)
+    if not (args.ship or args.choose) or chosen is None:
+        print("ℹ️ Report only; pass --ship or --choose K to publish a candidate")
+        print(f"⏱️ Sweep took {time.perf_counter() - start:.1f}s")
+        return
+
+    print(f"💾 Publishing K={chosen['k']} (seed {chosen['seed']}) to {MODEL_REGISTRY_DIR}...")
+    version = write_chosen_artifacts(args.rfm_source, directory, scaler, chosen["k"], chosen["seed"], args.chunk_rows)
+    print(f"✅ Published model version {version} (not active)")
+    print(f"   Serve it with: python model_registry.py activate {version}")
+    print(f"⏱️ Sweep took {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Out-of-Core RFM Builder
+
+Builds the same RFM table as utils.build_rfm_table from transaction logs that
+do not fit in memory. Transactions are read in chunks from CSV or Parquet;
+each chunk is cleaned and reduced to per-customer partial aggregates:
+
+- last purchase time (max)
+- monetary sum
+- the set of (customer, invoice) pairs, as 64-bit invoice hashes
+
+Partials are split into shards by customer ID. A process pool reduces chunks
+in parallel; each shard's partials are compacted as they arrive and merged
+into final rows at the end, one shard per task. Memory therefore grows with
+the number of customers and invoices (16 bytes per invoice), not with the
+number of transaction lines or the size of the file.
+
+Results match build_rfm_table: same customers, Recency and Frequency, and
+Monetary up to floating-point summation order.
+
+Usage:
+    python rfm_streaming.py transactions.csv --output models/rfm_table.csv
+    python rfm_streaming.py logs/2024.parquet --workers 8 --chunk-rows 2000000
+
+Environment Variables:
+    RFM_CHUNK_ROWS: Transaction lines per chunk (default 1000000)
+    RFM_WORKERS: Worker processes (default: one per CPU core)
+    RFM_SHARDS: Customer ID shards (default 16)
+
+Parquet input needs pyarrow.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import clean_data
+
+RFM_CHUNK_ROWS: int = int(os.getenv("RFM_CHUNK_ROWS", "1000000"))
+RFM_WORKERS: int = int(os.getenv("RFM_WORKERS", str(os.cpu_count() or 1)))
+RFM_SHARDS: int = int(os.getenv("RFM_SHARDS", "16"))
+
+TRANSACTION_COLUMNS = ("InvoiceNo", "CustomerID", "InvoiceDate", "Quantity", "UnitPrice")
+RFM_FEATURES = ("Recency", "Frequency", "Monetary")
+
+# Compact a shard once this many chunk partials are buffered for it
+COMPACT_EVERY = 8
+
+
+class Partial(NamedTuple):
+    """Partial aggregates for the customers of one shard"""
+    # Indexed by CustomerID: last_purchase (ns since epoch), monetary
+    customers: pd.DataFrame
+    # Distinct (CustomerID, invoice hash) pairs
+    invoices: pd.DataFrame
+
+
+def iter_transaction_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Read the transaction columns of a CSV or Parquet file in chunks.
+
+    Args:
+        path: .csv or .parquet file with TRANSACTION_COLUMNS
+        chunk_rows: Lines per chunk
+
+    Yields:
+        DataFrames of at most chunk_rows lines
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet input needs pyarrow: pip install pyarrow")
+
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=list(TRANSACTION_COLUMNS)):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            path,
+            usecols=list(TRANSACTION_COLUMNS),
+            dtype={"InvoiceNo": str},
+            chunksize=chunk_rows
+        )
+
+
+def iter_rfm_features(source: str, chunk_rows: int = RFM_CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """
+    Stream Recency/Frequency/Monetary from an RFM table in chunks.
+
+    Args:
+        source: .csv or .parquet RFM table, or "database" for customer_rfm
+        chunk_rows: Customers per chunk
+
+    Yields:
+        (N, 3) float64 matrices of raw Recency, Frequency, Monetary
+
+    Raises:
+        RuntimeError: If the database (or pyarrow for Parquet) is unavailable
+    """
+    if source == "database":
+        from database import CustomerRFM, get_db, iter_rfm_chunks
+
+        db = get_db()
+        if db is None:
+            raise RuntimeError("Database not available")
+        try:
+            columns = (CustomerRFM.recency, CustomerRFM.frequency, CustomerRFM.monetary)
+            for rows in iter_rfm_chunks(db, columns, chunk_rows):
+                yield np.array(rows, dtype=np.float64)[:, 1:]
+        finally:
+            db.close()
+    elif source.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet input needs pyarrow: pip install pyarrow")
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows, columns=list(RFM_FEATURES)):
+            yield np.column_stack([
+                batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+                for name in RFM_FEATURES
+            ])
+    else:
+        for chunk in pd.read_csv(source, usecols=list(RFM_FEATURES), chunksize=chunk_rows):
+            yield chunk[list(RFM_FEATURES)].to_numpy(dtype=np.float64)
+
+
+def shard_of(customer_ids: np.ndarray, n_shards: int) -> np.ndarray:
+    """Shard number of each customer ID"""
+    return customer_ids.astype(np.int64) % n_shards
+
+
+def chunk_partials(chunk: pd.DataFrame, n_shards: int, date_format: Optional[str] = None) -> List[Partial]:
+    """
+    Clean one chunk and reduce it to partial aggregates per shard.
+
+    Args:
+        chunk: Raw transaction lines
+        n_shards: Number of customer ID shards
+        date_format: strftime format of InvoiceDate (None to infer)
+
+    Returns:
+        List of n_shards partials
+    """
+    df = clean_data(chunk)
+    customer_ids = df["CustomerID"].to_numpy(dtype=np.float64)
+
+    lines = pd.DataFrame({
+        "CustomerID": customer_ids,
+        "last_purchase": pd.to_datetime(df["InvoiceDate"], format=date_format).to_numpy("datetime64[ns]").view(np.int64),
+        "monetary": df["Quantity"].to_numpy(dtype=np.float64) * df["UnitPrice"].to_numpy(dtype=np.float64)
+    })
+    customers = lines.groupby("CustomerID").agg(last_purchase=("last_purchase", "max"), monetary=("monetary", "sum"))
+
+    # A missing InvoiceNo is not an invoice (nunique() skips it too)
+    has_invoice = df["InvoiceNo"].notna().to_numpy()
+    invoices = pd.DataFrame({
+        "CustomerID": customer_ids[has_invoice],
+        "invoice": pd.util.hash_array(df["InvoiceNo"][has_invoice].astype(str).to_numpy(dtype=object))
+    }).drop_duplicates()
+
+    customer_shards = shard_of(customers.index.to_numpy(), n_shards)
+    invoice_shards = shard_of(invoices["CustomerID"].to_numpy(), n_shards)
+    return [
+        Partial(customers[customer_shards == k], invoices[invoice_shards == k])
+        for k in range(n_shards)
+    ]
+
+
+def merge_partials(partials: List[Partial]) -> Partial:
+    """Combine partials of the same shard into one"""
+    customers = pd.concat([p.customers for p in partials]).groupby(level=0).agg(
+        {"last_purchase": "max", "monetary": "sum"}
+    )
+    invoices = pd.concat([p.invoices for p in partials]).drop_duplicates()
+    return Partial(customers, invoices)
+
+
+def finalize_shard(partials: List[Partial]) -> pd.DataFrame:
+    """
+    Merge a shard's partials into one row per customer.
+
+    Returns:
+        DataFrame with CustomerID, last_purchase, Frequency, Monetary
+    """
+    if not partials:
+        return pd.DataFrame({
+            "CustomerID": np.empty(0, dtype=np.float64),
+            "last_purchase": np.empty(0, dtype=np.int64),
+            "Frequency": np.empty(0, dtype=np.int64),
+            "Monetary": np.empty(0, dtype=np.float64)
+        })
+
+    merged = merge_partials(partials)
+    frequency = merged.invoices.groupby("CustomerID").size()
+    return pd.DataFrame({
+        "CustomerID": merged.customers.index.to_numpy(dtype=np.float64),
+        "last_purchase": merged.customers["last_purchase"].to_numpy(),
+        "Frequency": frequency.reindex(merged.customers.index, fill_value=0).to_numpy(dtype=np.int64),
+        "Monetary": merged.customers["monetary"].to_numpy()
+    })
+
+
+def build_rfm_streaming(
+    path: str,
+    reference_date: Optional[datetime] = None,
+    chunk_rows: int = RFM_CHUNK_ROWS,
+    workers: int = RFM_WORKERS,
+    shards: int = RFM_SHARDS,
+    date_format: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Build the RFM table from a transaction file too large to load at once.
+
+    Args:
+        path: .csv or .parquet transaction log (Online Retail columns)
+        reference_date: Reference date for recency calculation.
+                       Defaults to max date + 1 day if not provided
+        chunk_rows: Lines read and reduced per chunk
+        workers: Worker processes (1 reduces chunks in this process)
+        shards: Customer ID shards partials are split into
+        date_format: strftime format of InvoiceDate; inferred if omitted
+                     (giving it is much faster for non-ISO dates)
+
+    Returns:
+        DataFrame like build_rfm_table's, sorted by CustomerID
+        Columns: CustomerID, Recency, Frequency, Monetary
+    """
+    buffers: List[List[Partial]] = [[] for _ in range(shards)]
+    lines = 0
+    start = time.perf_counter()
+
+    def absorb(parts: List[Partial]) -> None:
+        for shard, part in zip(buffers, parts):
+            if len(part.customers):
+                shard.append(part)
+                if len(shard) >= COMPACT_EVERY:
+                    shard[:] = [merge_partials(shard)]
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        # At most 2 chunks per worker in flight, so reading never runs far ahead
+        pending = deque()
+        for chunk in iter_transaction_chunks(path, chunk_rows):
+            lines += len(chunk)
+            if pool is None:
+                absorb(chunk_partials(chunk, shards, date_format))
+            else:
+                pending.append(pool.apply_async(chunk_partials, (chunk, shards, date_format)))
+                if len(pending) >= 2 * workers:
+                    absorb(pending.popleft().get())
+            print(f"   Progress: {lines:,} lines ({lines / (time.perf_counter() - start):,.0f} lines/s)...")
+        while pending:
+            absorb(pending.popleft().get())
+
+        finals = pool.map(finalize_shard, buffers) if pool is not None else [finalize_shard(b) for b in buffers]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    rfm = pd.concat(finals).sort_values("CustomerID", ignore_index=True)
+
+    # Same rule as build_rfm_table: day after the last transaction
+    last_purchase = rfm["last_purchase"].to_numpy().view("datetime64[ns]")
+    if reference_date is None:
+        reference_date = pd.Timestamp(last_purchase.max()) + pd.Timedelta(days=1)
+    recency = (np.datetime64(pd.Timestamp(reference_date), "ns") - last_purchase) // np.timedelta64(1, "D")
+
+    return pd.DataFrame({
+        "CustomerID": rfm["CustomerID"].to_numpy(),
+        "Recency": recency.astype(np.int64),
+        "Frequency": rfm["Frequency"].to_numpy(dtype=np.int64),
+        "Monetary": rfm["Monetary"].to_numpy()
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the RFM table from a large transaction log")
+    parser.add_argument("transactions", help="Transaction log (.csv or .parquet)")
+    parser.add_argument("--output", default="models/rfm_table.csv", help="RFM table CSV to write")
+    parser.add_argument("--chunk-rows", type=int, default=RFM_CHUNK_ROWS, help="Lines per chunk")
+    parser.add_argument("--workers", type=int, default=RFM_WORKERS, help="Worker processes")
+    parser.add_argument("--shards", type=int, default=RFM_SHARDS, help="Customer ID shards")
+    parser.add_argument("--date-format", help="InvoiceDate format, e.g. '%%m/%%d/%%Y %%H:%%M'")
+    parser.add_argument("--reference-date", type=pd.Timestamp, help="Recency reference date")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.transactions):
+        print(f"❌ Transaction file not found: {args.transactions}")
+        sys.exit(1)
+    if args.transactions.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("❌ Parquet input needs pyarrow: pip install pyarrow")
+            sys.exit(1)
+
+    start = time.perf_counter()
+    print(f"📂 Streaming {args.transactions} ({args.workers} workers, {args.shards} shards)")
+    rfm = build_rfm_streaming(
+        args.transactions, args.reference_date, args.chunk_rows, args.workers, args.shards, args.date_format
+    )
+    rfm.to_csv(args.output, index=False)
+    print(f"✅ {len(rfm):,} customers written to {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Vectorized Scoring Helpers for Customer Segmentation
+
+This module scores whole batches of customers against the trained K-Means
+centroids with plain NumPy array operations, so the cost of segmenting N
+customers is dominated by a single (N, 3) x (3, K) matrix multiply instead of
+N separate scikit-learn calls.
+
+Classes:
+    SegmentScorer: Sklearn-free serving kernel with the scaler folded into the centroids
+
+Functions:
+    assign_segments: Nearest-centroid assignment and distances for a scaled matrix
+    confidence_from_distance: Convert distances to confidence scores
+    group_ids_by_segment: Group customer IDs by assigned segment
+    model_version: Content fingerprint of a fitted scaler + K-Means pair
+    save_serving_artifact: Write centroids, scaler parameters and profiles to .npz
+    load_serving_artifact: Load a scorer and profiles without scikit-learn
+"""
+
+import hashlib
+import json
+import math
+import os
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+# Distance at which confidence reaches zero (assume max dist ~5)
+CONFIDENCE_DISTANCE_SCALE: float = 5.0
+
+
+def assign_segments(
+    X_scaled: np.ndarray,
+    centers: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assign every row of a scaled feature matrix to its nearest cluster center.
+
+    Squared distances are expanded as ||x||^2 - 2 x.c + ||c||^2 so all N x K
+    distances come out of one matrix multiply.
+
+    Args:
+        X_scaled: (N, 3) matrix of scaled RFM features
+        centers: (K, 3) matrix of cluster centers in the same scaled space
+
+    Returns:
+        Tuple of (labels, distances):
+        - labels: (N,) int array of assigned cluster IDs
+        - distances: (N,) float array of Euclidean distances to assigned centers
+    """
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+
+    sq_dist = X_scaled @ centers.T
+    sq_dist *= -2.0
+    sq_dist += np.einsum("ij,ij->i", X_scaled, X_scaled)[:, np.newaxis]
+    sq_dist += np.einsum("ij,ij->i", centers, centers)[np.newaxis, :]
+
+    labels = sq_dist.argmin(axis=1)
+    best = sq_dist[np.arange(len(labels)), labels]
+
+    # Rounding in the expansion can push exact matches slightly below zero
+    np.maximum(best, 0.0, out=best)
+    return labels, np.sqrt(best)
+
+
+def confidence_from_distance(distances: np.ndarray) -> np.ndarray:
+    """
+    Convert distances to cluster centers into confidence scores in [0, 1].
+
+    Args:
+        distances: Array of Euclidean distances to assigned centers
+
+    Returns:
+        Array of confidence scores; points close to the center score higher
+    """
+    return np.maximum(0.0, 1.0 - np.asarray(distances) / CONFIDENCE_DISTANCE_SCALE)
+
+
+def group_ids_by_segment(
+    customer_ids: np.ndarray,
+    labels: np.ndarray
+) -> List[Tuple[int, np.ndarray]]:
+    """
+    Group customer IDs by their assigned segment.
+
+    Segments are returned in order of first appearance and customers keep their
+    input order within each segment, matching a row-by-row grouping loop.
+
+    Args:
+        customer_ids: (N,) array of customer IDs
+        labels: (N,) array of assigned cluster IDs
+
+    Returns:
+        List of (segment_id, customer_ids) tuples
+    """
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return []
+
+    # Stable sort keeps the original customer order inside each segment
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+    groups = np.split(np.asarray(customer_ids)[order], boundaries)
+    segment_ids = sorted_labels[np.concatenate(([0], boundaries))]
+
+    # Order segments by the position of their first member in the input
+    first_seen = order[np.concatenate(([0], boundaries))]
+    return [
+        (int(segment_ids[i]), groups[i])
+        for i in np.argsort(first_seen, kind="stable")
+    ]
+
+
+def model_version(
+    centers: np.ndarray,
+    mean: np.ndarray,
+    scale: np.ndarray,
+    profiles: Optional[Dict[Any, Any]] = None
+) -> str:
+    """
+    Fingerprint a model from everything that determines its responses.
+
+    Two artifact sets with the same centroids, scaler parameters and segment
+    profiles always produce the same responses, so they share a version. A
+    republish that only renames segments or updates their statistics gets a
+    new version.
+
+    Args:
+        centers: (K, 3) cluster centers in scaled space
+        mean: (3,) scaler mean
+        scale: (3,) scaler standard deviation
+        profiles: Segment profiles keyed by cluster ID (int or str keys)
+
+    Returns:
+        12-character hex version string
+    """
+    digest = hashlib.sha256()
+    for arr in (centers, mean, scale):
+        digest.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    if profiles is not None:
+        # Serialized as in the artifact, so int-keyed training profiles match
+        canonical = {str(cid): stats for cid, stats in profiles.items()}
+        digest.update(json.dumps(canonical, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+
+class SegmentScorer:
+    """
+    Serving kernel that assigns raw RFM values to segments without scikit-learn.
+
+    StandardScaler maps x to (x - mean) / scale, so the scaled distance to a
+    center c equals the distance between x / scale and (mean / scale + c).
+    Both the mean and the scale are folded into the centroids once at load
+    time; scoring then needs only an element-wise rescale of the input.
+
+    Attributes:
+        centers: (K, 3) cluster centers in scaled space
+        mean: (3,) scaler mean
+        scale: (3,) scaler standard deviation
+        version: Fingerprint of the model parameters and profiles (see model_version)
+    """
+
+    def __init__(
+        self,
+        centers: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        profiles: Optional[Dict[Any, Any]] = None
+    ) -> None:
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.version = model_version(self.centers, self.mean, self.scale, profiles)
+
+        # Folded centers live in "x / scale" space
+        self._inv_scale = 1.0 / self.scale
+        self._folded_centers = self.centers + self.mean * self._inv_scale
+
+        # Plain-Python copies for the single-point path
+        self._inv_scale_py = tuple(float(v) for v in self._inv_scale)
+        self._folded_centers_py = tuple(
+            tuple(float(v) for v in center) for center in self._folded_centers
+        )
+
+    @classmethod
+    def from_sklearn(cls, kmeans, scaler, profiles: Optional[Dict[Any, Any]] = None) -> "SegmentScorer":
+        """
+        Build a scorer from a fitted KMeans model and StandardScaler.
+
+        Args:
+            kmeans: Fitted sklearn KMeans (or MiniBatchKMeans)
+            scaler: Fitted sklearn StandardScaler
+            profiles: Segment profiles served with the model (part of its version)
+
+        Returns:
+            SegmentScorer with identical assignments
+        """
+        return cls(kmeans.cluster_centers_, scaler.mean_, scaler.scale_, profiles)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centers)
+
+    def score(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Assign a batch of raw RFM rows to segments.
+
+        Args:
+            features: (N, 3) matrix of raw Recency, Frequency, Monetary values
+
+        Returns:
+            Tuple of (labels, distances), each an (N,) array
+        """
+        return self.assign(self.transform(features))
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        """
+        Rescale raw RFM rows into the folded-centroid space used by assign.
+
+        score() is transform() followed by assign(); the split lets callers
+        time the two stages separately.
+
+        Args:
+            features: (N, 3) matrix of raw Recency, Frequency, Monetary values
+
+        Returns:
+            (N, 3) matrix of features divided by the scaler's scale
+        """
+        return np.asarray(features, dtype=np.float64).reshape(-1, 3) * self._inv_scale
+
+    def assign(self, X_folded: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Assign rows produced by transform to their nearest folded centroid.
+
+        Args:
+            X_folded: (N, 3) output of transform
+
+        Returns:
+            Tuple of (labels, distances), each an (N,) array
+        """
+        return assign_segments(X_folded, self._folded_centers)
+
+    def score_one(self, recency: float, frequency: float, monetary: float) -> Tuple[int, float]:
+        """
+        Assign a single customer with pure-Python arithmetic.
+
+        Args:
+            recency: Days since last purchase
+            frequency: Number of transactions
+            monetary: Total spending amount
+
+        Returns:
+            Tuple of (segment_id, distance_to_center)
+
+        Raises:
+            ValueError: If any input is NaN or infinite
+            TypeError: If any input is not numeric
+        """
+        r, f, m = float(recency), float(frequency), float(monetary)
+        if not (math.isfinite(r) and math.isfinite(f) and math.isfinite(m)):
+            raise ValueError("Input contains NaN or infinity")
+
+        sr, sf, sm = self._inv_scale_py
+        r, f, m = r * sr, f * sf, m * sm
+
+        best_cid, best_sq = 0, math.inf
+        for cid, (cr, cf, cm) in enumerate(self._folded_centers_py):
+            sq = (r - cr) ** 2 + (f - cf) ** 2 + (m - cm) ** 2
+            if sq < best_sq:
+                best_cid, best_sq = cid, sq
+        return best_cid, math.sqrt(best_sq)
+
+
+def save_serving_artifact(path: str, scorer: SegmentScorer, profiles: Dict[str, Any]) -> None:
+    """
+    Write the compact serving artifact used by the API.
+
+    The file holds only plain arrays and a JSON string, so loading it needs
+    NumPy alone (no pickle, scikit-learn or joblib). It is written to a
+    temporary name and renamed into place, so a running API that reloads it
+    never reads a half-written file.
+
+    Args:
+        path: Output .npz path
+        scorer: Scorer built from the fitted model
+        profiles: Segment profiles keyed by cluster ID
+
+    Returns:
+        None
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            centers=scorer.centers,
+            mean=scorer.mean,
+            scale=scorer.scale,
+            profiles=np.array(json.dumps(profiles, sort_keys=True))
+        )
+    os.replace(tmp, path)
+
+
+def load_serving_artifact(path: str) -> Tuple[SegmentScorer, Dict[str, Any]]:
+    """
+    Load a serving artifact written by save_serving_artifact.
+
+    Args:
+        path: Path to the .npz artifact
+
+    Returns:
+        Tuple of (scorer, profiles)
+
+    Raises:
+        FileNotFoundError: If the artifact does not exist
+        KeyError: If the artifact is missing a required array
+    """
+    with np.load(path, allow_pickle=False) as data:
+        profiles = json.loads(str(data["profiles"]))
+        scorer = SegmentScorer(data["centers"], data["mean"], data["scale"], profiles)
+    return scorer, profiles
@@ -11,4 +11,5 @@ ls -la models/ 2>/dev/null || echo "No models directory"
 echo "Installing dependencies..."
 pip install -r requirements.txt
 echo "Starting gunicorn..."
-gunicorn --bind=0.0.0.0:8000 --timeout 600 --workers 1 --access-logfile '-' --error-logfile '-' --log-level debug app:app
+# Workers/threads come from WEB_WORKERS / WEB_THREADS (see gunicorn.conf.py)
+gunicorn -c gunicorn.conf.py --bind=0.0.0.0:8000 --timeout 600 --log-level debug app:app
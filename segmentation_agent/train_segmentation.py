@@ -11,16 +11,42 @@ Environment Variables:
     SCALER_PATH: Output path for StandardScaler
     PROFILES_PATH: Output path for segment profiles (JSON)
     RFM_PATH: Output path for RFM analysis table (CSV)
+    RFM_SNAPSHOT_PATH: Output directory for the memory-mapped RFM snapshot
+    SERVING_ARTIFACT_PATH: Output path for the compact serving artifact (.npz)
+    MODEL_REGISTRY_DIR: Versioned registry the artifact is published to (the
+        running API hot-reloads its CURRENT version)
+
+Usage:
+    python train_segmentation.py                 # Full training run
+    python train_segmentation.py --export-only   # Re-export .npz from existing pickles
+    python train_segmentation.py --transactions logs/transactions.csv
+                                                 # Stream a large CSV/Parquet log (rfm_streaming.py)
+    python train_segmentation.py --no-cache      # Re-parse the Excel file, bypassing ingest_cache.py
+    python train_segmentation.py --mode minibatch --rfm-source data/customers_50m.parquet
+                                                 # Mini-batch K-Means over a streamed RFM table
+                                                 # (.csv, .parquet, or "database" for customer_rfm)
+    python train_segmentation.py --warm-start    # Start from the current model, keep segment IDs
+    python train_segmentation.py --clusters 6    # Change the number of segments
+
+The number of segments is --clusters when given, else that of the shipped
+model (e.g. a K chosen with model_selection.py), else N_CLUSTERS.
 """
 
+import argparse
 import json
 import joblib
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from typing import Dict, Any
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from typing import Dict, Any, NamedTuple, Optional, Tuple
 
 from utils import load_raw_data, clean_data, build_rfm_table
+from scoring import SegmentScorer, load_serving_artifact, save_serving_artifact
+from customer_store import write_snapshot
+from model_registry import artifact_path, current_version, publish
+from rfm_streaming import RFM_FEATURES, iter_rfm_features
 
 # ============================================================================
 # ENVIRONMENT VARIABLES & CONFIGURATION
@@ -31,14 +57,148 @@ MODEL_PATH: str = "models/kmeans_model.pkl"  # Output: Trained K-Means model
 SCALER_PATH: str = "models/scaler.pkl"  # Output: Feature scaler (StandardScaler)
 PROFILES_PATH: str = "models/segment_profiles.json"  # Output: Segment profiles
 RFM_PATH: str = "models/rfm_table.csv"  # Output: RFM analysis table
+RFM_SNAPSHOT_PATH: str = "models/rfm_snapshot"  # Output: Memory-mapped RFM snapshot
+SERVING_ARTIFACT_PATH: str = "models/segment_model.npz"  # Output: Compact serving artifact
+MODEL_REGISTRY_DIR: str = "models/registry"  # Output: Versioned copies + CURRENT pointer
 
 # K-Means configuration
-N_CLUSTERS: int = 5  # Number of customer segments
+N_CLUSTERS: int = 5  # Number of customer segments when no model has been shipped yet
 RANDOM_STATE: int = 42  # Seed for reproducibility
 N_INIT: int = 10  # Number of initializations for K-Means
 
+# Mini-batch mode (--mode minibatch) for customer bases too large to fit at once
+CHUNK_ROWS: int = 1_000_000  # Customers read from the RFM source per chunk
+MINIBATCH_SIZE: int = 10_000  # Customers per partial_fit call
+MINIBATCH_EPOCHS: int = 3  # Maximum passes over the data
+MINIBATCH_TOL: float = 1e-3  # Stop once no centroid moves further (scaled units)
+INIT_SAMPLE_SIZE: int = 100_000  # Uniform sample the centroids are seeded on
+PROFILE_SAMPLE_SIZE: int = 200_000  # Customers per segment kept for medians
+
+
+class PreviousModel(NamedTuple):
+    """The model being replaced, for warm-started retraining"""
+    kmeans: KMeans
+    scaler: StandardScaler
+    profiles: Dict[str, Dict[str, Any]]
+
+
+def shipped_clusters() -> Optional[int]:
+    """Number of segments of the shipped model: registry CURRENT, else the pickle"""
+    version = current_version(MODEL_REGISTRY_DIR)
+    if version is not None:
+        try:
+            return load_serving_artifact(artifact_path(version, MODEL_REGISTRY_DIR))[0].n_clusters
+        except FileNotFoundError:
+            pass
+    try:
+        return int(joblib.load(MODEL_PATH).n_clusters)
+    except FileNotFoundError:
+        return None
+
+
+def resolve_clusters(requested: Optional[int] = None) -> int:
+    """
+    Number of segments to train: requested, else the shipped model's, else N_CLUSTERS.
+    
+    Raises:
+        ValueError: If requested is below 2
+    """
+    if requested is not None:
+        if requested < 2:
+            raise ValueError(f"Need at least 2 clusters, got {requested}")
+        return requested
+    shipped = shipped_clusters()
+    if shipped is not None:
+        print(f"Training {shipped} segments, like the shipped model (--clusters to change)")
+        return shipped
+    return N_CLUSTERS
+
+
+def load_previous_model(n_clusters: int = N_CLUSTERS) -> Optional[PreviousModel]:
+    """
+    Load the current model, scaler and profiles to warm-start from.
+    
+    Args:
+        n_clusters: Number of segments the new model will have
+    
+    Returns:
+        PreviousModel, or None if there is no model or it has a different
+        number of clusters than n_clusters (a cold start is needed then)
+    """
+    try:
+        kmeans = joblib.load(MODEL_PATH)
+        scaler = joblib.load(SCALER_PATH)
+    except FileNotFoundError:
+        print(f"No previous model at {MODEL_PATH}; training from scratch")
+        return None
+    if kmeans.n_clusters != n_clusters:
+        print(f"Previous model has {kmeans.n_clusters} clusters, not {n_clusters}; training from scratch")
+        return None
+
+    try:
+        with open(PROFILES_PATH) as f:
+            profiles = json.load(f)
+    except FileNotFoundError:
+        profiles = {}
+    return PreviousModel(kmeans, scaler, profiles)
+
+
+def previous_centers(previous: PreviousModel, scaler: StandardScaler) -> np.ndarray:
+    """Previous centroids moved into the new scaler's feature space"""
+    return scaler.transform(previous.scaler.inverse_transform(previous.kmeans.cluster_centers_))
+
+
+def keep_segment_ids(kmeans: KMeans, reference_centers: np.ndarray) -> None:
+    """
+    Renumber fitted clusters so each keeps the ID of the closest old segment.
+    
+    New clusters are matched one-to-one to the previous centroids with a
+    Hungarian assignment (minimum total Euclidean distance), and the model
+    is relabeled in place: cluster i afterwards is the one matched to
+    previous segment i.
+    
+    Args:
+        kmeans: Fitted K-Means (or MiniBatchKMeans) model
+        reference_centers: Previous centroids in the model's scaled space
+        
+    Returns:
+        None
+    """
+    cost = np.linalg.norm(reference_centers[:, None, :] - kmeans.cluster_centers_[None, :, :], axis=2)
+    _, order = linear_sum_assignment(cost)
+    if np.array_equal(order, np.arange(len(order))):
+        return
+
+    print(f"Renumbered clusters to keep segment IDs: {order.tolist()} -> {list(range(len(order)))}")
+    new_ids = np.argsort(order)
+    kmeans.cluster_centers_ = kmeans.cluster_centers_[order]
+    if hasattr(kmeans, "labels_"):
+        kmeans.labels_ = new_ids[kmeans.labels_]
+    # MiniBatchKMeans keeps per-center sample counts for further partial_fit calls
+    if hasattr(kmeans, "_counts"):
+        kmeans._counts = kmeans._counts[order]
+
 
-def main() -> None:
+def keep_segment_names(profiles_dict: Dict[int, Dict[str, Any]], previous: PreviousModel) -> None:
+    """Carry segment names (including hand-edited ones) over to the same IDs"""
+    for cid, stats in profiles_dict.items():
+        name = previous.profiles.get(str(cid), {}).get("segment_name")
+        if name:
+            stats["segment_name"] = name
+
+
+def report_segment_changes(changed: int, customers: int) -> None:
+    """Print how many customers end up in a different segment"""
+    share = changed / customers if customers else 0.0
+    print(f"Segment changes vs previous model: {changed:,} of {customers:,} customers ({share:.2%})")
+
+
+def main(
+    transactions: Optional[str] = None,
+    use_cache: bool = True,
+    warm_start: bool = False,
+    clusters: Optional[int] = None
+) -> None:
     """
     Execute the complete segmentation model training pipeline.
     
@@ -46,10 +206,24 @@ def main() -> None:
     1. Load raw transaction data from Excel file
     2. Clean and validate data (remove nulls, invalid quantities/prices)
     3. Build RFM features for each customer
+       (steps 1-3 stream in chunks when a transactions log is given, and
+       come from the Parquet ingestion cache when the Excel file is unchanged)
     4. Scale features using StandardScaler
-    5. Train K-Means clustering model with 5 segments
+    5. Train K-Means clustering model (see resolve_clusters for the number of segments)
     6. Generate segment profiles with statistical summaries
-    7. Persist all artifacts (model, scaler, profiles) to disk
+    7. Persist all artifacts (model, scaler, profiles, serving .npz) to disk
+    8. Refresh materialized segment assignments in customer_rfm (if available)
+    
+    With warm_start, step 5 starts from the current model's centroids and
+    the new clusters are renumbered to match the old ones, so segment IDs
+    and names stay stable and only customers that really moved change segment.
+    
+    Args:
+        transactions: Optional CSV/Parquet transaction log used instead of
+                      the Excel file; read out-of-core, so it may exceed RAM
+        use_cache: Load the Excel file through the ingestion cache
+        warm_start: Initialize from the current model and keep its segment IDs
+        clusters: Number of segments; None keeps the shipped model's
     
     Returns:
         None
@@ -58,16 +232,31 @@ def main() -> None:
         FileNotFoundError: If data file not found
         Exception: If training fails
     """
-    print("Loading dataset...")
-    df = load_raw_data(DATA_PATH)
+    n_clusters = resolve_clusters(clusters)
+    if transactions:
+        from rfm_streaming import build_rfm_streaming
+
+        print(f"Streaming RFM table from {transactions}...")
+        rfm = build_rfm_streaming(transactions)
+    elif use_cache:
+        from ingest_cache import ensure_cache, load_rfm_table
 
-    print("Cleaning...")
-    df_clean = clean_data(df)
+        print("Loading RFM table (ingestion cache)...")
+        manifest = ensure_cache(DATA_PATH)
+        print(f"{'Cache hit' if manifest['hit'] else 'Cache built'}: {manifest['directory']}")
+        rfm = load_rfm_table(DATA_PATH)
+    else:
+        print("Loading dataset...")
+        df = load_raw_data(DATA_PATH)
 
-    print("Creating RFM table...")
-    # Build RFM (Recency, Frequency, Monetary) features for customer segmentation
-    rfm = build_rfm_table(df_clean)
+        print("Cleaning...")
+        df_clean = clean_data(df)
+
+        print("Creating RFM table...")
+        # Build RFM (Recency, Frequency, Monetary) features for customer segmentation
+        rfm = build_rfm_table(df_clean)
     rfm.to_csv(RFM_PATH, index=False)
+    write_snapshot(RFM_PATH, RFM_SNAPSHOT_PATH)
 
     print("Training model...")
     # ====================================================================
@@ -83,13 +272,24 @@ def main() -> None:
     # ====================================================================
     # STEP 2: K-MEANS CLUSTERING
     # ====================================================================
-    # Train K-Means model with 5 clusters (customer segments)
+    # Train K-Means model with n_clusters clusters (customer segments)
     # - n_clusters: Number of customer segments to create
     # - random_state: Reproducible results across runs
     # - n_init: Multiple initializations for optimal clustering
-    kmeans = KMeans(n_clusters=N_CLUSTERS, random_state=RANDOM_STATE, n_init=N_INIT)
-    clusters = kmeans.fit_predict(X_scaled)
-    rfm["cluster_id"] = clusters
+    previous = load_previous_model(n_clusters) if warm_start else None
+    if previous is not None:
+        # Warm start: one run from the previous centroids instead of N_INIT random ones
+        init = previous_centers(previous, scaler)
+        kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=RANDOM_STATE)
+        kmeans.fit(X_scaled)
+        keep_segment_ids(kmeans, init)
+        print(f"Warm start converged in {kmeans.n_iter_} iterations")
+        changed = int((previous.kmeans.predict(previous.scaler.transform(features)) != kmeans.labels_).sum())
+        report_segment_changes(changed, len(features))
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=RANDOM_STATE, n_init=N_INIT)
+        kmeans.fit(X_scaled)
+    rfm["cluster_id"] = kmeans.labels_
 
     # ====================================================================
     # STEP 3: SEGMENT PROFILE GENERATION
@@ -110,7 +310,24 @@ def main() -> None:
             stats[f"{feat}_{stat}"] = float(val)
         stats["segment_name"] = f"Segment {cid}"
         profiles_dict[int(cid)] = stats
+    if previous is not None:
+        keep_segment_names(profiles_dict, previous)
+
+    save_artifacts(kmeans, scaler, profiles_dict)
 
+
+def save_artifacts(kmeans: KMeans, scaler: StandardScaler, profiles_dict: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Persist a trained model and refresh materialized assignments.
+    
+    Args:
+        kmeans: Fitted K-Means (or MiniBatchKMeans) model
+        scaler: Fitted StandardScaler
+        profiles_dict: Segment profiles keyed by cluster ID
+        
+    Returns:
+        None
+    """
     # ====================================================================
     # STEP 4: MODEL PERSISTENCE
     # ====================================================================
@@ -123,7 +340,336 @@ def main() -> None:
     with open(PROFILES_PATH, "w") as f:
         json.dump(profiles_dict, f, indent=2)
 
+    # Compact artifact the API loads without importing scikit-learn
+    export_serving_artifact(kmeans, scaler, profiles_dict)
+
+    # ====================================================================
+    # STEP 5: MATERIALIZED ASSIGNMENTS
+    # ====================================================================
+    # Re-score customer_rfm rows so the API can serve assignments directly
+    materialize_assignments(kmeans, scaler, profiles_dict)
+
     print("Training complete!")
 
+
+class UniformSample:
+    """
+    Uniform random sample of up to `size` rows per group, built chunk by chunk.
+    
+    Every row gets a random key and each group keeps the rows with the
+    smallest keys (bottom-k sampling), so the result does not depend on how
+    the data was chunked and memory stays at size rows per group.
+    """
+
+    def __init__(self, size: int, seed: int) -> None:
+        self.size = size
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty(0)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._rows = np.empty((0, 3))
+
+    def add(self, rows: np.ndarray, groups: Optional[np.ndarray] = None) -> None:
+        """Offer a chunk of rows (all in group 0 unless groups are given)"""
+        if groups is None:
+            groups = np.zeros(len(rows), dtype=np.int64)
+        keys = np.concatenate([self._keys, self._rng.random(len(rows))])
+        groups = np.concatenate([self._groups, groups])
+        rows = np.concatenate([self._rows, rows])
+
+        # Rank within group by key; keep the `size` smallest of each group
+        order = np.lexsort((keys, groups))
+        sorted_groups = groups[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_groups, sorted_groups)
+        keep = order[rank < self.size]
+        self._keys, self._groups, self._rows = keys[keep], groups[keep], rows[keep]
+
+    def rows_of(self, group: int = 0) -> np.ndarray:
+        """Sampled rows of one group"""
+        return self._rows[self._groups == group]
+
+
+class SegmentProfileAccumulator:
+    """
+    Segment profiles (mean/median/min/max of R, F, M) computed in one pass.
+    
+    Means, minima and maxima are exact. Medians come from a uniform sample of
+    PROFILE_SAMPLE_SIZE customers per segment, so they are exact for segments
+    up to that size.
+    """
+
+    def __init__(self, n_clusters: int, sample_size: int, seed: int) -> None:
+        self.n_clusters = n_clusters
+        self.count = np.zeros(n_clusters, dtype=np.int64)
+        self.total = np.zeros((n_clusters, 3))
+        self.minimum = np.full((n_clusters, 3), np.inf)
+        self.maximum = np.full((n_clusters, 3), -np.inf)
+        self.sample = UniformSample(sample_size, seed)
+
+    def add(self, features: np.ndarray, labels: np.ndarray) -> None:
+        """Accumulate a chunk of raw RFM rows and their segment labels"""
+        self.count += np.bincount(labels, minlength=self.n_clusters)
+        for j in range(3):
+            self.total[:, j] += np.bincount(labels, weights=features[:, j], minlength=self.n_clusters)
+        np.minimum.at(self.minimum, labels, features)
+        np.maximum.at(self.maximum, labels, features)
+        self.sample.add(features, labels)
+
+    def profiles(self) -> Dict[int, Dict[str, Any]]:
+        """Profiles in the same format as the full training mode"""
+        profiles_dict: Dict[int, Dict[str, Any]] = {}
+        for cid in np.flatnonzero(self.count):
+            median = np.median(self.sample.rows_of(cid), axis=0)
+            stats: Dict[str, Any] = {}
+            for j, feat in enumerate(RFM_FEATURES):
+                stats[f"{feat}_mean"] = float(self.total[cid, j] / self.count[cid])
+                stats[f"{feat}_median"] = float(median[j])
+                stats[f"{feat}_min"] = float(self.minimum[cid, j])
+                stats[f"{feat}_max"] = float(self.maximum[cid, j])
+            stats["segment_name"] = f"Segment {cid}"
+            profiles_dict[int(cid)] = stats
+        return profiles_dict
+
+
+def train_minibatch(
+    source: str,
+    batch_size: int = MINIBATCH_SIZE,
+    epochs: int = MINIBATCH_EPOCHS,
+    chunk_rows: int = CHUNK_ROWS,
+    previous: Optional[PreviousModel] = None,
+    n_clusters: int = N_CLUSTERS
+) -> Tuple[MiniBatchKMeans, StandardScaler, Dict[int, Dict[str, Any]]]:
+    """
+    Train on an RFM table streamed in chunks, never holding it in memory.
+    
+    Process flow:
+    1. One pass: fit the scaler incrementally (partial_fit) and draw a
+       uniform sample of INIT_SAMPLE_SIZE customers
+    2. Seed the centroids with a full K-Means (N_INIT restarts) on the
+       scaled sample
+    3. Refine with MiniBatchKMeans.partial_fit over every customer, for up
+       to `epochs` passes (stopping early once centroids settle)
+    4. One pass: assign segments and accumulate segment profiles
+    
+    Given a previous model, step 2 uses its centroids instead and the
+    result keeps its segment IDs and names.
+    
+    Args:
+        source: RFM table as .csv, .parquet, or "database" (customer_rfm)
+        batch_size: Customers per partial_fit call
+        epochs: Maximum mini-batch passes over the data
+        chunk_rows: Customers read per chunk
+        previous: Model to warm-start from (see load_previous_model)
+        n_clusters: Number of segments
+        
+    Returns:
+        Tuple of (kmeans, scaler, profiles_dict), the same artifacts as the
+        full training mode
+        
+    Raises:
+        ValueError: If the source has fewer customers than clusters
+    """
+    print(f"Pass 1: fitting scaler and sampling {INIT_SAMPLE_SIZE:,} customers from {source}...")
+    scaler = StandardScaler()
+    init_sample = UniformSample(INIT_SAMPLE_SIZE, RANDOM_STATE)
+    for chunk in iter_rfm_features(source, chunk_rows):
+        scaler.partial_fit(chunk)
+        init_sample.add(chunk)
+    customers = int(scaler.n_samples_seen_) if hasattr(scaler, "n_samples_seen_") else 0
+    if customers < n_clusters:
+        raise ValueError(f"{source} has {customers} customers; need at least {n_clusters}")
+
+    if previous is not None:
+        print(f"Warm start from the centroids in {MODEL_PATH}...")
+        init = previous_centers(previous, scaler)
+    else:
+        print(f"Seeding {n_clusters} centroids on the sample ({N_INIT} restarts)...")
+        seed_model = KMeans(n_clusters=n_clusters, random_state=RANDOM_STATE, n_init=N_INIT)
+        init = seed_model.fit(scaler.transform(init_sample.rows_of(0))).cluster_centers_
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        init=init,
+        n_init=1,
+        batch_size=batch_size,
+        random_state=RANDOM_STATE
+    )
+    rng = np.random.default_rng(RANDOM_STATE)
+    for epoch in range(1, epochs + 1):
+        before = init if epoch == 1 else kmeans.cluster_centers_.copy()
+        for chunk in iter_rfm_features(source, chunk_rows):
+            X_scaled = scaler.transform(chunk)[rng.permutation(len(chunk))]
+            for start in range(0, len(X_scaled), batch_size):
+                kmeans.partial_fit(X_scaled[start:start + batch_size])
+        shift = float(np.linalg.norm(kmeans.cluster_centers_ - before, axis=1).max())
+        print(f"Epoch {epoch}: {customers:,} customers, max centroid shift {shift:.4f}")
+        if shift < MINIBATCH_TOL:
+            break
+
+    if previous is not None:
+        keep_segment_ids(kmeans, init)
+
+    print("Final pass: assigning segments and building profiles...")
+    accumulator = SegmentProfileAccumulator(n_clusters, PROFILE_SAMPLE_SIZE, RANDOM_STATE)
+    changed = 0
+    for chunk in iter_rfm_features(source, chunk_rows):
+        labels = kmeans.predict(scaler.transform(chunk))
+        accumulator.add(chunk, labels)
+        if previous is not None:
+            changed += int((previous.kmeans.predict(previous.scaler.transform(chunk)) != labels).sum())
+
+    profiles_dict = accumulator.profiles()
+    if previous is not None:
+        report_segment_changes(changed, customers)
+        keep_segment_names(profiles_dict, previous)
+    return kmeans, scaler, profiles_dict
+
+
+def main_minibatch(
+    source: str,
+    batch_size: int = MINIBATCH_SIZE,
+    epochs: int = MINIBATCH_EPOCHS,
+    chunk_rows: int = CHUNK_ROWS,
+    warm_start: bool = False,
+    clusters: Optional[int] = None
+) -> None:
+    """
+    Mini-batch training mode for customer bases too large for KMeans.fit.
+    
+    Writes the same artifacts as main(), so the API needs no changes. The
+    RFM table and snapshot are not rewritten; the source already is one.
+    
+    Args:
+        source: RFM table as .csv, .parquet, or "database" (customer_rfm)
+        batch_size: Customers per partial_fit call
+        epochs: Maximum mini-batch passes over the data
+        chunk_rows: Customers read per chunk
+        warm_start: Initialize from the current model and keep its segment IDs
+        clusters: Number of segments; None keeps the shipped model's
+        
+    Returns:
+        None
+    """
+    n_clusters = resolve_clusters(clusters)
+    previous = load_previous_model(n_clusters) if warm_start else None
+    kmeans, scaler, profiles_dict = train_minibatch(source, batch_size, epochs, chunk_rows, previous, n_clusters)
+    save_artifacts(kmeans, scaler, profiles_dict)
+
+
+def export_serving_artifact(
+    kmeans: KMeans,
+    scaler: StandardScaler,
+    profiles: Dict[Any, Dict[str, Any]]
+) -> None:
+    """
+    Write the .npz serving artifact (centroids, scaler parameters, profiles)
+    and publish it to the model registry as the current version.
+    
+    Args:
+        kmeans: Fitted K-Means model
+        scaler: Fitted StandardScaler
+        profiles: Segment profiles keyed by cluster ID
+        
+    Returns:
+        None
+    """
+    profiles = {str(cid): stats for cid, stats in profiles.items()}
+    save_serving_artifact(SERVING_ARTIFACT_PATH, SegmentScorer.from_sklearn(kmeans, scaler, profiles), profiles)
+    print(f"Serving artifact written to {SERVING_ARTIFACT_PATH}")
+    version = publish(SERVING_ARTIFACT_PATH, MODEL_REGISTRY_DIR)
+    print(f"Published model version {version} to {MODEL_REGISTRY_DIR} (running APIs reload it)")
+
+
+def export_only() -> None:
+    """
+    Re-export the serving artifact from the existing pickles and profiles.
+    
+    Returns:
+        None
+    """
+    kmeans = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    with open(PROFILES_PATH) as f:
+        profiles = json.load(f)
+    export_serving_artifact(kmeans, scaler, profiles)
+
+
+def materialize_assignments(
+    kmeans: KMeans,
+    scaler: StandardScaler,
+    profiles_dict: Dict[Any, Dict[str, Any]]
+) -> None:
+    """
+    Store segment assignments from a freshly trained model in customer_rfm.
+    
+    Args:
+        kmeans: Fitted K-Means model
+        scaler: Fitted StandardScaler
+        profiles_dict: Segment profiles keyed by cluster ID (part of the version)
+        
+    Returns:
+        None
+    """
+    try:
+        from database import is_db_available, refresh_segment_assignments
+    except ImportError as e:
+        print(f"Database module not available, skipping materialization: {e}")
+        return
+
+    if not is_db_available():
+        print("Database not available, skipping materialization")
+        return
+
+    scorer = SegmentScorer.from_sklearn(kmeans, scaler, profiles_dict)
+    updated = refresh_segment_assignments(scorer.score, scorer.version)
+    print(f"Materialized segments for {updated} customers (version {scorer.version})")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the customer segmentation model")
+    parser.add_argument(
+        "--export-only",
+        action="store_true",
+        help="Skip training; re-export the .npz serving artifact from existing pickles"
+    )
+    parser.add_argument(
+        "--transactions",
+        help="CSV or Parquet transaction log to stream instead of the Excel file"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the Excel file directly instead of using the Parquet ingestion cache"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("full", "minibatch"),
+        default="full",
+        help="full: KMeans on the whole matrix; minibatch: stream the RFM table through MiniBatchKMeans"
+    )
+    parser.add_argument(
+        "--rfm-source",
+        default=RFM_PATH,
+        help='RFM table for --mode minibatch: .csv, .parquet, or "database"'
+    )
+    parser.add_argument("--batch-size", type=int, default=MINIBATCH_SIZE, help="Customers per partial_fit call")
+    parser.add_argument("--epochs", type=int, default=MINIBATCH_EPOCHS, help="Maximum mini-batch passes")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Customers read per chunk")
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Start from the current model's centroids and keep its segment IDs and names"
+    )
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        help=f"Number of segments (default: the shipped model's, else {N_CLUSTERS})"
+    )
+    args = parser.parse_args()
+
+    if args.export_only:
+        export_only()
+    elif args.mode == "minibatch":
+        main_minibatch(
+            args.rfm_source, args.batch_size, args.epochs, args.chunk_rows, args.warm_start, args.clusters
+        )
+    else:
+        main(args.transactions, use_cache=not args.no_cache, warm_start=args.warm_start, clusters=args.clusters)
\ No newline at end of file
@@ -10,6 +10,7 @@ Functions:
     build_rfm_table: Build RFM features from transaction data
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from typing import Optional
@@ -41,22 +42,80 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     - Rows with non-positive Quantity (returns, cancellations)
     - Rows with non-positive UnitPrice (invalid pricing)
     
+    All three rules are combined into one mask, so the frame is copied once.
+    
     Args:
         df: Raw transaction DataFrame
         
     Returns:
         Cleaned DataFrame with invalid rows removed
     """
-    # Remove transactions without customer ID
-    df = df.dropna(subset=["CustomerID"])
-    
-    # Remove invalid quantities (returns/cancellations)
-    df = df[df["Quantity"] > 0]
+    valid = (
+        df["CustomerID"].notna()          # transactions without customer ID
+        & (df["Quantity"] > 0)            # returns/cancellations
+        & (df["UnitPrice"] > 0)           # invalid prices
+    )
+    return df[valid]
+
+
+# numpy sums float64 runs of up to this many values with 8 interleaved
+# partial sums; longer runs are split in halves (pairwise summation).
+# This mirrors a NumPy implementation detail: verify_scoring.py fails if
+# build_rfm_table stops matching pandas bit for bit
+PAIRWISE_BLOCK = 128
+
+
+def _group_sums(values: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Sum values per group code, bit-for-bit equal to calling .sum() on each group.
     
-    # Remove invalid prices
-    df = df[df["UnitPrice"] > 0]
+    A plain np.bincount adds each group's values one after another, which
+    rounds differently from numpy's pairwise summation once a group has 8 or
+    more values. This reproduces numpy's order: groups under 8 values are summed
+    sequentially, groups up to PAIRWISE_BLOCK values use its 8 partial sums and
+    combine tree, and the (few) larger groups are summed with numpy directly.
     
-    return df
+    Args:
+        values: Values to sum, in original row order
+        codes: Group code (0 .. n_groups - 1) of each value
+        n_groups: Number of groups
+        
+    Returns:
+        Array of n_groups sums (0.0 for empty groups)
+    """
+    order = np.argsort(codes, kind="stable")
+    values = values[order]
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    size = counts[codes]
+    pos = np.arange(len(values)) - starts[codes]
+
+    small = size < 8
+    sums = np.bincount(codes[small], weights=values[small], minlength=n_groups).astype(np.float64)
+
+    # Lane j accumulates positions j, j+8, j+16, ... of the unrolled blocks
+    blocked = (size >= 8) & (size <= PAIRWISE_BLOCK)
+    unrolled = blocked & (pos < size - size % 8)
+    lanes = np.bincount(
+        codes[unrolled] * 8 + pos[unrolled] % 8,
+        weights=values[unrolled],
+        minlength=n_groups * 8
+    ).reshape(n_groups, 8)
+    tree = (
+        ((lanes[:, 0] + lanes[:, 1]) + (lanes[:, 2] + lanes[:, 3]))
+        + ((lanes[:, 4] + lanes[:, 5]) + (lanes[:, 6] + lanes[:, 7]))
+    )
+    blocked_groups = (counts >= 8) & (counts <= PAIRWISE_BLOCK)
+    sums[blocked_groups] = tree[blocked_groups]
+    # Then the remaining (up to 7) values one by one
+    for offset in range(7):
+        tail = blocked & ~unrolled & (pos == size - size % 8 + offset)
+        sums[codes[tail]] += values[tail]
+
+    for group in np.flatnonzero(counts > PAIRWISE_BLOCK):
+        sums[group] = values[starts[group]:starts[group] + counts[group]].sum()
+    return sums
 
 
 def build_rfm_table(
@@ -71,6 +130,10 @@ def build_rfm_table(
     - Frequency: Number of transactions (higher is better)
     - Monetary: Total spending (higher is better)
     
+    The aggregation runs on NumPy arrays: customers and invoices are
+    factorized to integer codes, line totals are computed once, and each
+    metric is a single reduction over the codes (no per-group Python calls).
+    
     Args:
         df: Cleaned transaction DataFrame with columns:
             - CustomerID: Unique customer identifier
@@ -82,7 +145,7 @@ def build_rfm_table(
                        Defaults to max date + 1 day if not provided
         
     Returns:
-        DataFrame with RFM features indexed by CustomerID
+        DataFrame with one row per customer, sorted by CustomerID
         Columns: CustomerID, Recency, Frequency, Monetary
         
     Example:
@@ -91,31 +154,50 @@ def build_rfm_table(
         >>> rfm = build_rfm_table(df)
         >>> print(rfm.head())
     """
-    df = df.copy()
-    
-    # Convert InvoiceDate to datetime format
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+    # Convert InvoiceDate to datetime format (nanoseconds since epoch)
+    dates = pd.to_datetime(df["InvoiceDate"])
 
     # Set reference date to day after last transaction if not provided
     if reference_date is None:
-        reference_date = df["InvoiceDate"].max() + pd.Timedelta(days=1)
+        reference_date = dates.max() + pd.Timedelta(days=1)
 
-    def monetary_sum(group):
-        """Calculate total monetary value for a group of transactions."""
-        return (group * df.loc[group.index, "UnitPrice"]).sum()
+    # Integer codes: customers in sorted order (like groupby), anonymous rows -1
+    customer_codes, customers = pd.factorize(df["CustomerID"], sort=True)
+    invoice_codes, invoices = pd.factorize(df["InvoiceNo"])
+    keep = customer_codes >= 0
+    customer_codes = customer_codes[keep].astype(np.int64)
+    invoice_codes = invoice_codes[keep].astype(np.int64)
+    n_customers = len(customers)
+    if n_customers == 0:
+        return pd.DataFrame({
+            "CustomerID": customers,
+            "Recency": np.empty(0, dtype=np.int64),
+            "Frequency": np.empty(0, dtype=np.int64),
+            "Monetary": np.empty(0, dtype=np.float64)
+        })
 
-    # Aggregate transactions by customer
-    rfm = df.groupby("CustomerID").agg({
-        "InvoiceDate": lambda x: (reference_date - x.max()).days,  # Recency
-        "InvoiceNo": "nunique",  # Frequency
-        "Quantity": monetary_sum  # Monetary
-    })
+    # Recency: days from the reference date to each customer's last purchase
+    order = np.argsort(customer_codes, kind="stable")
+    starts = np.flatnonzero(np.diff(customer_codes[order], prepend=-1))
+    last_purchase = np.maximum.reduceat(dates.to_numpy("datetime64[ns]")[keep][order], starts)
+    recency = (np.datetime64(pd.Timestamp(reference_date), "ns") - last_purchase) // np.timedelta64(1, "D")
 
-    # Rename columns to RFM naming convention
-    rfm.rename(columns={
-        "InvoiceDate": "Recency",
-        "InvoiceNo": "Frequency",
-        "Quantity": "Monetary"
-    }, inplace=True)
+    # Frequency: distinct (customer, invoice) pairs per customer; a missing
+    # InvoiceNo (code -1) is not an invoice, as with nunique()
+    has_invoice = invoice_codes >= 0
+    pairs = np.unique(customer_codes[has_invoice] * len(invoices) + invoice_codes[has_invoice])
+    frequency = np.bincount(pairs // max(1, len(invoices)), minlength=n_customers)
 
-    return rfm.reset_index()
+    # Monetary: line totals summed per customer
+    line_totals = (
+        df["Quantity"].to_numpy(dtype=np.float64)[keep]
+        * df["UnitPrice"].to_numpy(dtype=np.float64)[keep]
+    )
+    monetary = _group_sums(line_totals, customer_codes, n_customers)
+
+    return pd.DataFrame({
+        "CustomerID": customers,
+        "Recency": recency.astype(np.int64),
+        "Frequency": frequency.astype(np.int64),
+        "Monetary": monetary
+    })
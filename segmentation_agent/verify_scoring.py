@@ -0,0 +1,209 @@
+"""
+Scoring parity verification
+
+Checks that the sklearn-free SegmentScorer produces the same segment IDs and
+distances as the original scikit-learn path (scaler.transform + kmeans.predict
++ euclidean_distances) and reports per-call latency of both.
+
+Also checks that utils.build_rfm_table still matches the original per-group
+pandas implementation bit for bit. Its Monetary sums mirror NumPy's pairwise
+summation order (utils.PAIRWISE_BLOCK), so a NumPy upgrade or an installed
+bottleneck that changes how Series.sum() adds values shows up here.
+
+Finally it checks that the CustomerStore's float32 copy of rfm_table.csv
+assigns every customer the same segment as the float64 values training
+and materialization use.
+
+Usage:
+    python verify_scoring.py
+
+Exits with status 1 if any prediction or RFM value differs (and with a
+traceback if an artifact is missing). CI runs it from segmentation_agent/
+on every change to this directory (.github/workflows/segmentation-parity.yml)
+against the committed models/ artifacts.
+"""
+import os
+import sys
+import time
+import joblib
+import numpy as np
+from sklearn.metrics.pairwise import euclidean_distances
+
+from benchmark import reference_build_rfm_table
+from customer_store import CustomerStore
+from scoring import SegmentScorer
+from utils import PAIRWISE_BLOCK, build_rfm_table
+
+MODEL_PATH = os.getenv("MODEL_PATH", "models/kmeans_model.pkl")
+SCALER_PATH = os.getenv("SCALER_PATH", "models/scaler.pkl")
+RFM_PATH = os.getenv("RFM_CSV_PATH", "models/rfm_table.csv")
+
+# Distances are compared with an absolute tolerance: both paths round
+# differently in the last few bits
+DISTANCE_TOLERANCE = 1e-9
+N_RANDOM = 20000
+N_TIMED = 2000
+
+
+def sklearn_predict(kmeans, scaler, recency, frequency, monetary):
+    """Reference single-point prediction using the original sklearn calls"""
+    X_scaled = scaler.transform(np.array([[recency, frequency, monetary]]))
+    cid = int(kmeans.predict(X_scaled)[0])
+    center = kmeans.cluster_centers_[cid].reshape(1, -1)
+    return cid, float(euclidean_distances(X_scaled, center)[0][0])
+
+
+def build_inputs(rfm_path: str) -> np.ndarray:
+    """Real customers from the RFM table plus random points across the feature range"""
+    store = CustomerStore.from_csv(rfm_path)
+    real = store.features(slice(None))
+
+    rng = np.random.default_rng(42)
+    low = real.min(axis=0)
+    high = real.max(axis=0)
+    random_points = rng.uniform(low, high * 1.5, size=(N_RANDOM, 3))
+    return np.vstack([real, random_points])
+
+
+def rfm_transactions(seed: int = 7):
+    """
+    Cleaned transaction lines with every customer group size from 1 to past
+    PAIRWISE_BLOCK. About 1% of lines have no InvoiceNo, and the last
+    customer has none at all (nunique() counts them as zero invoices).
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    sizes = np.concatenate([np.arange(1, 3 * PAIRWISE_BLOCK), rng.integers(1, 2000, 200), [3]])
+    customer_ids = np.repeat(12346.0 + np.arange(len(sizes)), sizes)
+    order = rng.permutation(len(customer_ids))
+    customers = customer_ids[order]
+    lines = len(customers)
+    invoices = rng.integers(536365, 581587, lines).astype(str).astype(object)
+    invoices[(rng.random(lines) < 0.01) | (customers == customer_ids[-1])] = None
+    return pd.DataFrame({
+        "InvoiceNo": invoices,
+        "Quantity": rng.integers(1, 25, lines),
+        "InvoiceDate": pd.Timestamp("2010-12-01 08:00") + pd.to_timedelta(
+            rng.integers(0, 373 * 86400, lines), unit="s"
+        ),
+        "UnitPrice": np.round(rng.lognormal(0.8, 0.9, lines), 2),
+        "CustomerID": customers
+    })
+
+
+def check_rfm_build() -> bool:
+    """Compare build_rfm_table with the original per-group implementation, exactly"""
+    df = rfm_transactions()
+    expected = reference_build_rfm_table(df)
+    actual = build_rfm_table(df)
+
+    differing = [
+        name for name in ("CustomerID", "Recency", "Frequency")
+        if not np.array_equal(expected[name].to_numpy(), actual[name].to_numpy())
+    ]
+    monetary_diff = np.abs(expected["Monetary"].to_numpy() - actual["Monetary"].to_numpy())
+    mismatches = int((monetary_diff != 0).sum())
+    print(f"  rfm:    {len(actual)} customers, Monetary mismatches={mismatches}, "
+          f"max difference={monetary_diff.max():.2e}")
+    if differing:
+        print(f"  build_rfm_table differs from pandas in {', '.join(differing)}")
+    if mismatches:
+        print("  build_rfm_table Monetary no longer matches pandas; if NumPy's summation order changed, "
+              "update utils._group_sums")
+    return not differing and not mismatches
+
+
+def check_feature_storage(scorer: SegmentScorer, rfm_path: str) -> bool:
+    """Compare segments scored from the store's float32 arrays with the CSV's float64 values"""
+    import pandas as pd
+
+    df = pd.read_csv(rfm_path, usecols=["CustomerID", "Recency", "Frequency", "Monetary"])
+    df = df.dropna(subset=["CustomerID"])
+    df = df.sort_values("CustomerID", kind="stable").drop_duplicates("CustomerID", keep="first")
+    exact = df[["Recency", "Frequency", "Monetary"]].to_numpy(dtype=np.float64)
+    stored = CustomerStore.from_csv(rfm_path).features(slice(None))
+
+    exact_labels, exact_dist = scorer.score(exact)
+    stored_labels, stored_dist = scorer.score(stored)
+    label_mismatch = int((exact_labels != stored_labels).sum())
+    print(f"  store:  {len(stored)} customers, float32 label mismatches={label_mismatch}, "
+          f"max distance difference={np.abs(exact_dist - stored_dist).max():.2e}")
+    if label_mismatch:
+        print("  float32 customer storage changes segment assignments; store these columns as float64")
+    return label_mismatch == 0
+
+
+def main() -> int:
+    kmeans = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    scorer = SegmentScorer.from_sklearn(kmeans, scaler)
+    X = build_inputs(RFM_PATH)
+
+    print(f"Checking {len(X)} points against the sklearn reference...")
+
+    # Reference: vectorized sklearn equivalent of the per-call path
+    X_scaled = scaler.transform(X)
+    ref_labels = kmeans.predict(X_scaled)
+    ref_dist = np.sqrt(((X_scaled - kmeans.cluster_centers_[ref_labels]) ** 2).sum(axis=1))
+
+    failures = 0
+
+    # Training-side feature build
+    if not check_rfm_build():
+        failures += 1
+
+    # Batch kernel
+    labels, distances = scorer.score(X)
+    label_mismatch = int((labels != ref_labels).sum())
+    max_err = float(np.abs(distances - ref_dist).max())
+    print(f"  batch:  label mismatches={label_mismatch}, max distance error={max_err:.2e}")
+    if label_mismatch or max_err > DISTANCE_TOLERANCE:
+        failures += 1
+
+    # Single-point kernel
+    single = [scorer.score_one(*row) for row in X]
+    single_labels = np.array([cid for cid, _ in single])
+    single_dist = np.array([dist for _, dist in single])
+    label_mismatch = int((single_labels != ref_labels).sum())
+    max_err = float(np.abs(single_dist - ref_dist).max())
+    print(f"  single: label mismatches={label_mismatch}, max distance error={max_err:.2e}")
+    if label_mismatch or max_err > DISTANCE_TOLERANCE:
+        failures += 1
+
+    # Spot-check against the exact original per-call code path
+    for row in X[:: max(1, len(X) // 500)]:
+        cid, dist = sklearn_predict(kmeans, scaler, *row)
+        got_cid, got_dist = scorer.score_one(*row)
+        if cid != got_cid or abs(dist - got_dist) > DISTANCE_TOLERANCE:
+            print(f"  mismatch at {row.tolist()}: sklearn=({cid}, {dist}) scorer=({got_cid}, {got_dist})")
+            failures += 1
+            break
+
+    # Serving-side feature storage
+    if not check_feature_storage(scorer, RFM_PATH):
+        failures += 1
+
+    # Latency
+    sample = X[:N_TIMED]
+    start = time.perf_counter()
+    for row in sample:
+        sklearn_predict(kmeans, scaler, *row)
+    sklearn_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    start = time.perf_counter()
+    for row in sample:
+        scorer.score_one(*row)
+    scorer_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    print(f"\nSingle-call latency: sklearn={sklearn_us:.1f}us  scorer={scorer_us:.2f}us")
+
+    if failures:
+        print("\n❌ Scoring parity check FAILED")
+        return 1
+    print("\n✅ Scoring parity check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())